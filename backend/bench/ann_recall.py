@@ -0,0 +1,92 @@
+# bench/ann_recall.py
+# Recall@k and query latency of each index type against the flat baseline,
+# raw and after the exact re-rank of the top ANN_POOL candidates that
+# retrieval applies.
+#   python bench/ann_recall.py [--n 50000] [--queries 200] [--k 10] [--out report.json]
+# Vectors are synthetic (clustered, normalized, dim 384) so the report can be
+# produced for catalog sizes we don't have yet.
+import argparse, json, sys, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rag import ann  # noqa: E402
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int = 0, latent: int = 32) -> np.ndarray:
+    """Clustered points on a low-dimensional subspace (like sentence embeddings), plus a little noise."""
+    rng = np.random.default_rng(seed)
+    basis = np.random.default_rng(42).standard_normal((latent, dim)).astype("float32")
+    centers = np.random.default_rng(43).standard_normal((clusters, latent)).astype("float32")
+    z = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, latent)).astype("float32")
+    x = z.dot(basis) + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def run(n: int, n_queries: int, k: int, dim: int = 384) -> dict:
+    data = synthetic(n, dim, clusters=max(8, n // 500))
+    queries = synthetic(n_queries, dim, clusters=max(8, n // 500), seed=1)
+
+    pool = min(ann.ANN_POOL, n)
+    results = {}
+    truth = None
+    for index_type in ann.INDEX_TYPES:
+        index, meta = ann.make_index(data, index_type)
+        lat, lat_rr = [], []
+        found = np.empty((n_queries, k), dtype="int64")
+        reranked = np.empty((n_queries, k), dtype="int64")
+        for i in range(n_queries):
+            q = queries[i:i + 1]
+            t0 = time.perf_counter()
+            _, I = index.search(q, k)
+            lat.append((time.perf_counter() - t0) * 1000)
+            found[i] = I[0]
+            # what retrieval actually does: pull ANN_POOL candidates, rescore exactly
+            t0 = time.perf_counter()
+            _, P = index.search(q, pool)
+            cand = P[0][P[0] >= 0]
+            reranked[i] = cand[np.argsort(-data[cand].dot(q[0]))[:k]]
+            lat_rr.append((time.perf_counter() - t0) * 1000)
+        if truth is None:
+            truth = found  # flat runs first: exact neighbours
+        recall = float(np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(n_queries)]))
+        recall_rr = float(np.mean([len(set(reranked[i]) & set(truth[i])) / k for i in range(n_queries)]))
+        lat.sort()
+        lat_rr.sort()
+        results[index_type] = {
+            "effective_type": meta["effective_type"],
+            "params": meta["params"],
+            "build_s": meta["build_s"],
+            f"recall@{k}": round(recall, 4),
+            "p50_ms": round(lat[len(lat) // 2], 4),
+            "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 4),
+            f"recall@{k}_reranked": round(recall_rr, 4),
+            "reranked_p50_ms": round(lat_rr[len(lat_rr) // 2], 4),
+            "index_bytes": _index_bytes(index),
+        }
+    return {"entries": n, "dim": dim, "queries": n_queries, "k": k, "ann_pool": pool, "results": results}
+
+
+def _index_bytes(index) -> int:
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    report = run(args.n, args.queries, args.k)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
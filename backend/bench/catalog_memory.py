@@ -0,0 +1,136 @@
+# bench/catalog_memory.py
+# Memory held per worker for the catalog itself (not embeddings or index), by
+# representation, on the real catalog and on synthetic ones:
+#   legacy        [{"raw": dict, "blob": str}] plus one token set per entry
+#                 and the idf dict, as vectorstore loaded it before
+#                 index.catalog
+#   legacy_noblob the same without the blobs (only released after embedding)
+#   compiled      rag/catalog.py's mmapped file after a scoring pass over
+#                 every entry (lexical scores, industry / tag masks)
+#   entries       compiled plus a CatalogEntry for every entry, not decoded
+#                 (what a full scan through the entry["raw"] view holds
+#                 before it touches raw)
+# Each representation loads in a fresh process. heap is what tracemalloc
+# still sees allocated once loaded, and rss / uss are the growth of the
+# process (metrics.process_memory). mapped is the compiled file size, which is
+# page cache shared across workers.
+#   python bench/catalog_memory.py [--synthetic 100000] [--out report.json]
+import argparse, gc, json, math, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.synthetic_catalog import DATA_PATH, load_catalog, write_catalog  # noqa: E402
+from metrics import process_memory  # noqa: E402
+from rag import catalog  # noqa: E402
+
+BACKEND = Path(__file__).resolve().parent.parent
+KINDS = ("legacy", "legacy_noblob", "compiled", "entries")
+_QUERIES = ["restaurant hero photo gallery", "pricing plans saas", "team testimonials", "contact form footer"]
+
+
+def _legacy(path: Path, blobs: bool):
+    from rag.vectorstore import _entry_blob
+    entries = [{"raw": raw, "blob": _entry_blob(raw)} if blobs else {"raw": raw} for raw in load_catalog(path)]
+    doc_toks = [set(catalog.tokenize(catalog.lex_text(e["raw"]))) for e in entries]
+    df: Dict[str, int] = {}
+    for toks in doc_toks:
+        for t in toks:
+            df[t] = df.get(t, 0) + 1
+    n = max(1, len(entries))
+    idf = {t: math.log((n - d + 0.5) / (d + 0.5) + 1.0) for t, d in df.items()}
+    return entries, doc_toks, idf
+
+
+def _compiled(path: Path, materialize: bool):
+    cat = catalog.open_catalog(path)
+    ids = np.arange(len(cat))
+    for q in _QUERIES:
+        cat.lexical_scores(catalog.tokenize(q), ids)
+    for name in ("ind", "tag"):
+        cat.entries_with(name, range(len(cat._vocab(name))))
+    return cat, list(cat) if materialize else None
+
+
+def _child(kind: str, path: Path) -> dict:
+    if kind.startswith("legacy"):
+        import rag.vectorstore  # noqa: F401  (the model it loads is not part of the measure)
+    gc.collect()
+    before = process_memory()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    held = _legacy(path, kind == "legacy") if kind.startswith("legacy") else _compiled(path, kind == "entries")
+    load_s = time.perf_counter() - t0
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    after = process_memory()
+    n = len(held[0])
+    out = {"entries": n, "load_s": round(load_s, 3), "heap_bytes": heap,
+           "heap_per_entry": round(heap / max(1, n), 1)}
+    if before and after:
+        out.update(rss_growth=after["rss"] - before["rss"], uss_growth=after["uss"] - before["uss"])
+    if not kind.startswith("legacy"):
+        out["mapped_bytes"] = held[0].nbytes
+    return out
+
+
+def _spawn(kind: str, path: Path) -> dict:
+    proc = subprocess.run([sys.executable, __file__, "--child", kind, str(path)], cwd=BACKEND,
+                          capture_output=True, text=True)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{kind} failed: {proc.stderr.strip()[-2000:]}")
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+def run(catalogs: Dict[str, Path], work_dir: Path) -> dict:
+    results = {}
+    for name, jsonl in catalogs.items():
+        compiled = work_dir / f"{name}.catalog"
+        t0 = time.perf_counter()
+        catalog.compile_catalog(load_catalog(jsonl), compiled)
+        compile_s = time.perf_counter() - t0
+        res = {"jsonl_bytes": jsonl.stat().st_size, "compile_s": round(compile_s, 3)}
+        res.update({kind: _spawn(kind, jsonl if kind.startswith("legacy") else compiled) for kind in KINDS})
+        legacy = res["legacy"]["heap_bytes"]
+        res["heap_vs_legacy"] = {k: round(res[k]["heap_bytes"] / max(1, legacy), 4) for k in KINDS}
+        results[name] = res
+        print(f"{name}: legacy {legacy / 2**20:.1f} MiB heap, compiled {res['compiled']['heap_bytes'] / 2**20:.1f} "
+              f"MiB heap + {res['compiled']['mapped_bytes'] / 2**20:.1f} MiB mapped", file=sys.stderr)
+    return {"ts": time.time(), "catalogs": results}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--catalog", type=str, default=str(DATA_PATH))
+    ap.add_argument("--synthetic", type=str, default="100000", help="comma-separated sizes; '' for none")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--work-dir", type=str, default="")
+    ap.add_argument("--out", type=str, default="")
+    ap.add_argument("--child", nargs=2, metavar=("KIND", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        print("RESULT " + json.dumps(_child(args.child[0], Path(args.child[1]))))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(args.work_dir or tmp)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        catalogs: Dict[str, Path] = {"real": Path(args.catalog)}
+        sizes: List[int] = [int(n) for n in args.synthetic.split(",") if n]
+        for n in sizes:
+            path = work_dir / f"catalog-{n}-s{args.seed}.jsonl"
+            if not path.exists():
+                write_catalog(path, n, args.seed, Path(args.catalog))
+            catalogs[f"synthetic-{n}"] = path
+        report = run(catalogs, work_dir)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
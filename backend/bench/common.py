@@ -0,0 +1,38 @@
+# bench/common.py
+# Helpers shared by the benchmarks and the retrieval tests: the sample
+# business queries (one per industry, as run by test_retrieval.py) and the page
+# styles mixed into them, latency percentiles, and query texts built from the
+# catalog.
+import json
+from pathlib import Path
+from typing import List
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "components.jsonl"
+
+QUERIES = [
+    ("restaurant", "Authentic Italian wood-fired restaurant with handmade pasta"),
+    ("technology", "Cloud infrastructure automation platform for DevOps teams"),
+    ("healthcare", "Mental health clinic offering therapy and wellness services"),
+    ("fitness", "Modern fitness studio with personal training and group classes"),
+    ("beauty", "Luxury spa offering skincare treatments and relaxation services"),
+]
+STYLES = ["modern", "professional", "creative", "minimal", "luxury", "playful", "dark", "vintage"]
+
+
+def pct(lat: List[float], p: float) -> float:
+    """The `p` quantile (0..1) of `lat`, nearest rank, rounded to 3 places."""
+    lat = sorted(lat)
+    return round(lat[min(len(lat) - 1, int(len(lat) * p))], 3)
+
+
+def catalog_texts(n: int, path: Path = DATA_PATH) -> List[str]:
+    """`n` query-like texts (industry, style, type, description) cycling over the catalog entries."""
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            out.append(f"{' '.join(obj.get('industry') or [])} modern {obj.get('type', '')} {obj.get('description', '')}")
+    return [out[i % len(out)] for i in range(n)] if out else ["modern landing page"] * n
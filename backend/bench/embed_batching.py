@@ -0,0 +1,73 @@
+# bench/embed_batching.py
+# Query-embedding throughput and latency under concurrency: every client
+# thread encodes one query at a time, either straight through the model
+# (what request threads did before) or through rag.embedder.BatchingEmbedder.
+# Concurrency 1 shows what micro-batching costs an idle service.
+#   python bench/embed_batching.py [--backend torch] [--clients 1,4,16] [--requests 400] [--out report.json]
+import argparse, json, sys, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.common import catalog_texts, pct  # noqa: E402
+from rag import embedder  # noqa: E402
+
+
+def _drive(model, texts: list, clients: int) -> dict:
+    lat, lock = [], threading.Lock()
+    it = iter(range(len(texts)))
+
+    def client():
+        while True:
+            with lock:
+                i = next(it, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            model.encode([texts[i]], normalize_embeddings=True)
+            dt = (time.perf_counter() - t0) * 1000
+            with lock:
+                lat.append(dt)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return {"qps": round(len(texts) / wall, 1), "p50_ms": pct(lat, 0.50), "p95_ms": pct(lat, 0.95)}
+
+
+def run(backend: str, clients: list, n_requests: int, max_items: int, wait_ms: float, torch_threads: int) -> dict:
+    model = embedder.load_embedder(backend)
+    texts = catalog_texts(n_requests)
+    model.encode(texts[:8])                                        # warm-up
+    results = {}
+    for c in clients:
+        batcher = embedder.BatchingEmbedder(model, max_items, wait_ms, torch_threads)
+        results[str(c)] = {"direct": _drive(model, texts, c), "batched": _drive(batcher, texts, c)}
+        results[str(c)]["batched"].update(batcher.stats())
+    return {"backend": backend, "model": model.name, "requests": n_requests, "max_items": max_items,
+            "wait_ms": wait_ms, "torch_threads": torch_threads, "clients": results}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", type=str, default=embedder.EMBED_BACKEND)
+    ap.add_argument("--clients", type=str, default="1,4,16")
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--max-items", type=int, default=embedder.MICROBATCH_MAX_ITEMS)
+    ap.add_argument("--wait-ms", type=float, default=embedder.MICROBATCH_WAIT_MS)
+    ap.add_argument("--torch-threads", type=int, default=embedder.TORCH_THREADS)
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    report = run(args.backend, [int(c) for c in args.clients.split(",")], args.requests,
+                 args.max_items, args.wait_ms, args.torch_threads)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
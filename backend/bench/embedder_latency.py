@@ -0,0 +1,73 @@
+# bench/embedder_latency.py
+# Query-encoding latency of each embedder backend (rag/embedder.py): torch,
+# onnx fp32 and onnx int8. Single-query p50/p95 (the request path) and
+# batched throughput (index builds, retrieve_by_roles_payload_many), plus
+# cosine drift of each ONNX variant against torch on the same texts.
+# Needs an export first:  python -m rag.embedder export --int8
+#   python bench/embedder_latency.py [--queries 200] [--batch 32] [--threads 0] [--out report.json]
+import argparse, json, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.common import catalog_texts, pct  # noqa: E402
+from rag import embedder  # noqa: E402
+
+def _measure(model, texts: list, batch: int) -> dict:
+    model.encode(texts[:batch], batch_size=batch)                 # warm-up
+    lat = []
+    for t in texts:
+        t0 = time.perf_counter()
+        model.encode([t])
+        lat.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    vecs = model.encode(texts, batch_size=batch)
+    batched_s = time.perf_counter() - t0
+    return {
+        "single_p50_ms": pct(lat, 0.50),
+        "single_p95_ms": pct(lat, 0.95),
+        "batched_ms_per_text": round(batched_s * 1000 / len(texts), 3),
+        "batched_texts_per_s": round(len(texts) / batched_s, 1),
+    }, vecs
+
+
+def run(n_queries: int, batch: int, threads: int, onnx_dir: Path) -> dict:
+    texts = catalog_texts(n_queries)
+    results, ref = {}, None
+    try:
+        results["torch"], ref = _measure(embedder.TorchEmbedder(), texts, batch)
+    except Exception as e:  # e.g. no torch in an onnx-only install
+        results["torch"] = {"error": str(e)}
+    for quant in ("none", "int8"):
+        name = "onnx_int8" if quant == "int8" else "onnx_fp32"
+        try:
+            model = embedder.OnnxEmbedder(onnx_dir, quant, threads)
+        except FileNotFoundError as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name], vecs = _measure(model, texts, batch)
+        results[name]["model_bytes"] = (Path(onnx_dir) / embedder._MODEL_FILES[quant]).stat().st_size
+        if ref is not None:
+            cos = (vecs * ref).sum(axis=1)
+            results[name]["cosine_vs_torch_mean"] = float(cos.mean())
+            results[name]["cosine_vs_torch_min"] = float(cos.min())
+    return {"model": embedder.EMBED_MODEL, "queries": n_queries, "batch": batch, "threads": threads,
+            "results": results}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=embedder.BATCH_SIZE)
+    ap.add_argument("--threads", type=int, default=embedder.ONNX_THREADS)
+    ap.add_argument("--onnx-dir", type=str, default=str(embedder.ONNX_DIR))
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    report = run(args.queries, args.batch, args.threads, Path(args.onnx_dir))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench/quantized_drift.py
+# Memory, recall@k and score drift of each embedding storage (rag/quant.py)
+# against float32: candidates ranked on the stored codes, raw and after the
+# exact re-score of the top RERANK_TOP that retrieval applies, plus the
+# matching faiss flat index size.
+#   python bench/quantized_drift.py [--n 50000] [--queries 200] [--k 10] [--out report.json]
+import argparse, json, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rag import ann, quant  # noqa: E402
+from bench.ann_recall import synthetic, _index_bytes  # noqa: E402
+
+
+def run(n: int, n_queries: int, k: int, dim: int = 384) -> dict:
+    data = synthetic(n, dim, clusters=max(8, n // 500))
+    queries = synthetic(n_queries, dim, clusters=max(8, n // 500), seed=1)
+    exact = queries.dot(data.T)                                   # (Q, N) float32 truth
+    truth = np.argsort(-exact, axis=1)[:, :k]
+    rerank = max(quant.RERANK_TOP, k)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in quant.STORAGES:
+            emb = quant.EmbeddingMatrix(data, storage, Path(tmp) / f"{storage}.f32.npy")
+            lat, lat_rr = [], []
+            found = np.empty((n_queries, k), dtype="int64")
+            reranked = np.empty((n_queries, k), dtype="int64")
+            for i in range(n_queries):
+                t0 = time.perf_counter()
+                s = emb.scores(queries[i])
+                head = np.argpartition(-s, rerank - 1)[:rerank]
+                lat.append((time.perf_counter() - t0) * 1000)
+                found[i] = head[np.argsort(-s[head])][:k]
+                t0 = time.perf_counter()
+                reranked[i] = head[np.argsort(-emb.exact_scores(queries[i], head))][:k]
+                lat_rr.append((time.perf_counter() - t0) * 1000)
+            drift = np.abs(emb.scores_many(queries) - exact)
+            index, _ = ann.make_index(data, "flat", storage)
+            lat.sort()
+            results[storage] = {
+                "memory": emb.memory(),
+                "memory_ratio": round(emb.memory()["float32_equivalent"] / emb.memory()["resident"], 2),
+                f"recall@{k}": round(_recall(found, truth), 4),
+                f"recall@{k}_reranked": round(_recall(reranked, truth), 4),
+                "score_drift_mean": float(drift.mean()),
+                "score_drift_max": float(drift.max()),
+                "scan_p50_ms": round(lat[len(lat) // 2], 4),
+                "scan_p95_ms": round(lat[int(len(lat) * 0.95) - 1], 4),
+                "rerank_p50_ms": round(sorted(lat_rr)[len(lat_rr) // 2], 4),
+                "flat_index_bytes": _index_bytes(index),
+            }
+            del emb
+    return {"entries": n, "dim": dim, "queries": n_queries, "k": k, "rerank_top": rerank, "results": results}
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    report = run(args.n, args.queries, args.k)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# bench/retrieval_eval.py
+# Guardrail for retrieval speed work: freeze what retrieve_by_roles_payload
+# returns today over a query corpus, then score any configuration against it.
+#   freeze  reference config (flat index, float32, no shards, no slates) ->
+#           golden file with the corpus, every query's slate and latencies
+#   score   current env + --set overrides, compared per query with the golden
+#           slate: per-role overlap, overall overlap, exact-match rate, Kendall
+#           tau of the template order on shared items, and latency vs golden
+# The corpus is the bench/common.py industries x styles, with descriptions
+# generated from catalog keywords for that industry plus a share of generic
+# ones. Each run happens in a fresh process with its own index directory, and
+# result caches are off. Scores below --min-overlap / --min-tau exit with 1.
+#   python bench/retrieval_eval.py freeze [--queries 400] [--golden bench/retrieval_golden.json]
+#   python bench/retrieval_eval.py score [--set RAG_INDEX_TYPE=hnsw ...] [--min-overlap 0.9] [--out report.json]
+import argparse, hashlib, json, os, subprocess, sys, tempfile, time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.common import QUERIES, STYLES, pct  # noqa: E402
+from bench.synthetic_catalog import DATA_PATH, load_catalog  # noqa: E402
+
+BACKEND = Path(__file__).resolve().parent.parent
+GOLDEN_PATH = Path(__file__).resolve().parent / "retrieval_golden.json"
+REFERENCE = {"RAG_INDEX_TYPE": "flat", "RAG_EMB_STORAGE": "float32", "RAG_SHARDS": "0", "RAG_SLATES": "0"}
+_CONFIG_KEYS = ("RAG_INDEX_TYPE", "RAG_EMB_STORAGE", "RAG_SHARDS", "RAG_EMBED_BACKEND", "RAG_EMBED_MODEL",
+                "RAG_EMBED_QUANT")
+
+_OPENERS = ["Family-owned", "Award-winning", "Boutique", "Community-focused", "Premium", "Independent", "Modern"]
+_AUDIENCES = ["busy professionals", "young families", "local residents", "small businesses", "tourists",
+              "students", "seniors", "enterprise teams"]
+_GENERIC = ["A website for my business", "We need a new site", "Professional online presence", ""]
+
+
+def corpus(n: int, seed: int = 0, catalog: Path = DATA_PATH) -> List[Dict[str, str]]:
+    """`n` page requests: QUERIES industries x STYLES, generated descriptions, ~10% generic."""
+    rng = np.random.default_rng(seed)
+    words: Dict[str, List[str]] = defaultdict(list)
+    for r in load_catalog(catalog):
+        for ind in r.get("industry") or []:
+            words[ind].extend(str(w) for w in (r.get("imageKeywords") or []) + (r.get("tags") or []))
+    out = []
+    for i in range(n):
+        industry, seed_desc = QUERIES[i % len(QUERIES)]
+        style = STYLES[(i // len(QUERIES)) % len(STYLES)]
+        pool = sorted(set(words.get(industry) or [industry]))
+        roll = rng.random()
+        if roll < 0.1:
+            desc = _GENERIC[int(rng.integers(len(_GENERIC)))]
+        elif roll < 0.2:
+            desc = seed_desc
+        else:
+            kws = rng.choice(pool, size=min(3, len(pool)), replace=False)
+            desc = (f"{rng.choice(_OPENERS)} {industry} business offering {', '.join(kws)} "
+                    f"for {rng.choice(_AUDIENCES)}")
+        out.append({"industry": industry, "style": style, "description": desc})
+    return out
+
+
+# ---- one configuration, in a child process ----
+
+def _child(corpus_path: Path, out_path: Path) -> None:
+    from rag import vectorstore as vs, slates
+    vs.preload()
+    queries = json.loads(corpus_path.read_text(encoding="utf-8"))
+    results, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        payload = vs.retrieve_by_roles_payload(
+            q_terms=[t for t in (q["industry"], q["style"], q["description"][:240]) if t],
+            industry=q["industry"], style=q["style"], need_images=True,
+            role_hints=slates.SLATE_ROLES, k=slates.SLATE_K)
+        lat.append((time.perf_counter() - t0) * 1000)
+        results.append({"templates": [t.get("type") for t in payload.get("templates", [])],
+                        "roles": payload.get("debug", {}).get("roles", {})})
+    effective = {"index_type": vs._INDEX_META.get("effective_type"), "storage": vs.quant.EMB_STORAGE,
+                 "shards": vs.shards.SHARDS_ENABLED, "slates": slates.SLATES_ENABLED,
+                 "embedder": f"{vs.MODEL.backend}:{vs.MODEL.name}"}
+    out_path.write_text(json.dumps({"effective": effective, "results": results, "lat_ms": lat}), encoding="utf-8")
+
+
+def run_config(queries: List[Dict[str, str]], overrides: Dict[str, str], catalog: Path, work_dir: Path) -> dict:
+    env = {**os.environ, **overrides}
+    sig = hashlib.blake2b(json.dumps([str(catalog)] + [env.get(k) for k in _CONFIG_KEYS]).encode(),
+                          digest_size=6).hexdigest()
+    d = work_dir / sig
+    d.mkdir(parents=True, exist_ok=True)
+    env.update(RAG_DATA_PATH=str(catalog), RAG_INDEX_PATH=str(d / "index.faiss"), RAG_SHARD_DIR=str(d / "shards"),
+               CACHE_TTL_EMBEDDING_S="0", CACHE_TTL_RETRIEVAL_S="0")
+    with tempfile.TemporaryDirectory() as tmp:
+        cpath, opath = Path(tmp) / "corpus.json", Path(tmp) / "out.json"
+        cpath.write_text(json.dumps(queries), encoding="utf-8")
+        proc = subprocess.run([sys.executable, __file__, "_child", str(cpath), str(opath)], cwd=BACKEND, env=env,
+                              capture_output=True, text=True)
+        if proc.returncode != 0 or not opath.exists():
+            raise RuntimeError(f"retrieval run failed: {proc.stderr.strip()[-2000:]}")
+        res = json.loads(opath.read_text(encoding="utf-8"))
+    res["config"] = {k: env.get(k) for k in _CONFIG_KEYS}
+    return res
+
+
+# ---- scoring ----
+
+def kendall_tau(a: List[str], b: List[str]) -> Optional[float]:
+    """Kendall tau of the items both orders share, by first occurrence (None with fewer than two)."""
+    pos_b: Dict[str, int] = {}
+    for i, x in enumerate(b):
+        pos_b.setdefault(x, i)
+    common = [x for x in dict.fromkeys(a) if x in pos_b]
+    n = len(common)
+    if n < 2:
+        return None
+    ranks = [pos_b[x] for x in common]
+    conc = sum(1 if ranks[i] < ranks[j] else -1 for i in range(n) for j in range(i + 1, n))
+    return conc / (n * (n - 1) / 2)
+
+
+def _overlap(gold: List[str], cand: List[str]) -> float:
+    return len(set(gold) & set(cand)) / len(set(gold)) if gold else float(not cand)
+
+
+def score(golden: dict, run: dict) -> dict:
+    role_scores: Dict[str, List[float]] = defaultdict(list)
+    overlaps, taus, exact, per_query = [], [], 0, []
+    for q, g, c in zip(golden["corpus"], golden["results"], run["results"]):
+        for role, types in g["roles"].items():
+            role_scores[role].append(_overlap(types, c["roles"].get(role, [])))
+        ov = _overlap(g["templates"], c["templates"])
+        tau = kendall_tau(g["templates"], c["templates"])
+        overlaps.append(ov)
+        if tau is not None:
+            taus.append(tau)
+        exact += g["templates"] == c["templates"]
+        per_query.append((ov, tau if tau is not None else 1.0, q))
+    role_means = {r: round(float(np.mean(v)), 4) for r, v in sorted(role_scores.items())}
+    lat_g, lat_c = golden["lat_ms"], run["lat_ms"]
+    return {
+        "queries": len(overlaps),
+        "overlap": round(float(np.mean(overlaps)), 4),
+        "role_overlap": round(float(np.mean(list(role_means.values()))), 4) if role_means else 1.0,
+        "role_overlap_by_role": role_means,
+        "kendall_tau": round(float(np.mean(taus)), 4) if taus else None,
+        "exact_match_rate": round(exact / max(1, len(overlaps)), 4),
+        "latency": {"p50_ms": pct(lat_c, 0.50), "p95_ms": pct(lat_c, 0.95), "p99_ms": pct(lat_c, 0.99),
+                    "golden_p50_ms": pct(lat_g, 0.50), "golden_p95_ms": pct(lat_g, 0.95),
+                    "p50_ratio": round(pct(lat_c, 0.50) / max(pct(lat_g, 0.50), 1e-9), 3),
+                    "p95_ratio": round(pct(lat_c, 0.95) / max(pct(lat_g, 0.95), 1e-9), 3)},
+        "worst": [{"overlap": round(ov, 3), "kendall_tau": round(t, 3), **q}
+                  for ov, t, q in sorted(per_query, key=lambda x: (x[0], x[1]))[:10]],
+    }
+
+
+def _catalog_sig(catalog: Path) -> Dict[str, Any]:
+    st = catalog.stat()
+    return {"path": str(catalog), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _overrides(pairs: List[str]) -> Dict[str, str]:
+    out = {}
+    for p in pairs:
+        k, sep, v = p.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects KEY=VALUE, got {p!r}")
+        out[k] = v
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    fz = sub.add_parser("freeze", help="record the golden set with the reference configuration")
+    fz.add_argument("--queries", type=int, default=400)
+    fz.add_argument("--seed", type=int, default=0)
+    sc = sub.add_parser("score", help="score the current configuration against the golden set")
+    sc.add_argument("--min-overlap", type=float, default=0.0)
+    sc.add_argument("--min-tau", type=float, default=-1.0)
+    sc.add_argument("--out", type=str, default="")
+    for p in (fz, sc):
+        p.add_argument("--golden", type=str, default=str(GOLDEN_PATH))
+        p.add_argument("--catalog", type=str, default=str(DATA_PATH))
+        p.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="env override for the run")
+        p.add_argument("--work-dir", type=str, default="/tmp/webgenai-eval")
+    ch = sub.add_parser("_child")
+    ch.add_argument("corpus")
+    ch.add_argument("out")
+    args = ap.parse_args()
+
+    if args.cmd == "_child":
+        _child(Path(args.corpus), Path(args.out))
+        return 0
+    catalog, work_dir = Path(args.catalog).resolve(), Path(args.work_dir)
+    if args.cmd == "freeze":
+        queries = corpus(args.queries, args.seed, catalog)
+        res = run_config(queries, {**REFERENCE, **_overrides(args.set)}, catalog, work_dir)
+        golden = {"frozen_at": time.time(), "catalog": _catalog_sig(catalog), "seed": args.seed, "corpus": queries,
+                  **res}
+        Path(args.golden).write_text(json.dumps(golden, ensure_ascii=False), encoding="utf-8")
+        print(json.dumps({"golden": args.golden, "queries": len(queries), "effective": res["effective"],
+                          "p50_ms": pct(res["lat_ms"], 0.5), "p95_ms": pct(res["lat_ms"], 0.95)}, indent=2))
+        return 0
+
+    golden = json.loads(Path(args.golden).read_text(encoding="utf-8"))
+    if golden["catalog"] != _catalog_sig(catalog):
+        print(f"warning: catalog differs from the one frozen ({golden['catalog']['path']})", file=sys.stderr)
+    res = run_config(golden["corpus"], _overrides(args.set), catalog, work_dir)
+    report = {"golden": args.golden, "golden_effective": golden["effective"], "effective": res["effective"],
+              "config": res["config"], **score(golden, res)}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+    failed = report["overlap"] < args.min_overlap or (report["kendall_tau"] or 1.0) < args.min_tau
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# bench/retrieval_suite.py
+# Retrieval benchmark on synthetic catalogs (bench/synthetic_catalog.py) at
+# several sizes. Each size runs in fresh processes so nothing is warm:
+#   build  index build from the catalog file (embedding + FAISS, shards with
+#          RAG_SHARDS=1), and that process's peak RSS
+#   serve  cold load (import, model and preload from the built files), then
+#          p50/p95/p99 of retrieve_by_roles_payload (the request shape main.py
+#          uses) and of search_entries_composite, and peak RSS
+# Result caches and default slates are off unless --with-caches, so the numbers
+# are the retrieval path itself. Index type, storage, shards and embedder
+# follow the usual env (RAG_INDEX_TYPE, RAG_EMB_STORAGE, RAG_SHARDS,
+# RAG_EMBED_BACKEND). With --baseline, each metric is also reported as a
+# ratio to an earlier report (< 1 is better).
+#   python bench/retrieval_suite.py [--sizes 1000,10000,100000] [--queries 200] [--out report.json] [--baseline old.json]
+import argparse, json, os, platform, resource, subprocess, sys, time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.common import QUERIES, STYLES, pct  # noqa: E402
+from bench.synthetic_catalog import load_catalog, profile, write_catalog  # noqa: E402
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+def _peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)   # KiB on Linux
+
+
+def _lat(samples: List[float]) -> Dict[str, float]:
+    return {"p50_ms": pct(samples, 0.50), "p95_ms": pct(samples, 0.95), "p99_ms": pct(samples, 0.99),
+            "mean_ms": round(sum(samples) / len(samples), 3)}
+
+
+def _requests(n: int) -> List[Dict[str, Any]]:
+    """`n` distinct page requests across industries, styles and descriptions."""
+    out = []
+    for i in range(n):
+        industry, desc = QUERIES[i % len(QUERIES)]
+        style = STYLES[(i // len(QUERIES)) % len(STYLES)]
+        out.append({"industry": industry, "style": style, "desc": f"{desc} #{i}"})
+    return out
+
+
+# ---- child processes ----
+
+def _child_build() -> dict:
+    t0 = time.perf_counter()
+    from rag import vectorstore as vs, shards
+    import_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    n = vs.build_index(sharded=shards.SHARDS_ENABLED)
+    return {"entries": n, "import_s": round(import_s, 3), "build_s": round(time.perf_counter() - t0, 3),
+            "peak_rss_mb": _peak_rss_mb()}
+
+
+def _child_serve(n_queries: int) -> dict:
+    t0 = time.perf_counter()
+    from rag import vectorstore as vs, slates
+    info = vs.preload()
+    cold_s = time.perf_counter() - t0
+    reqs = _requests(n_queries)
+
+    def payload(r):
+        return vs.retrieve_by_roles_payload(
+            q_terms=[r["industry"], r["style"], r["desc"]], industry=r["industry"], style=r["style"],
+            need_images=True, role_hints=slates.SLATE_ROLES, k=slates.SLATE_K)
+
+    def composite(r, i):
+        return vs.search_entries_composite([r["industry"], r["style"], r["desc"]], role=vs.ORDER_ROLES[i % 9],
+                                           industry=r["industry"], k=10)
+
+    t0 = time.perf_counter()
+    payload(reqs[0])
+    first_s = time.perf_counter() - t0
+    for i, r in enumerate(_requests(5)):                          # warm-up (distinct texts from the measured ones)
+        composite({**r, "desc": "warm-up " + r["desc"]}, i)
+    lat_p, lat_c = [], []
+    for i, r in enumerate(reqs):
+        t0 = time.perf_counter()
+        payload(r)
+        lat_p.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        composite(r, i)
+        lat_c.append((time.perf_counter() - t0) * 1000)
+    effective = {"index_type": vs._INDEX_META.get("effective_type"), "storage": vs.quant.EMB_STORAGE,
+                 "shards": vs.shards.SHARDS_ENABLED, "embedder": f"{vs.MODEL.backend}:{vs.MODEL.name}"}
+    return {"effective": effective, "cold_load_s": round(cold_s, 3), "preload_s": info["load_s"],
+            "first_request_s": round(first_s, 3),
+            "retrieve_by_roles_payload": _lat(lat_p), "search_entries_composite": _lat(lat_c),
+            "memory": info["memory"], "peak_rss_mb": _peak_rss_mb()}
+
+
+def _spawn(phase: str, env: Dict[str, str], n_queries: int) -> dict:
+    proc = subprocess.run([sys.executable, __file__, "--child", phase, "--queries", str(n_queries)],
+                          cwd=BACKEND, env=env, capture_output=True, text=True)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{phase} failed: {proc.stderr.strip()[-2000:]}")
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+# ---- driver ----
+
+def run(sizes: List[int], n_queries: int, work_dir: Path, seed: int = 0, with_caches: bool = False) -> dict:
+    results = {}
+    for n in sizes:
+        d = work_dir / str(n)
+        catalog = work_dir / f"catalog-{n}-s{seed}.jsonl"
+        if not catalog.exists():
+            write_catalog(catalog, n, seed)
+        env = {**os.environ, "RAG_DATA_PATH": str(catalog), "RAG_INDEX_PATH": str(d / "index.faiss"),
+               "RAG_SHARD_DIR": str(d / "shards")}
+        if not with_caches:
+            env.update(RAG_SLATES="0", CACHE_TTL_EMBEDDING_S="0", CACHE_TTL_RETRIEVAL_S="0")
+        d.mkdir(parents=True, exist_ok=True)
+        build = _spawn("build", env, n_queries)
+        serve = _spawn("serve", env, n_queries)
+        results[str(n)] = {"catalog": profile(load_catalog(catalog)), "catalog_bytes": catalog.stat().st_size,
+                           "build": build, "serve": serve}
+        print(f"{n}: build {build['build_s']}s, cold load {serve['cold_load_s']}s, payload p95 "
+              f"{serve['retrieve_by_roles_payload']['p95_ms']}ms", file=sys.stderr)
+    return {
+        "ts": time.time(), "seed": seed, "queries": n_queries, "with_caches": with_caches,
+        "config": {k: os.getenv(k) for k in ("RAG_INDEX_TYPE", "RAG_EMB_STORAGE", "RAG_SHARDS", "RAG_EMBED_BACKEND",
+                                             "RAG_EMBED_MODEL", "RAG_INDEX_MMAP")},
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "sizes": results,
+    }
+
+
+def compare(report: dict, baseline: dict) -> Dict[str, Dict[str, float]]:
+    """Ratio new / baseline for each headline metric of the sizes both reports have."""
+    def flat(r):
+        out = {"build_s": r["build"]["build_s"], "build_peak_rss_mb": r["build"]["peak_rss_mb"],
+               "cold_load_s": r["serve"]["cold_load_s"], "serve_peak_rss_mb": r["serve"]["peak_rss_mb"]}
+        for fn in ("retrieve_by_roles_payload", "search_entries_composite"):
+            for p in ("p50_ms", "p95_ms", "p99_ms"):
+                out[f"{fn}.{p}"] = r["serve"][fn][p]
+        return out
+    ratios = {}
+    for n, r in report["sizes"].items():
+        if n in baseline.get("sizes", {}):
+            new, old = flat(r), flat(baseline["sizes"][n])
+            ratios[n] = {k: round(new[k] / old[k], 3) for k in new if old.get(k)}
+    return ratios
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=str, default="1000,10000,100000")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--work-dir", type=str, default="/tmp/webgenai-bench")
+    ap.add_argument("--with-caches", action="store_true")
+    ap.add_argument("--baseline", type=str, default="")
+    ap.add_argument("--out", type=str, default="")
+    ap.add_argument("--child", choices=["build", "serve"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        res = _child_build() if args.child == "build" else _child_serve(args.queries)
+        print("RESULT " + json.dumps(res))
+        return
+    report = run([int(n) for n in args.sizes.split(",")], args.queries, Path(args.work_dir), args.seed,
+                 args.with_caches)
+    if args.baseline:
+        report["vs_baseline"] = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
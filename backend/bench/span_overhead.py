@@ -0,0 +1,43 @@
+# bench/span_overhead.py
+# Per-span cost of metrics.span (with and without an active request log).
+# Exits non-zero when a span costs more than SPAN_BUDGET_NS.
+#   python bench/span_overhead.py [iterations]
+import os, sys
+from time import perf_counter_ns
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from metrics import span, begin_request  # noqa: E402
+
+SPAN_BUDGET_NS = int(os.getenv("SPAN_BUDGET_NS", "5000"))
+
+
+def _per_call_ns(n: int) -> float:
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        with span("bench"):
+            pass
+    return (perf_counter_ns() - t0) / n
+
+
+def _baseline_ns(n: int) -> float:
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        pass
+    return (perf_counter_ns() - t0) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    _per_call_ns(10_000)  # warm up
+    base = _baseline_ns(n)
+    idle = _per_call_ns(n) - base
+    begin_request()
+    in_request = _per_call_ns(min(n, 20_000)) - base  # request log grows with n; keep it realistic
+    print(f"span overhead: {idle:.0f} ns (no request), {in_request:.0f} ns (in request), budget {SPAN_BUDGET_NS} ns")
+    if max(idle, in_request) > SPAN_BUDGET_NS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
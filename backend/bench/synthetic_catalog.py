@@ -0,0 +1,107 @@
+# bench/synthetic_catalog.py
+# Synthetic components.jsonl catalogs of any size, for benchmarks on catalogs
+# we don't have yet. Rows are resampled from the real catalog, so the mix of
+# page roles, industries, tag counts and schema sizes follows it. Each row is
+# then made distinct so the embeddings don't collapse onto a few hundred
+# points. It gets a variant type/id, tags redrawn from those seen with the same
+# role, and a few extra description words from the catalog vocabulary.
+#   python bench/synthetic_catalog.py --n 10000 [--seed 0] --out /tmp/catalog-10k.jsonl
+import argparse, copy, json, re, sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "components.jsonl"
+
+_WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def load_catalog(path: Path = DATA_PATH) -> List[Dict[str, Any]]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def synthesize(rows: List[Dict[str, Any]], n: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    tags_by_role: Dict[str, Counter] = defaultdict(Counter)
+    industries: Counter = Counter()
+    vocab: Counter = Counter()
+    for r in rows:
+        tags_by_role[r.get("pageRole") or ""].update(r.get("tags") or [])
+        industries.update(r.get("industry") or [])
+        vocab.update(_WORD_RE.findall((r.get("description") or "").lower()))
+    pools = {role: (list(c), np.array(list(c.values()), dtype="float64") / sum(c.values()))
+             for role, c in tags_by_role.items()}
+    ind_names = list(industries)
+    ind_p = np.array(list(industries.values()), dtype="float64") / max(1, sum(industries.values()))
+    words = np.array(list(vocab))
+
+    for i in range(n):
+        src = rows[int(rng.integers(len(rows)))]
+        r = copy.deepcopy(src)
+        r["type"] = f"{src.get('type', 'Component')}V{i}"
+        if "id" in src:
+            r["id"] = f"{src['id']}-s{i}"
+        names, p = pools[src.get("pageRole") or ""]
+        k = min(len(src.get("tags") or []), len(names))
+        if k:
+            r["tags"] = [str(t) for t in rng.choice(names, size=k, replace=False, p=p)]
+        if r.get("industry") and ind_names and rng.random() < 0.2:
+            r["industry"][int(rng.integers(len(r["industry"])))] = str(rng.choice(ind_names, p=ind_p))
+            r["industry"] = list(dict.fromkeys(r["industry"]))
+        if len(words):
+            extra = " ".join(rng.choice(words, size=3))
+            r["description"] = f"{src.get('description') or ''} {extra}".strip()
+        yield r
+
+
+def profile(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Distribution summary used to check a synthetic catalog against the real one."""
+    n = max(1, len(rows))
+    roles = Counter(r.get("pageRole") or "none" for r in rows)
+    inds = Counter(t for r in rows for t in (r.get("industry") or []))
+    return {
+        "entries": len(rows),
+        "roles": {k: round(v / n, 4) for k, v in sorted(roles.items())},
+        "top_industries": {k: round(v / n, 4) for k, v in inds.most_common(10)},
+        "mean_tags": round(sum(len(r.get("tags") or []) for r in rows) / n, 3),
+        "mean_schema_keys": round(sum(len(r.get("propsSchema") or {}) for r in rows) / n, 3),
+        "with_images": round(sum(1 for r in rows if r.get("imagesRequired")) / n, 4),
+    }
+
+
+def write_catalog(path: Path, n: int, seed: int = 0, source: Path = DATA_PATH) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for r in synthesize(load_catalog(source), n, seed):
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    tmp.replace(path)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=str, required=True)
+    args = ap.parse_args()
+    path = write_catalog(Path(args.out), args.n, args.seed)
+    print(json.dumps({"path": str(path), "real": profile(load_catalog()), "synthetic": profile(load_catalog(path))},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# bench/worker_rss.py
+# Per-worker memory as the worker count grows. By default it mirrors
+# gunicorn's preload_app (gunicorn.conf.py): retrieval is loaded here, then N
+# workers are forked and each runs a few retrievals; with --no-preload every
+# worker loads on its own (like `uvicorn --workers N`). Memory is read from
+# /proc/<pid>/smaps_rollup while all workers are alive: uss is what one more
+# worker costs and should stay flat as N grows.
+#   python bench/worker_rss.py [--workers 1,2,4,8] [--no-preload] [--out report.json]
+import argparse, json, os, sys, time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.common import QUERIES  # noqa: E402
+from metrics import process_memory  # noqa: E402
+
+
+def fork_workers(n: int, work: Callable[[], None]) -> List[Dict[str, int]]:
+    """
+    Fork `n` children that each run `work()` and then wait. Once all are done,
+    each child's memory is read (process_memory) before they are released,
+    so shared pages are split n ways in pss.
+    """
+    ready_r, ready_w = os.pipe()
+    release_r, release_w = os.pipe()
+    pids = []
+    for _ in range(n):
+        pid = os.fork()
+        if pid == 0:  # child
+            code = 0
+            try:
+                os.close(ready_r)
+                os.close(release_w)
+                work()
+            except BaseException:
+                code = 1
+            os.write(ready_w, b"1" if code == 0 else b"0")
+            os.read(release_r, 1)                                   # EOF when the parent is done measuring
+            os._exit(code)
+        pids.append(pid)
+    os.close(ready_w)
+    os.close(release_r)
+    ok = b""
+    while len(ok) < n:
+        chunk = os.read(ready_r, n)
+        if not chunk:
+            break
+        ok += chunk
+    mems = [process_memory(str(pid)) for pid in pids]
+    os.close(release_w)
+    os.close(ready_r)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    if ok != b"1" * n:
+        raise RuntimeError(f"worker failed: {ok!r}")
+    return mems
+
+
+def _retrieval_work(preloaded: bool) -> Callable[[], None]:
+    from rag import vectorstore
+
+    def work():
+        if not preloaded:
+            vectorstore.preload()
+        for industry, desc in QUERIES:
+            vectorstore.retrieve_by_roles_payload(q_terms=[industry, "modern", desc[:100]], industry=industry,
+                                                  style="modern", need_images=False, k=8)
+    return work
+
+
+def _summary(mems: List[Dict[str, int]]) -> Dict[str, float]:
+    mb = 1024 * 1024
+    return {f"{k}_mb_{agg}": round(fn(m[k] for m in mems) / mb, 1)
+            for k in ("rss", "pss", "uss") for agg, fn in (("max", max), ("total", sum))}
+
+
+def run(workers: List[int], preload: bool = True) -> dict:
+    t0 = time.perf_counter()
+    info: Optional[dict] = None
+    if preload:
+        import gc
+        from rag import vectorstore
+        info = vectorstore.preload()
+        _retrieval_work(True)()                                    # warm-up (and touch the shared pages)
+        gc.collect()
+        gc.freeze()
+    master = process_memory()
+    work = _retrieval_work(preload)
+    results = {str(n): _summary(fork_workers(n, work)) for n in workers}
+    return {"preload": preload, "preload_info": info, "master_rss_mb": round(master.get("rss", 0) / 2**20, 1),
+            "setup_s": round(time.perf_counter() - t0, 2), "workers": results}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=str, default="1,2,4,8")
+    ap.add_argument("--no-preload", action="store_true")
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    report = run([int(n) for n in args.workers.split(",")], preload=not args.no_preload)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+# backend/cache.py
+import hashlib, json, os, socket, sqlite3, struct, threading, time, zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+from logutil import get_logger, kv
+from metrics import register_gauge
+
+log = get_logger("cache")
+
+# Result caches (query embeddings, retrieval payloads, generated sites). Each
+# cache has two tiers:
+#   L1  per-process LRU of packed values, bounded by entries and bytes
+#   L2  optional backend shared by every worker (and surviving restarts), so
+#       N workers warm one cache instead of N:
+#         sqlite              one WAL-mode file on the local disk (one host)
+#         redis://host:6379/0 any Redis-protocol server (redis, valkey, ...)
+# A failing L2 never fails a request: the lookup counts as a miss.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "none")                  # none | sqlite | redis://[:pw@]host:port/db
+CACHE_SQLITE_PATH = Path(os.getenv("CACHE_SQLITE_PATH", Path(__file__).resolve().parent / "data" / "cache.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))       # sqlite file payload bound
+CACHE_MAX_VALUE_BYTES = int(os.getenv("CACHE_MAX_VALUE_BYTES", str(1024 * 1024)))  # larger values are not cached
+CACHE_L1_MAX_ITEMS = int(os.getenv("CACHE_L1_MAX_ITEMS", "2048"))                  # per cache, per process
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_REDIS_TIMEOUT_S = float(os.getenv("CACHE_REDIS_TIMEOUT_S", "0.25"))
+CACHE_RETRY_S = float(os.getenv("CACHE_RETRY_S", "5"))             # L2 is skipped this long after an error
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "webgenai:")
+
+# TTL per cache; 0 disables that cache
+CACHE_TTL_EMBEDDING_S = float(os.getenv("CACHE_TTL_EMBEDDING_S", str(7 * 24 * 3600)))
+CACHE_TTL_RETRIEVAL_S = float(os.getenv("CACHE_TTL_RETRIEVAL_S", "3600"))
+CACHE_TTL_SITE_S = float(os.getenv("CACHE_TTL_SITE_S", "0"))       # opt-in: repeats would get the same site
+
+_KEY_VERSION = "1"          # bump when a cached value's shape changes
+_ZLIB_MIN_BYTES = 512       # JSON shorter than this is stored as is
+_ZLIB_LEVEL = 3
+
+# ---- packing: one tag byte, then the body ----
+#   J  compact UTF-8 JSON
+#   Z  zlib'ed compact JSON
+#   N  numpy array: <B dtype-len> dtype <B ndim> <I dim>* raw bytes
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+
+def pack(value: Any) -> bytes:
+    if isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        dt = arr.dtype.str.encode("ascii")
+        head = struct.pack(f"<B{len(dt)}sB{arr.ndim}I", len(dt), dt, arr.ndim, *arr.shape)
+        return b"N" + head + arr.tobytes()
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+    if len(raw) < _ZLIB_MIN_BYTES:
+        return b"J" + raw
+    return b"Z" + zlib.compress(raw, _ZLIB_LEVEL)
+
+
+def unpack(blob: bytes) -> Any:
+    tag, body = blob[:1], memoryview(blob)[1:]
+    if tag == b"J":
+        return json.loads(bytes(body))
+    if tag == b"Z":
+        return json.loads(zlib.decompress(body))
+    if tag == b"N":
+        n = body[0]
+        dt = bytes(body[1:1 + n]).decode("ascii")
+        ndim = body[1 + n]
+        off = 2 + n + 4 * ndim
+        shape = struct.unpack(f"<{ndim}I", body[2 + n:off])
+        return np.frombuffer(body[off:], dtype=dt).reshape(shape).copy()
+    raise ValueError(f"unknown cache value tag {tag!r}")
+
+
+# ---- L2 backends ----
+
+class CacheBackend:
+    """Shared tier. get/set/delete may raise; TieredCache counts that as an error."""
+
+    name = "none"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key         TEXT PRIMARY KEY,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires_at);
+"""
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    One SQLite file in WAL mode shared by all workers on the host (one
+    connection per thread, like jobs.JobStore). Reads never write; expired
+    rows are dropped and the size bound is enforced every `purge_every` sets
+    per process, evicting the rows closest to expiry first.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path = CACHE_SQLITE_PATH, max_bytes: int = CACHE_MAX_BYTES, purge_every: int = 256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.purge_every = max(1, purge_every)
+        self._local = threading.local()
+        self._sets = 0
+        self.evictions = 0
+        self._conn().executescript(_SQLITE_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                                   (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO cache (key, value, size, expires_at) VALUES (?, ?, ?, ?)",
+                             (key, value, len(value), time.time() + ttl_s))
+        self._sets += 1
+        if self._sets % self.purge_every == 0:
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge(self) -> int:
+        """Drop expired rows, then evict down to 90% of max_bytes. Returns rows removed."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total > self.max_bytes:
+            excess, victims = total - int(self.max_bytes * 0.9), []
+            for key, size in conn.execute("SELECT key, size FROM cache ORDER BY expires_at"):
+                if excess <= 0:
+                    break
+                victims.append((key,))
+                excess -= size
+            conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+            removed += len(victims)
+            self.evictions += len(victims)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        rows, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"backend": self.name, "path": str(self.path), "items": rows, "bytes": size,
+                "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class RespError(Exception):
+    pass
+
+
+class RespBackend(CacheBackend):
+    """
+    Minimal Redis-protocol (RESP2) client: GET, SET .. PX, DEL, plus AUTH and
+    SELECT on connect. One socket per thread, reopened after fork or an error.
+    Size bounds are the server's (maxmemory + an eviction policy); every key
+    carries its TTL.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, timeout_s: float = CACHE_REDIS_TIMEOUT_S):
+        u = urlparse(url)
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 6379
+        self.password = unquote(u.password) if u.password else None
+        self.username = unquote(u.username) if u.username else None
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        self._local.conn = conn
+        if self.password:
+            self._call(*(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)))
+        if self.db:
+            self._call("SELECT", str(self.db))
+        return conn
+
+    def _call(self, *args):
+        conn = getattr(self._local, "conn", None) or self._connect()
+        sock, rfile = conn
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        try:
+            sock.sendall(b"".join(out))
+            return self._reply(rfile)
+        except (OSError, EOFError):
+            self.close()
+            raise
+
+    def _reply(self, rfile):
+        line = rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise EOFError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RespError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = rfile.read(n + 2)
+            if len(data) != n + 2:
+                raise EOFError("connection closed")
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._reply(rfile) for _ in range(n)]
+        raise RespError(f"bad reply: {line[:32]!r}")
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            for f in reversed(conn):
+                try:
+                    f.close()
+                except OSError:
+                    pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call("GET", key)
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        self._call("SET", key, value, "PX", str(max(1, int(ttl_s * 1000))))
+
+    def delete(self, key: str) -> None:
+        self._call("DEL", key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "host": self.host, "port": self.port, "db": self.db}
+
+
+def open_backend(spec: str = CACHE_BACKEND) -> CacheBackend:
+    spec = (spec or "none").strip()
+    if spec in ("", "none", "0"):
+        return CacheBackend()
+    if spec == "sqlite":
+        return SQLiteBackend()
+    if spec.startswith(("redis://", "rediss://")):
+        if spec.startswith("rediss://"):
+            raise ValueError("CACHE_BACKEND: TLS (rediss://) is not supported, use a local TLS proxy")
+        return RespBackend(spec)
+    raise ValueError(f"CACHE_BACKEND must be none, sqlite or redis://..., got {spec!r}")
+
+
+# ---- two-tier cache ----
+
+class TieredCache:
+    """
+    get/set of JSON-able values or numpy arrays by key. L1 holds packed
+    bytes, so every get returns a fresh object that callers may mutate.
+    """
+
+    def __init__(self, name: str, ttl_s: float, l2: Optional[CacheBackend] = None,
+                 l1_items: int = CACHE_L1_MAX_ITEMS, l1_bytes: int = CACHE_L1_MAX_BYTES,
+                 max_value_bytes: int = CACHE_MAX_VALUE_BYTES):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.l2 = l2 if l2 is not None else CacheBackend()
+        self.l1_items = l1_items
+        self.l1_bytes = l1_bytes
+        self.max_value_bytes = max_value_bytes
+        self._l1: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._l1_size = 0
+        self._lock = threading.Lock()
+        self._l2_down_until = 0.0
+        self.counts = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0, "skipped": 0, "l2_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    def key(self, *parts) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{CACHE_PREFIX}{self.name}:{_KEY_VERSION}:{digest}"
+
+    def get(self, key: str) -> Any:
+        """Cached value or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._l1.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._l1.move_to_end(key)
+                    self.counts["l1_hits"] += 1
+                    return unpack(hit[1])
+                self._l1_drop(key)
+        blob = self._l2_op("get", key)
+        if blob is None:
+            self._count("misses")
+            return None
+        self._count("l2_hits")
+        self._l1_put(key, blob, now)
+        return unpack(blob)
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        try:
+            blob = pack(value)
+        except (TypeError, ValueError) as e:
+            self._count("skipped")
+            log.warning("value not cacheable", extra=kv(cache=self.name, error=str(e)))
+            return
+        if len(blob) > self.max_value_bytes:
+            self._count("skipped")
+            return
+        self._count("sets")
+        self._l1_put(key, blob, time.time())
+        self._l2_op("set", key, blob, self.ttl_s)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._l1_drop(key)
+        self._l2_op("delete", key)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._l1.clear()
+            self._l1_size = 0
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _l1_put(self, key: str, blob: bytes, now: float) -> None:
+        if len(blob) > self.l1_bytes:
+            return
+        with self._lock:
+            self._l1_drop(key)
+            self._l1[key] = (now + self.ttl_s, blob)
+            self._l1_size += len(blob)
+            while len(self._l1) > self.l1_items or self._l1_size > self.l1_bytes:
+                _, (_, old) = self._l1.popitem(last=False)
+                self._l1_size -= len(old)
+
+    def _l1_drop(self, key: str) -> None:
+        old = self._l1.pop(key, None)
+        if old is not None:
+            self._l1_size -= len(old[1])
+
+    def _l2_op(self, op: str, *args):
+        if self.l2.name == "none" or time.monotonic() < self._l2_down_until:
+            return None
+        try:
+            return getattr(self.l2, op)(*args)
+        except Exception as e:
+            self._l2_down_until = time.monotonic() + CACHE_RETRY_S
+            self._count("l2_errors")
+            log.warning("cache backend error, skipping it for a while",
+                        extra=kv(cache=self.name, backend=self.l2.name, op=op, error=str(e), retry_s=CACHE_RETRY_S))
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counts)
+            items, size = len(self._l1), self._l1_size
+        lookups = c["l1_hits"] + c["l2_hits"] + c["misses"]
+        past_l1 = lookups - c["l1_hits"]
+        return {
+            **c, "lookups": lookups, "l1_items": items, "l1_bytes": size, "ttl_s": self.ttl_s,
+            "backend": self.l2.name,
+            # per tier: share of the lookups that reached the tier and were answered there
+            "l1_hit_rate": round(c["l1_hits"] / lookups, 4) if lookups else 0.0,
+            "l2_hit_rate": round(c["l2_hits"] / past_l1, 4) if past_l1 else 0.0,
+            "hit_rate": round((c["l1_hits"] + c["l2_hits"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_CACHES: Dict[str, TieredCache] = {}
+_BACKEND: Optional[CacheBackend] = None
+
+
+def shared_backend() -> CacheBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        try:
+            _BACKEND = open_backend(CACHE_BACKEND)
+        except Exception as e:
+            log.warning("cache backend unavailable, using per-process caches only",
+                        extra=kv(backend=CACHE_BACKEND, error=str(e)))
+            _BACKEND = CacheBackend()
+    return _BACKEND
+
+
+def get_cache(name: str, ttl_s: float) -> TieredCache:
+    """The process-wide cache `name`, created on first use over the shared L2 backend."""
+    c = _CACHES.get(name)
+    if c is None:
+        c = _CACHES.setdefault(name, TieredCache(name, ttl_s, shared_backend()))
+    return c
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: c.stats() for name, c in _CACHES.items()}
+
+
+_GAUGE_KINDS: List[str] = ["l1_hits", "l2_hits", "misses", "sets", "skipped", "l2_errors", "l1_items", "l1_bytes",
+                           "l1_hit_rate", "l2_hit_rate", "hit_rate"]
+
+
+def _cache_gauge():
+    return {(("cache", name), ("kind", kind)): st[kind]
+            for name, st in cache_stats().items() for kind in _GAUGE_KINDS}
+
+
+register_gauge("webgenai_result_cache", _cache_gauge, "Result caches by tier (counts are cumulative per worker)")
@@ -0,0 +1,242 @@
+# backend/capture.py
+import gzip, json, os, time
+import hashlib
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from logutil import get_logger, kv
+
+log = get_logger("capture")
+
+# Raw model output capture (replaces the old /tmp/backend.json overwrite).
+# Records go through a bounded queue to one background writer per process,
+# land in NDJSON segments, and are gzip'ed on rotation. The directory is shared
+# by every worker process: any segment can be rotated or evicted by another
+# worker between listing and opening it.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "1") == "1"
+CAPTURE_DIR = Path(os.getenv("CAPTURE_DIR", "/tmp/webgenai-captures"))
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.02"))         # 0..1, per request id
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "256"))
+CAPTURE_SEGMENT_BYTES = int(os.getenv("CAPTURE_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(256 * 1024 * 1024)))  # total on disk
+CAPTURE_INDEX_SIZE = 4096  # recent request_id -> segment, for fast lookups
+
+_SEGMENT_PREFIX = "capture-"
+
+
+def prompt_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update((p or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:16]
+
+
+class CaptureWriter:
+    """
+    Non-blocking capture sink. `submit()` never touches the disk: it either
+    enqueues the record or counts it as dropped when the queue is full.
+    """
+
+    def __init__(
+            self,
+            directory: Path = CAPTURE_DIR,
+            sample_rate: float = CAPTURE_SAMPLE_RATE,
+            queue_size: int = CAPTURE_QUEUE_SIZE,
+            segment_bytes: int = CAPTURE_SEGMENT_BYTES,
+            max_bytes: int = CAPTURE_MAX_BYTES,
+            enabled: bool = CAPTURE_ENABLED,
+    ):
+        self.directory = Path(directory)
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._seg_path: Optional[Path] = None
+        self._seg_file = None
+        self._seg_seq = 0
+        self._index: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {"submitted": 0, "sampled_out": 0, "dropped": 0, "written": 0, "rotations": 0, "errors": 0}
+
+    # ---- producer side (request path) ----
+    def sampled(self, request_id: str) -> bool:
+        """Deterministic per request id so a request is either fully captured or not."""
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0:
+            return False
+        bucket = int(hashlib.sha1(request_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+    def wants(self, request_id: str) -> bool:
+        """Will a record for this request be kept? Check before building one."""
+        if not self.enabled:
+            return False
+        if not self.sampled(request_id):
+            self.stats["sampled_out"] += 1
+            return False
+        return True
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        if not self.wants(str(record.get("request_id") or "")):
+            return False
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---- writer thread ----
+    def _run(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        while True:
+            rec = self._queue.get()
+            if rec is None:
+                break
+            batch = [rec]
+            # drain whatever else is waiting, then flush once
+            while len(batch) < 64:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._write(batch)
+                    self._close_segment(compress=False)
+                    return
+                batch.append(nxt)
+            self._write(batch)
+        self._close_segment(compress=False)
+
+    def _open_segment(self) -> None:
+        self._seg_seq += 1
+        name = f"{_SEGMENT_PREFIX}{os.getpid()}-{int(time.time() * 1000)}-{self._seg_seq}.ndjson"
+        self._seg_path = self.directory / name
+        self._seg_file = open(self._seg_path, "a", encoding="utf-8")
+
+    def _close_segment(self, compress: bool = True) -> None:
+        if self._seg_file is None:
+            return
+        self._seg_file.close()
+        path, self._seg_file, self._seg_path = self._seg_path, None, None
+        if not compress:
+            return
+        gz_path = path.with_suffix(".ndjson.gz")
+        with open(path, "rb") as src, gzip.open(gz_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        path.unlink()
+        for rid, seg in self._index.items():
+            if seg == path.name:
+                self._index[rid] = gz_path.name
+        self.stats["rotations"] += 1
+        self._enforce_cap()
+
+    def _write(self, batch: List[dict]) -> None:
+        try:
+            if self._seg_file is None:
+                self._open_segment()
+            for rec in batch:
+                self._seg_file.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+                rid = rec.get("request_id")
+                if rid:
+                    self._index[rid] = self._seg_path.name
+                    self._index.move_to_end(rid)
+                    while len(self._index) > CAPTURE_INDEX_SIZE:
+                        self._index.popitem(last=False)
+            self._seg_file.flush()
+            self.stats["written"] += len(batch)
+            if self._seg_file.tell() >= self.segment_bytes:
+                self._close_segment(compress=True)
+        except Exception as e:
+            self.stats["errors"] += 1
+            log.warning("capture write failed", extra=kv(error=str(e)))
+
+    def _enforce_cap(self) -> None:
+        """
+        Evict the oldest rotated (.ndjson.gz) segments until the directory
+        fits in max_bytes. Open .ndjson segments, this worker's or another's,
+        are counted but never deleted.
+        """
+        files = self._segments()
+        total = sum(st.st_size for _, st in files)
+        for p, st in files:
+            if total <= self.max_bytes:
+                break
+            if not p.name.endswith(".ndjson.gz"):
+                continue
+            total -= st.st_size
+            p.unlink(missing_ok=True)
+
+    # ---- lookup ----
+    def _segments(self) -> List[Tuple[Path, os.stat_result]]:
+        """(path, stat) of every segment, oldest first; segments that vanish meanwhile are skipped."""
+        try:
+            paths = [p for p in self.directory.iterdir() if p.name.startswith(_SEGMENT_PREFIX)]
+        except FileNotFoundError:
+            return []
+        out = []
+        for p in paths:
+            try:
+                out.append((p, p.stat()))
+            except FileNotFoundError:   # rotated or evicted by another worker
+                continue
+        return sorted(out, key=lambda x: x[1].st_mtime)
+
+    @staticmethod
+    def _scan(path: Path, request_id: str) -> Optional[dict]:
+        opener = gzip.open if path.suffix == ".gz" else open
+        needle = f'"request_id":"{request_id}"'
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if needle in line:
+                        return json.loads(line)
+        except (OSError, EOFError, json.JSONDecodeError):
+            return None
+        return None
+
+    def find(self, request_id: str) -> Optional[dict]:
+        """
+        Look a capture up by request id: the in-process index first, then
+        every segment on disk (newest first; covers other worker processes).
+        """
+        seg = self._index.get(request_id)
+        if seg:
+            hit = self._scan(self.directory / seg, request_id)
+            if hit:
+                return hit
+        for path, _ in reversed(self._segments()):
+            hit = self._scan(path, request_id)
+            if hit:
+                return hit
+        return None
+
+
+CAPTURE = CaptureWriter()
@@ -0,0 +1,46 @@
+# backend/gunicorn.conf.py
+# Production server, from backend/:
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# With preload_app the app is imported once in the master and retrieval is
+# loaded there too (when_ready -> rag.vectorstore.preload()), then workers
+# fork. What each worker shares instead of copying:
+#   - catalog embeddings and FAISS index: memory-mapped files (rag/quant.py,
+#     RAG_INDEX_MMAP in rag/ann.py), so the page cache holds one copy even
+#     without preload (e.g. `uvicorn --workers N`)
+#   - the torch model, catalog entries, lexical stats and default slates: inherited
+#     copy-on-write; gc.freeze() keeps the collector from touching (and so
+#     copying) those objects in the workers
+# Anything that must not cross fork is created per process on first use: the
+# embedding batch thread, onnxruntime sessions, SQLite connections, job and
+# capture threads (started by the app's startup hooks, i.e. in each worker).
+#
+# Per-worker memory for retrieval (bench/worker_rss.py, MiniLM-sized model,
+# 339-entry catalog; test_worker_memory.py checks the catalog part stays shared):
+#   preload:    uss 10.8 MB per worker at 1 and at 4 workers (pss 327 -> 137 MB)
+#   no preload: uss 134-188 MB per worker (each has its own model and catalog)
+# A worker that has served a few /api/generate-website requests is at ~95 MB
+# uss (Gemini client, inference buffers); see webgenai_process_memory_bytes.
+import gc, os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # master, after the app import and before the first fork
+    if not preload_app:
+        return
+    from rag import vectorstore
+    info = vectorstore.preload()
+    mem = info["memory"]
+    server.log.info("retrieval preloaded: entries=%s load_s=%s storage=%s private_bytes=%s",
+                    info["entries"], info["load_s"], mem.get("storage"), mem.get("private"))
+    gc.collect()
+    gc.freeze()
+
@@ -0,0 +1,319 @@
+# backend/jobs.py
+import json, os, re, time, uuid, random
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from logutil import get_logger, kv
+
+log = get_logger("jobs")
+
+# Where jobs and their results live (one SQLite file shared by API + worker processes)
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", Path(__file__).resolve().parent / "data" / "jobs.sqlite3"))
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))                    # 0 = this process only enqueues
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_BASE_S = float(os.getenv("JOB_BACKOFF_BASE_S", "2.0"))  # 2s, 4s, 8s ... (+ jitter)
+JOB_BACKOFF_MAX_S = float(os.getenv("JOB_BACKOFF_MAX_S", "60"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))                # running jobs past their lease are re-claimed
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", str(24 * 3600)))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "0.5"))
+JOB_PURGE_INTERVAL_S = float(os.getenv("JOB_PURGE_INTERVAL_S", "600"))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    req_hash     TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    result       TEXT,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL,
+    next_run_at  REAL NOT NULL,
+    lease_until  REAL,
+    expires_at   REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_req_hash ON jobs(req_hash);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs(status, next_run_at);
+"""
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_request(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical form used for dedup: trimmed/collapsed whitespace everywhere,
+    case-folded industry/style, empty strings treated as missing.
+    """
+    out: Dict[str, Any] = {}
+    for k, v in sorted((payload or {}).items()):
+        if isinstance(v, str):
+            v = _WS_RE.sub(" ", v).strip()
+            if k in ("industry", "style"):
+                v = v.lower()
+            if not v:
+                continue
+        if v is None:
+            continue
+        out[k] = v
+    return out
+
+
+def request_hash(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(normalize_request(payload), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _backoff_s(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX_S, JOB_BACKOFF_BASE_S * (2 ** max(0, attempts - 1)))
+    return delay * (0.8 + 0.4 * random.random())
+
+
+class JobStore:
+    """
+    SQLite-backed job table (WAL mode, one connection per thread).
+    Safe to share between API processes and dedicated worker processes.
+    """
+
+    def __init__(self, path: Path = JOBS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+        # normally opened after fork (startup hook), but a store built before
+        # one must not hand its SQLite connection to the child
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- producer side ----
+    def submit(self, payload: Dict[str, Any]) -> Tuple[str, str, bool]:
+        """
+        Enqueue a generation, or return the live job for an identical request.
+        Returns (job_id, status, deduped).
+        """
+        h = request_hash(payload)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, status FROM jobs WHERE req_hash = ? AND status != ? "
+                "AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1",
+                (h, STATUS_FAILED, now),
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                return row["id"], row["status"], True
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, req_hash, status, payload, created_at, updated_at, next_run_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, h, STATUS_QUEUED, json.dumps(payload, ensure_ascii=False), now, now, now),
+            )
+            conn.execute("COMMIT")
+            return job_id, STATUS_QUEUED, False
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def adopt(self, payload: Dict[str, Any]) -> str:
+        """
+        Register a generation that is already running in this process (e.g. a
+        model call that outlived its request). It is stored as running with a
+        lease, so if nobody completes it a worker re-claims it after JOB_LEASE_S.
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, req_hash, status, payload, attempts, created_at, updated_at, next_run_at, "
+            "lease_until) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)",
+            (job_id, request_hash(payload), STATUS_RUNNING, json.dumps(payload, ensure_ascii=False),
+             now, now, now, now + JOB_LEASE_S),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or (row["expires_at"] and row["expires_at"] <= time.time()):
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    # ---- worker side ----
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest runnable job (queued and due, or running
+        with an expired lease) and mark it running. Every claim counts as an
+        attempt: a job whose lease ran out with no attempts left (its worker
+        kept dying) is marked failed instead of being claimed again.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, status, attempts FROM jobs WHERE (status = ? AND next_run_at <= ?) "
+                    "OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (STATUS_QUEUED, now, STATUS_RUNNING, now),
+                ).fetchone()
+                if not row:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] != STATUS_RUNNING or row["attempts"] < JOB_MAX_ATTEMPTS:
+                    break
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?, expires_at = ? "
+                    "WHERE id = ?",
+                    (STATUS_FAILED, f"lease expired after {row['attempts']} attempts", now,
+                     now + JOB_RESULT_TTL_S, row["id"]),
+                )
+                log.warning("job lease expired, no attempts left",
+                            extra=kv(job_id=row["id"], attempts=row["attempts"]))
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, now + JOB_LEASE_S, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, "
+            "updated_at = ?, expires_at = ? WHERE id = ?",
+            (STATUS_SUCCEEDED, json.dumps(result, ensure_ascii=False), now, now + JOB_RESULT_TTL_S, job_id),
+        )
+
+    def fail(self, job_id: str, error: str, attempts: int) -> str:
+        """
+        Record a failed attempt: re-queue with exponential backoff, or mark
+        the job failed once JOB_MAX_ATTEMPTS is reached. Returns the new status.
+        """
+        now = time.time()
+        if attempts < JOB_MAX_ATTEMPTS:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, next_run_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (STATUS_QUEUED, error, now + _backoff_s(attempts), now, job_id),
+            )
+            return STATUS_QUEUED
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?, expires_at = ? WHERE id = ?",
+            (STATUS_FAILED, error, now, now + JOB_RESULT_TTL_S, job_id),
+        )
+        return STATUS_FAILED
+
+    def purge_expired(self) -> int:
+        cur = self._conn().execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        return cur.rowcount or 0
+
+
+class WorkerPool:
+    """
+    N daemon threads that claim jobs from the store and run `runner(payload)`.
+    `runner` returns the result dict; raising (or returning success=False)
+    counts as a failed attempt and is retried with backoff.
+    """
+
+    def __init__(self, store: JobStore, runner: Callable[[Dict[str, Any]], Dict[str, Any]], workers: int = JOB_WORKERS):
+        self.store = store
+        self.runner = runner
+        self.workers = max(0, workers)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_purge = 0.0
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge >= JOB_PURGE_INTERVAL_S:
+            self._last_purge = now
+            n = self.store.purge_expired()
+            if n:
+                log.info("purged expired jobs", extra=kv(purged=n))
+
+    def run_once(self) -> bool:
+        """Claim and run a single job. Returns False when nothing was runnable."""
+        job = self.store.claim()
+        if not job:
+            return False
+        try:
+            result = self.runner(job["payload"])
+            if isinstance(result, dict) and result.get("success") is False:
+                raise RuntimeError(result.get("error") or "generation returned success=false")
+            self.store.complete(job["id"], result)
+        except Exception as e:
+            status = self.store.fail(job["id"], str(e), job["attempts"])
+            log.warning("job attempt failed",
+                        extra=kv(job_id=job["id"], attempt=job["attempts"], status=status, error=str(e)))
+        return True
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._maybe_purge()
+                if not self.run_once():
+                    self._stop.wait(JOB_POLL_INTERVAL_S)
+            except Exception:
+                log.exception("job worker error")
+                self._stop.wait(JOB_POLL_INTERVAL_S)
+
+
+if __name__ == "__main__":
+    # Dedicated worker process: run API processes with JOB_WORKERS=0 and
+    # scale these independently (they share JOBS_DB_PATH).
+    from main import run_generation_job, job_store
+
+    pool = WorkerPool(job_store(), run_generation_job, workers=max(1, JOB_WORKERS))
+    pool.start()
+    log.info("job workers started", extra=kv(workers=pool.workers, db=str(JOBS_DB_PATH)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
@@ -0,0 +1,193 @@
+# backend/json_recovery.py
+import json, re
+from typing import Any, Dict, List, Optional, Tuple
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_PARTIAL_ID_RE = re.compile(r'"id"\s*:\s*"([^"]*)"')
+_PARTIAL_TYPE_RE = re.compile(r'"type"\s*:\s*"([^"]*)"')
+
+
+def _strip_fences(text: str) -> str:
+    """Models sometimes wrap JSON in ```json fences even with a JSON mime type."""
+    return _FENCE_RE.sub("", text or "").strip()
+
+
+def _skip(text: str, pos: int, extra: str = "") -> int:
+    """Advance past whitespace (and any chars in `extra`, e.g. stray commas)."""
+    chars = _WS + extra
+    n = len(text)
+    while pos < n and text[pos] in chars:
+        pos += 1
+    return pos
+
+
+def _walk_array(text: str, pos: int) -> Tuple[List[Any], int, bool]:
+    """
+    Decode array elements one by one starting right after '['.
+    Stops at the first element that does not decode (truncated/malformed).
+    Returns (elements, position, closed).
+    """
+    items: List[Any] = []
+    while True:
+        pos = _skip(text, pos, ",")
+        if pos >= len(text):
+            return items, pos, False
+        if text[pos] == "]":
+            return items, pos + 1, True
+        try:
+            val, end = _DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return items, pos, False
+        items.append(val)
+        pos = end
+
+
+def _walk_object(text: str, pos: int, array_key: str) -> Tuple[Dict[str, Any], int, bool, Optional[dict]]:
+    """
+    Decode a top-level object key by key starting right after '{'.
+    `array_key` is walked element-wise so its closed elements survive truncation.
+    Returns (obj, position, closed, array_state) where array_state describes
+    how far we got inside `array_key`.
+    """
+    out: Dict[str, Any] = {}
+    array_state = None
+    while True:
+        pos = _skip(text, pos, ",")
+        if pos >= len(text):
+            return out, pos, False, array_state
+        if text[pos] == "}":
+            return out, pos + 1, True, array_state
+        try:
+            key, pos = _DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return out, pos, False, array_state
+        if not isinstance(key, str):
+            return out, pos, False, array_state
+        pos = _skip(text, pos)
+        if pos >= len(text) or text[pos] != ":":
+            return out, pos, False, array_state
+        pos = _skip(text, pos + 1)
+        if key == array_key and pos < len(text) and text[pos] == "[":
+            items, pos, closed = _walk_array(text, pos + 1)
+            out[key] = items
+            array_state = {"closed": closed, "stop": pos}
+            if not closed:
+                return out, pos, False, array_state
+            continue
+        try:
+            val, pos = _DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return out, pos, False, array_state
+        out[key] = val
+
+
+def recover_site_json(raw_text: str, components_key: str = "components") -> Tuple[dict, dict]:
+    """
+    Parse model output, tolerating truncation and minor malformation.
+
+    Returns (data, report). `data` holds every top-level field and every
+    fully-closed element of `components_key` that could be decoded;
+    `report` says whether recovery kicked in and what was dropped:
+      {
+        "recovered": bool,            # False when the document parsed cleanly
+        "truncated": bool,            # components array never closed
+        "components_kept": int,
+        "dropped_chars": int,         # unparsed tail length
+        "dropped_partial": {"id": ..., "type": ...} | None,
+        "error": str | None,          # original json error
+      }
+    Raises ValueError if nothing usable could be recovered.
+    """
+    text = _strip_fences(raw_text)
+    try:
+        data = json.loads(text or "{}")
+        if isinstance(data, dict):
+            kept = len(data.get(components_key) or [])
+            return data, {
+                "recovered": False,
+                "truncated": False,
+                "components_kept": kept,
+                "dropped_chars": 0,
+                "dropped_partial": None,
+                "error": None,
+            }
+        original_error = "top-level JSON value is not an object"
+    except json.JSONDecodeError as e:
+        original_error = str(e)
+
+    start = text.find("{")
+    if start < 0:
+        raise ValueError(f"no JSON object in model output ({original_error})")
+
+    data, stop, closed, array_state = _walk_object(text, start + 1, components_key)
+    components = [c for c in (data.get(components_key) or []) if isinstance(c, dict)]
+    if not components and not closed:
+        raise ValueError(f"nothing recoverable in model output ({original_error})")
+    data[components_key] = components
+
+    truncated = not closed if array_state is None else not array_state["closed"]
+    tail = text[stop:] if not closed else ""
+    dropped_partial = None
+    if truncated and tail.strip():
+        m_id = _PARTIAL_ID_RE.search(tail)
+        m_type = _PARTIAL_TYPE_RE.search(tail)
+        if m_id or m_type:
+            dropped_partial = {
+                "id": m_id.group(1) if m_id else None,
+                "type": m_type.group(1) if m_type else None,
+            }
+
+    return data, {
+        "recovered": True,
+        "truncated": truncated,
+        "components_kept": len(components),
+        "dropped_chars": len(tail.strip()),
+        "dropped_partial": dropped_partial,
+        "error": original_error,
+    }
+
+
+def continuation_prompt(data: dict, target_min: int, components_key: str = "components",
+                        id_key: str = "id", type_key: str = "type") -> str:
+    """
+    Ask only for the missing tail of a truncated page: the model sees the
+    components it already produced (by id/type) and returns the remainder.
+    """
+    done = [
+        {id_key: c.get(id_key), type_key: c.get(type_key)}
+        for c in (data.get(components_key) or [])
+    ]
+    remaining = max(1, target_min - len(done))
+    return f"""
+        Your previous JSON output was cut off. These components were already received, in order:
+        {json.dumps(done, ensure_ascii=False)}
+
+        Continue the SAME website from where it stopped. Do NOT repeat any of the components above.
+        Produce at least {remaining} more component(s) that complete the narrative (make sure the page
+        ends with conversion and footer sections if they are not present yet).
+
+        Return ONLY valid JSON of the form: {{"{components_key}": [ ...remaining components... ]}}
+        """
+
+
+def merge_continuation(data: dict, extra: dict, components_key: str = "components", id_key: str = "id") -> int:
+    """
+    Append continuation components onto `data` in place, skipping ids we
+    already have. Returns how many were appended.
+    """
+    have = data.setdefault(components_key, [])
+    seen_ids = {c.get(id_key) for c in have if c.get(id_key)}
+    added = 0
+    for c in (extra or {}).get(components_key) or []:
+        if not isinstance(c, dict):
+            continue
+        cid = c.get(id_key)
+        if cid and cid in seen_ids:
+            continue
+        if cid:
+            seen_ids.add(cid)
+        have.append(c)
+        added += 1
+    return added
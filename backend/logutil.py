@@ -0,0 +1,128 @@
+# backend/logutil.py
+import json, os, sys
+import hashlib
+import logging
+import pprint
+from contextvars import ContextVar
+from typing import Any, Callable
+
+# LOG_LEVEL: standard level name. LOG_FORMAT: "json" (one object per line) or "text".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Debug payload dumps (full RAG payload, retrieval coverage...) only happen when
+# the logger is at DEBUG, DEBUG_DUMPS=1, or the request falls in DEBUG_SAMPLE_RATE.
+DEBUG_DUMPS = os.getenv("DEBUG_DUMPS", "0") == "1"
+DEBUG_SAMPLE_RATE = float(os.getenv("DEBUG_SAMPLE_RATE", "0"))
+
+# Correlates retrieval, generation and sanitization lines of one request
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class Lazy:
+    """Defers an expensive computation until a handler actually formats the record."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+    def __str__(self) -> str:
+        return str(self.fn())
+
+
+def lazy_json(obj: Any, limit: int = 0) -> Lazy:
+    def render():
+        s = json.dumps(obj, ensure_ascii=False, default=str)
+        return s[:limit] + "..." if limit and len(s) > limit else s
+    return Lazy(render)
+
+
+def lazy_pformat(obj: Any, width: int = 120) -> Lazy:
+    return Lazy(lambda: pprint.pformat(obj, width=width))
+
+
+def kv(**fields) -> dict:
+    """`extra=` helper: structured fields attached to a record."""
+    return {"fields": fields}
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            out.update({k: (str(v) if isinstance(v, Lazy) else v) for k, v in fields.items()})
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+_configured = False
+
+
+def configure_logging() -> None:
+    """Idempotent: one stderr handler on the `webgenai` logger tree."""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger("webgenai")
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(_RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"webgenai.{name}")
+
+
+def _sampled(request_id: str) -> bool:
+    if DEBUG_SAMPLE_RATE <= 0.0 or request_id == "-":
+        return False
+    if DEBUG_SAMPLE_RATE >= 1.0:
+        return True
+    bucket = int(hashlib.sha1(request_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < DEBUG_SAMPLE_RATE
+
+
+def should_dump(logger: logging.Logger) -> bool:
+    """True when a debug payload dump for the current request should be produced."""
+    return logger.isEnabledFor(logging.DEBUG) or DEBUG_DUMPS or _sampled(REQUEST_ID.get())
+
+
+def dump(logger: logging.Logger, msg: str, **fields) -> None:
+    """
+    Emit a debug dump. Values should be Lazy so nothing is serialized unless
+    the dump is enabled; when forced by flag/sampling it is logged at INFO.
+    """
+    if not should_dump(logger):
+        return
+    level = logging.DEBUG if logger.isEnabledFor(logging.DEBUG) else logging.INFO
+    logger.log(level, msg, extra=kv(dump=True, **fields))
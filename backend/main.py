@@ -1,5 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from dotenv import load_dotenv
@@ -7,11 +9,34 @@ import os, json, re
 import google.generativeai as genai
 from urllib.parse import urlparse, urlunparse
 import time
-import pprint
-from rag.vectorstore import retrieve_by_roles_payload
-
-# 1) Load .env
+import asyncio
+import uuid
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+# 1) Load .env before the modules below: they read their settings at import
+# (LOG_LEVEL, CAPTURE_*, JOB_*, CACHE_*, RAG_*, GEMINI_MODEL for routing...)
 load_dotenv()
+
+from rag.vectorstore import retrieve_by_roles_payload, retrieve_by_roles_payload_many  # noqa: E402
+from rag.slates import SLATE_ROLES, SLATE_K  # noqa: E402
+from json_recovery import recover_site_json, continuation_prompt, merge_continuation  # noqa: E402
+from jobs import JobStore, WorkerPool, JOB_WORKERS, STATUS_SUCCEEDED, STATUS_FAILED, request_hash  # noqa: E402
+from cache import get_cache, cache_stats, CACHE_TTL_SITE_S  # noqa: E402
+from capture import CAPTURE, prompt_hash  # noqa: E402
+from logutil import get_logger, kv, dump, should_dump, Lazy, lazy_json, lazy_pformat, REQUEST_ID  # noqa: E402
+from metrics import (span, inc, register_gauge, register_counter, begin_request, request_timings,  # noqa: E402
+                     server_timing_header, render_prometheus, process_memory)
+from usage import USAGE, USAGE_WINDOW_S, usage_from_response, add_usage, usage_header  # noqa: E402
+from prompts import SYSTEM_MSG, DEFAULT_COMPONENT_RANGE, allowed_types_for, build_user_message  # noqa: E402
+from routing import ROUTING_ENABLED, route  # noqa: E402
+from skeleton import build_skeleton  # noqa: E402
+from wire import (WIRE_COMPACT, COMPACT_COMPONENTS_KEY, COMPACT_ID_KEY, COMPACT_TYPE_KEY,  # noqa: E402
+                  resolve_format, build_aliases, compact_schema, expand_site, recover_reply)
+
+log = get_logger("api")
+
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
@@ -20,6 +45,21 @@ if not GEMINI_API_KEY:
 # 2) Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+FALLBACK_MODEL = "models/gemini-2.0-flash-001"
+MAX_OUTPUT_TOKENS = 12288
+
+# 3) Truncated-output handling: keep every closed component, optionally ask for the tail
+CONTINUE_ON_TRUNCATION = os.getenv("GEMINI_CONTINUE_ON_TRUNCATION", "1") == "1"
+CONTINUATION_MAX_TOKENS = int(os.getenv("GEMINI_CONTINUATION_MAX_TOKENS", "4096"))
+MIN_COMPONENTS = 12
+
+# 3b) Degraded mode: past the deadline (or on model failure) answer with a skeleton
+# page built from the retrieved slate; the real result can still land in the job store.
+GENERATION_DEADLINE_S = float(os.getenv("GENERATION_DEADLINE_S", "0"))  # 0 = no deadline (request: deadline_ms)
+DEGRADE_ON_ERROR = os.getenv("GENERATION_DEGRADE_ON_ERROR", "0") == "1"  # off: model failures stay errors
+DELIVER_LATE_RESULTS = os.getenv("GENERATION_DELIVER_LATE", "1") == "1"
+MODEL_CALL_WORKERS = int(os.getenv("GENERATION_MODEL_WORKERS", "16"))
+_MODEL_EXECUTOR = ThreadPoolExecutor(max_workers=MODEL_CALL_WORKERS, thread_name_prefix="model-call")
 
 # 4) FastAPI + CORS
 app = FastAPI(title="WebGenAI Backend", version="1.0.0")
@@ -47,6 +87,10 @@ class GenerateRequest(BaseModel):
     business_goals: Optional[str] = None
     unique_selling_points: Optional[str] = None
     ai_provider: Optional[str] = "gemini-rag"
+    component_count: Optional[int] = None    # exact number of sections wanted (default: 12-20)
+    latency_budget_ms: Optional[int] = None  # routing prefers a model expected to finish within this
+    deadline_ms: Optional[int] = None        # past this, serve a skeleton page (default: GENERATION_DEADLINE_S)
+    wire_format: Optional[str] = None        # "full" | "compact" model output (default: GEMINI_WIRE_FORMAT)
 
 class Component(BaseModel):
     id: str
@@ -62,6 +106,14 @@ class GenerateResponse(BaseModel):
     tags: Optional[List[str]] = None
     components: Optional[List[Component]] = None
     error: Optional[str] = None
+    recovery: Optional[dict] = None  # set when the model output had to be salvaged
+    request_id: Optional[str] = None  # key for /api/captures/{request_id}
+    usage: Optional[dict] = None  # token counts + model that answered
+    routing: Optional[dict] = None  # model/output budget chosen for this request and why
+    degraded: Optional[bool] = None  # skeleton page served instead of model output
+    degraded_reason: Optional[str] = None
+    job_id: Optional[str] = None  # where the late model result will land (GET /api/jobs/{job_id}/result)
+    cached: Optional[bool] = None  # served from the site cache (no model call, no token usage)
 
 # 6) Health check
 @app.get("/api/health")
@@ -86,14 +138,43 @@ def get_available_models():
     except Exception as e:
         return {"error": str(e), "available_models": []}
 # Helper: build a model with a system instruction
-def make_model(system_msg: str):
+def make_model(system_msg: str, model_name: str = GEMINI_MODEL):
     try:
-        return genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_msg)
+        return genai.GenerativeModel(model_name, system_instruction=system_msg)
     except Exception as e:
         # Fallback to a known working model
-        fallback_model = "models/gemini-2.0-flash-001"
-        print(f"Warning: Model {GEMINI_MODEL} failed, falling back to {fallback_model}: {str(e)}")
-        return genai.GenerativeModel(fallback_model, system_instruction=system_msg)
+        log.warning("model init failed, falling back", extra=kv(model=model_name, fallback=FALLBACK_MODEL, error=str(e)))
+        return genai.GenerativeModel(FALLBACK_MODEL, system_instruction=system_msg)
+
+def _generation_config(max_output_tokens: int = MAX_OUTPUT_TOKENS) -> dict:
+    return {
+        "response_mime_type": "application/json",
+        "temperature": 0.5,
+        "top_p": 0.9,
+        "max_output_tokens": max_output_tokens,
+    }
+
+def request_continuation(model, user_msg: str, raw_text: str, data: dict, target_min: int = MIN_COMPONENTS,
+                         compact: bool = False) -> dict:
+    """
+    Top up a truncated page: replay the conversation with the truncated
+    output as the model turn and ask only for the missing components.
+    Returns a report dict; `data` is extended in place.
+    """
+    keys = (COMPACT_COMPONENTS_KEY, COMPACT_ID_KEY, COMPACT_TYPE_KEY) if compact else ("components", "id", "type")
+    contents = [
+        {"role": "user", "parts": [user_msg]},
+        {"role": "model", "parts": [raw_text]},
+        {"role": "user", "parts": [continuation_prompt(data, target_min, *keys)]},
+    ]
+    try:
+        resp = model.generate_content(contents, generation_config=_generation_config(CONTINUATION_MAX_TOKENS))
+        extra, extra_report = recover_site_json(resp.text or "{}", components_key=keys[0])
+    except Exception as e:
+        log.warning("continuation failed", extra=kv(error=str(e)))
+        return {"ok": False, "added": 0, "error": str(e)}
+    added = merge_continuation(data, extra, components_key=keys[0], id_key=keys[1])
+    return {"ok": True, "added": added, "truncated": extra_report["truncated"], "usage": usage_from_response(resp)}
 # -------- Image URL sanitizers (updated & hardened) --------
 # -------- Image URL sanitizers (consolidated, hardened) --------
 UNSPLASH_PAGE_RE = re.compile(r"^https?://(?:www\.)?unsplash\.com/photos/([A-Za-z0-9_-]+)")
@@ -184,503 +265,484 @@ def sanitize_images_in_obj(obj):
     if isinstance(obj, list):
         return [sanitize_images_in_obj(x) for x in obj]
     return obj
-# Add this function right after the imports and before the main endpoint
-def get_flexible_industry_guidance(industry_lower: str) -> str:
+# Page roles requested from the retriever for every generated site (the shape
+# the default industry x style slates are precomputed for)
+ROLE_HINTS = SLATE_ROLES
+
+# Bulk generation: how many model calls a batch may have in flight at once
+BATCH_CONCURRENCY = int(os.getenv("GEMINI_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("GENERATE_BATCH_MAX_ITEMS", "50"))
+_BATCH_INFLIGHT = 0
+
+def _retrieval_args(payload: GenerateRequest) -> dict:
     """
-    Return flexible, non-restrictive industry guidance that encourages natural narrative flow
+    kwargs for retrieve_by_roles_payload: composite query with role hints.
     """
-    guidance_templates = {
-        "restaurant": """
-        RESTAURANT & FOOD INDUSTRY - Professional Website Guidance
-        
-        Overall Approach:
-        Create a compelling culinary journey that makes visitors hungry for the experience.
-        Focus on storytelling through food, ambiance, and service excellence.
-        
-        Key Narrative Elements to Consider Naturally:
-        • First Impressions: Strong visual identity showcasing restaurant atmosphere and cuisine style
-        • Credibility Building: Awards, chef credentials, press features, or unique selling points
-        • Culinary Experience: Menu highlights, special dishes, chef's philosophy, ingredient sourcing
-        • Visual Journey: Restaurant ambiance, food photography, behind-the-scenes moments
-        • Social Proof: Customer experiences, reviews, regular patron stories
-        • Practical Information: Location, hours, reservation process, contact details
-        • Conversion Opportunities: Multiple reservation points, special offers, event bookings
-        
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with atmosphere, building desire with food storytelling, 
-        establishing trust through social proof, and making conversion easy.
-        
-        Content Principles:
-        • Use sensory language that evokes taste, aroma, and dining experience
-        • Highlight what makes the restaurant unique (cuisine style, chef story, local sourcing)
-        • Include practical information naturally within the narrative flow
-        • Create multiple natural conversion opportunities
-        • Show, don't just tell - use high-quality food and ambiance photography
-        
-        Professional Standards:
-        • All imagery should be high-quality, professionally styled food and restaurant photography
-        • Copy should be specific to the actual cuisine and dining experience
-        • Maintain consistent tone that matches the restaurant's style (casual, fine dining, etc.)
-        • Ensure all practical information is clear and accessible
-        """,
-
-        "technology": """
-        TECHNOLOGY & SOFTWARE INDUSTRY - Professional Website Guidance
-
-        Overall Approach:
-        Build trust through clear value proposition, technical credibility, and proven results.
-
-        Key Narrative Elements to Consider Naturally:
-        • Problem & Solution: Clearly articulate the pain points and how your technology solves them
-        • Technical Depth: Show appropriate level of technical sophistication for the target audience
-        • Credibility Signals: Case studies, security certifications, customer logos, performance metrics
-        • Product Demonstration: Clear explanation of features, integrations, and user benefits
-        • Conversion Pathways: Free trials, demos, documentation access, pricing transparency
-
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with the core value proposition, demonstrating technical capabilities,
-        building trust through social proof, and providing clear next steps for evaluation.
-
-        Essential Components for Technology Websites:
-        • Clear value proposition and problem/solution framing
-        • Feature demonstrations with concrete benefits
-        • Technical specifications and capabilities
-        • Integration ecosystem and API documentation
-        • Security and compliance certifications
-        • Customer success stories and case studies
-        • Transparent pricing and trial options
-        • Developer resources and SDK availability
-
-        Content Principles:
-        • Focus on outcomes and benefits, not just features
-        • Use concrete metrics and performance data where possible
-        • Balance technical depth with accessibility for decision-makers
-        • Include specific integration examples and use cases
-        • Highlight security and reliability for enterprise buyers
-
-        Professional Standards:
-        • All technical claims should be verifiable and specific
-        • Include real customer examples and results
-        • Provide clear paths for both technical and business evaluation
-        • Maintain consistent technical accuracy throughout
-        • Ensure all conversion points are clear and accessible
-        """,
-        "fitness": """
-        FITNESS & WELLNESS INDUSTRY - Professional Website Guidance
-
-        Overall Approach:
-        Inspire transformation through community, expertise, and proven results.
-
-        Key Narrative Elements to Consider Naturally:
-        • Transformation Stories: Real member results and success journeys
-        • Expert Credibility: Certified trainers, professional facilities, proven methodologies
-        • Community Atmosphere: Supportive environment, group energy, social proof
-        • Comprehensive Offerings: Classes, personal training, nutrition, recovery services
-        • Accessible Entry Points: Free trials, introductory offers, flexible memberships
-
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with inspirational transformations, showcasing expert trainers and facilities,
-        demonstrating the variety of programs, highlighting community success, and making membership accessible.
-
-        Essential Components for Fitness Websites:
-        • Inspirational member transformations and results
-        • Professional trainer profiles with certifications
-        • Comprehensive class schedules and program offerings
-        • State-of-the-art facility and equipment showcase
-        • Nutrition and wellness service integration
-        • Transparent membership options and pricing
-        • Community testimonials and social proof
-        • Easy trial and onboarding processes
-
-        Content Principles:
-        • Focus on outcomes and lifestyle benefits, not just workouts
-        • Use real member stories and specific results
-        • Balance motivation with professional credibility
-        • Highlight the community and support system
-        • Make fitness accessible and non-intimidating
-
-        Professional Standards:
-        • All fitness claims should be realistic and achievable
-        • Include proper certifications and trainer qualifications
-        • Show real facilities and equipment (no stock photos if possible)
-        • Provide clear pricing without hidden fees
-        • Emphasize safety and proper technique
-        • Include appropriate disclaimers for health and fitness
-        """,
-
-        "beauty": """
-        BEAUTY & SPA INDUSTRY - Professional Website Guidance
-
-        Overall Approach:
-        Create an atmosphere of luxury, relaxation, and transformation that appeals to self-care and wellness.
-
-        Key Narrative Elements to Consider Naturally:
-        • Sensory Experience: Evoke feelings of relaxation, luxury, and transformation
-        • Expertise & Trust: Highlight professional credentials, certifications, and experience
-        • Results & Benefits: Showcase tangible outcomes and wellness benefits
-        • Luxury & Quality: Emphasize premium products, facilities, and experiences
-        • Accessibility: Make booking and information easily accessible
-
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with an inviting atmosphere, showcasing services and expertise,
-        building trust through results and testimonials, and making booking effortless.
-
-        Essential Components for Beauty & Spa Websites:
-        • Comprehensive service menus with clear pricing
-        • Professional team profiles with credentials
-        • Treatment results and transformations
-        • Luxury facility amenities
-        • Retail product offerings
-        • Special packages and promotions
-        • Client testimonials and reviews
-        • Easy booking and gift options
-
-        Content Principles:
-        • Use sensory language that evokes relaxation and luxury
-        • Focus on benefits and outcomes, not just services
-        • Highlight expertise and professional qualifications
-        • Include specific product brands and ingredients
-        • Show real results with before/after when appropriate
-
-        Professional Standards:
-        • Maintain a consistent luxury aesthetic throughout
-        • Use high-quality, professional photography
-        • Include clear pricing and service durations
-        • Highlight safety, hygiene, and professional standards
-        • Provide multiple booking and contact options
-
-        Visual & Tone Guidelines:
-        • Soft, calming color palettes
-        • Elegant, clean typography
-        • Professional before/after photography
-        • Luxury product imagery
-        • Serene spa environment shots
-        """,
-        "ecommerce": """
-        E-COMMERCE & RETAIL INDUSTRY - Professional Website Guidance
-
-        Overall Approach:
-        Create a compelling shopping experience that builds trust, showcases products effectively, and drives conversions.
-
-        Key Narrative Elements to Consider Naturally:
-        • Product Discovery: Easy navigation and product discovery through categories and search
-        • Visual Merchandising: High-quality product imagery and compelling presentation
-        • Trust Building: Customer reviews, security badges, return policies, shipping transparency
-        • Value Proposition: Clear pricing, promotions, and unique selling points
-        • Conversion Optimization: Streamlined checkout process and multiple payment options
-
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with hero promotions, showcasing featured products, building trust through social proof, 
-        providing essential shopping information, and making purchase decisions easy and secure.
-
-        Essential Components for E-commerce Websites:
-        • Clear product categorization and navigation
-        • High-quality product imagery with multiple angles
-        • Customer reviews and rating systems
-        • Transparent pricing and promotion displays
-        • Shipping and return policy information
-        • Security badges and trust signals
-        • Shopping cart and checkout process features
-        • Mobile-responsive product displays
-
-        Content Principles:
-        • Use compelling product descriptions with benefits and features
-        • Include social proof through reviews and ratings
-        • Be transparent about pricing, shipping costs, and policies
-        • Highlight promotions and limited-time offers clearly
-        • Provide detailed product information and specifications
-
-        Professional Standards:
-        • All product images should be high-quality and consistent
-        • Pricing information must be clear and transparent
-        • Shipping costs and delivery times should be prominently displayed
-        • Return policies and guarantees should be easy to find
-        • Security and payment trust badges should be visible
-        """,
-        "healthcare": """
-        HEALTHCARE & MEDICAL INDUSTRY - Professional Website Guidance
-
-        Overall Approach:
-        Build trust through compassion, expertise, and clear patient-focused communication.
-
-        Key Narrative Elements to Consider Naturally:
-        • Compassionate Introduction: Understanding patient concerns and healthcare needs
-        • Professional Credentials: Expertise, qualifications, and medical experience
-        • Service Clarity: Clear explanation of treatments, procedures, and approaches
-        • Patient Experience: What to expect, process transparency, and care philosophy
-        • Trust Building: Patient stories, success outcomes, facility quality, staff credentials
-        • Accessibility: Easy appointment scheduling, location information, insurance details
-
-        Natural Flow Ideas (not prescriptive):
-        Consider starting with compassionate understanding of patient needs, establishing medical credibility,
-        clearly explaining services and approach, building trust through patient experiences, and making
-        care accessible through clear next steps.
-
-        Essential Components for Healthcare Websites:
-        • Clear service offerings with medical accuracy
-        • Professional medical team profiles with credentials
-        • Easy appointment scheduling and contact information
-        • Insurance and payment options transparency
-        • Patient portal access and digital health tools
-        • Telehealth and virtual care availability
-        • Patient education and health resources
-        • Emergency and after-hours information
-
-        Content Principles:
-        • Use compassionate, reassuring, and professional language
-        • Highlight medical expertise and credentials naturally
-        • Maintain appropriate medical discretion and HIPAA compliance
-        • Focus on patient outcomes and quality of life improvements
-        • Include clear calls to action for appointments and information
-        • Balance medical accuracy with patient-friendly explanations
-
-        Professional Standards:
-        • All medical information should be accurate and evidence-based
-        • Include proper disclaimers for medical content
-        • Maintain patient privacy and confidentiality in all content
-        • Ensure accessibility for patients with different health literacy levels
-        • Provide clear emergency and urgent care instructions
-        • Include proper credentials and certifications
-
-        Compliance Considerations:
-        • Avoid making specific medical outcome guarantees
-        • Include appropriate medical disclaimers where needed
-        • Ensure all provider credentials are accurately represented
-        • Maintain HIPAA compliance in all patient-facing content
-        • Provide clear scope of practice information
-        """
+    q_terms = [
+        payload.industry or "",
+        payload.style or "",
+        (payload.description or "")[:240],
+        payload.target_audience or "",
+        payload.business_goals or "",
+        payload.unique_selling_points or "",
+    ]
+    q_terms = [t for t in q_terms if t]
+    return {
+        "q_terms": q_terms,
+        "industry": payload.industry or "",
+        "style": payload.style or "",
+        "need_images": payload.images,
+        "role_hints": ROLE_HINTS,
+        "k": SLATE_K,  # wider candidate pool per role to enable richer pages
     }
 
-    # Default guidance for any industry
-    default_guidance = """
-    PROFESSIONAL BUSINESS WEBSITE - General Guidance
-    
-    Overall Approach:
-    Create a compelling narrative that builds trust and drives action.
-    
-    Key Narrative Elements:
-    • Strong value proposition and unique selling points
-    • Credibility building through expertise and social proof
-    • Clear explanation of products/services and benefits
-    • Multiple natural conversion opportunities
-    • Professional presentation and user experience
-    
-    Content Principles:
-    • Write specific, benefit-focused copy
-    • Use high-quality, relevant imagery
-    • Create logical information hierarchy
-    • Maintain consistent brand voice
-    • Ensure clear calls to action throughout
-    """
+# Identical requests within CACHE_TTL_SITE_S get the stored site (shared across workers with CACHE_BACKEND).
+# Off by default: with it on, "regenerate" returns the same site until the entry expires.
+SITE_CACHE = get_cache("site", CACHE_TTL_SITE_S)
 
-    return guidance_templates.get(industry_lower, default_guidance)
 # 7) Main generation endpoint
 @app.post("/api/generate-website", response_model=GenerateResponse)
-def generate_website(payload: GenerateRequest):
+def generate_website(payload: GenerateRequest, response: Response):
     try:
-        # --- RAG: composite query with role hints (dict payload) ---
-        q_terms = [
-            payload.industry or "",
-            payload.style or "",
-            (payload.description or "")[:240],
-            payload.target_audience or "",
-            payload.business_goals or "",
-            payload.unique_selling_points or "",
-        ]
-        q_terms = [t for t in q_terms if t]
-
-        role_hints = ["header", "hero", "value", "media", "social-proof", "conversion", "core-content", "footer", "aux"]
-
-        rag_payload = retrieve_by_roles_payload(
-            q_terms=q_terms,
-            industry=payload.industry or "",
-            style=payload.style or "",
-            need_images=payload.images,
-            role_hints=role_hints,
-            k=10,  # wider candidate pool per role to enable richer pages
-        ) or {}
-        print(f"\n🎯 GENERATING FOR: {payload.business_name} ({payload.industry})")
-        print("📊 RETRIEVED COMPONENTS:")
-        templates = rag_payload.get("templates", [])
-        for i, template in enumerate(templates):
-            score = template.get('_score', 0)
-            role = template.get('_role', 'unknown')
-            print(f"  {i+1}. {template.get('type')} | Role: {role} | Score: {score:.3f}")
-            
-        print("\n[DEBUG] Bucketed templates (first 1k chars):\n",
-              json.dumps(rag_payload, ensure_ascii=False)[:1000], "...\n")
-
-        # ----- Build allowed types from RAG payload -----
-        templates = (rag_payload or {}).get("templates", []) or []
-        retrieved_types = [t.get("type") for t in templates if t.get("type")]
-        core_fallback = ["Header", "Hero", "Footer", "FAQ", "Testimonials", "Gallery", "Pricing", "Contact"]
-        allowed_types = sorted(set(retrieved_types + core_fallback))
-        allowed_types_union = " | ".join(f'"{t}"' for t in allowed_types) or '"Header" | "Hero" | "Footer"'
-
-        # ---------- Industry-specific rules ----------
-        industry_lower = (payload.industry or "").lower()
-        industry_guidance = get_flexible_industry_guidance(industry_lower)
-
-        # JSON schema for the model (expanded types)
-        JSON_SCHEMA_TS = f"""
-        type GeneratedSite = {{
-          success: true;
-          websiteName: string;
-          industry: string;
-          style: string;
-          tags: string[];
-          components: Array<{{
-            id: string;
-            type: {allowed_types_union};
-            tags?: string[];
-            props: Record<string, any>;
-          }}>;
-        }};
-        """
-
-        # Prompt (note: templates are a JSON ARRAY)
-        # you already produced: templates_obj (a dict) from the retriever
-        # make the shortlist the default source for components in the prompt
-        system_msg = (
-            "You are a senior UX writer + information architect who outputs ONLY valid JSON (no prose). "
-            "Strictly use component props keys that exist in the provided propsSchema; do not invent keys. "
-            "Write specific, production-ready copy; no lorem ipsum."
-        )
+        data = _generate_site(payload, degrade=True)
+        if data.get("usage"):
+            response.headers["X-Token-Usage"] = usage_header(data["usage"])
+        with span("response_validation"):
+            return GenerateResponse.model_validate(data)
+    except HTTPException:
+        inc("webgenai_generations_total", outcome="model_error")
+        raise
+    except Exception as e:
+        inc("webgenai_generations_total", outcome="error")
+        return GenerateResponse(success=False, error=str(e))
+    finally:
+        response.headers["Server-Timing"] = server_timing_header()
+
+def _generate_site(payload: GenerateRequest, rag_payload: Optional[dict] = None, degrade: bool = False) -> dict:
+    """
+    Retrieval → prompt → Gemini → parse → sanitize for one request.
+    `rag_payload` can be passed in when retrieval was already done in a batch.
+    With `degrade`, a blown deadline or a failing model yields a skeleton page
+    instead of an error. Raises HTTPException when the model output is unusable.
+    """
+    request_id = uuid.uuid4().hex
+    REQUEST_ID.set(request_id)
+    begin_request()
+    t_start = time.perf_counter()
+    site_key = _site_key(payload)
+    if site_key:
+        with span("site_cache"):
+            hit = SITE_CACHE.get(site_key)
+        if hit is not None:
+            inc("webgenai_generations_total", outcome="cached")
+            hit.update(request_id=request_id, cached=True, usage=None)
+            log.info("site cache hit", extra=kv(business=payload.business_name, industry=payload.industry))
+            return hit
+    if rag_payload is None:
+        with span("retrieval"):
+            rag_payload = retrieve_by_roles_payload(**_retrieval_args(payload)) or {}
+    templates = rag_payload.get("templates", [])
+    log.info("generating", extra=kv(
+        business=payload.business_name, industry=payload.industry, style=payload.style,
+        templates=len(templates), retrieval_ms=request_timings().get("retrieval"),
+    ))
+    dump(log, "retrieved components",
+         components=Lazy(lambda: [
+             f"{t.get('type')}|{t.get('_role', 'unknown')}|{t.get('_score', 0):.3f}" for t in templates
+         ]),
+         rag_payload=lazy_json(rag_payload, limit=1000))
+
+    # ----- Assemble prompt: prebuilt industry prefix + per-request tail -----
+    sp = span("prompt_assembly").start()
+    templates = (rag_payload or {}).get("templates", []) or []
+    allowed_types = allowed_types_for(templates)
+    system_msg = SYSTEM_MSG
+    business = {
+        "Business Name": payload.business_name,
+        "Industry": payload.industry,
+        "Design Style": payload.style,
+        "Business Description": payload.description,
+        "Target Audience": payload.target_audience or "General audience",
+        "Business Goals": payload.business_goals or "Increase visibility and engagement",
+        "Unique Selling Points": payload.unique_selling_points or "Quality and service excellence",
+    }
+    component_range = str(payload.component_count) if payload.component_count else DEFAULT_COMPONENT_RANGE
+    wire_format = resolve_format(payload.wire_format)
+    compact = wire_format == WIRE_COMPACT
+    aliases = build_aliases(templates) if compact else {}
+    user_msg, prompt_chars = build_user_message(
+        payload.industry, rag_payload, business, allowed_types, component_range=component_range,
+        schema=compact_schema(allowed_types, aliases) if compact else None,
+    )
+    sp.stop()
+
+    # ----- Route: model + output budget sized to this page -----
+    if ROUTING_ENABLED:
+        routing = route(templates, payload.component_count, payload.latency_budget_ms)
+    else:
+        routing = {"tier": "static", "model": GEMINI_MODEL, "max_output_tokens": MAX_OUTPUT_TOKENS}
+    gen_config = _generation_config(routing["max_output_tokens"])
+    inc("webgenai_routed_total", tier=routing["tier"])
+
+    ctx = {
+        "request_id": request_id, "t_start": t_start, "system_msg": system_msg, "user_msg": user_msg,
+        "prompt_chars": prompt_chars, "routing": routing, "gen_config": gen_config,
+        "wire_format": wire_format, "aliases": aliases,
+    }
+    deadline_s = _deadline_s(payload) if degrade else 0.0
+    if not deadline_s:
+        try:
+            model, resp = _call_model(ctx)
+        except Exception as e:
+            if not degrade or not DEGRADE_ON_ERROR:
+                raise
+            return _degraded_site(payload, rag_payload, ctx, f"model error: {e}")
+    else:
+        # Run the call off-thread so we can stop waiting for it at the deadline
+        future = _MODEL_EXECUTOR.submit(contextvars.copy_context().run, _call_model, ctx)
+        try:
+            model, resp = future.result(timeout=max(0.0, deadline_s - (time.perf_counter() - t_start)))
+        except FuturesTimeout:
+            return _degraded_site(payload, rag_payload, ctx, f"deadline {deadline_s:g}s exceeded", future=future)
+        except Exception as e:
+            if not DEGRADE_ON_ERROR:
+                raise
+            return _degraded_site(payload, rag_payload, ctx, f"model error: {e}")
+
+    try:
+        data = _finish_site(payload, ctx, model, resp)
+    except HTTPException as e:
+        if not degrade or not DEGRADE_ON_ERROR:
+            raise
+        return _degraded_site(payload, rag_payload, ctx, f"unusable model output: {e.detail}")
+    if site_key and _cacheable(data):
+        SITE_CACHE.set(site_key, data)
+    return data
+
+
+def _cacheable(data: dict) -> bool:
+    """Only complete sites are cached: nothing salvaged from a truncated/malformed reply or dropped."""
+    recovery = data.get("recovery") or {}
+    return not (recovery.get("recovered") or recovery.get("dropped_partial") or recovery.get("dropped_chars"))
 
-        user_msg = f"""
-        RAG CONTEXT & COMPONENT LIBRARY:
-        {json.dumps(rag_payload, ensure_ascii=False)}
-
-        BUSINESS REQUIREMENTS:
-        - Business Name: {payload.business_name}
-        - Industry: {payload.industry}
-        - Design Style: {payload.style}
-        - Business Description: {payload.description}
-        - Target Audience: {payload.target_audience or 'General audience'}
-        - Business Goals: {payload.business_goals or 'Increase visibility and engagement'}
-        - Unique Selling Points: {payload.unique_selling_points or 'Quality and service excellence'}
-
-        COMPONENT CONSTRAINTS:
-        - Allowed component types: {", ".join(allowed_types)}
-        - For each component, props MUST follow the provided propsSchema
-        - Use schema_defaults as guidance for expected data structure
-        - Prefer higher-scoring templates from RAG results
-
-        PROFESSIONAL WEBSITE STANDARDS:
-
-        COMPREHENSIVE COVERAGE:
-        Create a complete, professional website with natural narrative flow. Include:
-        • Strong opening that establishes brand identity and value
-        • Multiple sections that build credibility and trust
-        • Rich content that showcases products/services naturally
-        • Social proof and validation elements
-        • Clear conversion pathways
-        • Professional footer with essential information
-
-        NATURAL NARRATIVE FLOW:
-        Arrange components in a logical, compelling sequence that tells a story. Consider:
-        1. Introduction & Value Proposition
-        2. Credibility & Trust Building  
-        3. Product/Service Showcase
-        4. Social Proof & Validation
-        5. Conversion & Action
-        6. Practical Information
-
-        CONTENT QUALITY:
-        • Write specific, production-ready copy tailored to the business
-        • Avoid generic placeholder text - be concrete and descriptive
-        • Use appropriate tone for the industry and audience
-        • Create compelling headlines and benefit-focused descriptions
-        • Ensure all copy serves a purpose in the overall narrative
-
-        IMAGERY & VISUALS:
-        • Use high-quality, contextually appropriate images
-        • Generate images using these keyword themes: {", ".join((rag_payload.get("image_keywords") or []))}
-        • All images must be HTTPS URLs from approved sources
-        • Include descriptive alt text for accessibility
-        • Ensure visual consistency throughout
-
-        INDUSTRY-SPECIFIC GUIDANCE:
-        {industry_guidance}
-
-        NAVIGATION & UX:
-        • Create coherent internal navigation with logical anchor links
-        • Include multiple conversion opportunities throughout the page
-        • Ensure mobile-friendly component arrangement
-        • Maintain consistent styling and spacing
-
-        TECHNICAL REQUIREMENTS:
-        • Output must be valid JSON matching the specified schema
-        • All component types must exist in allowed_types list
-        • All props must conform to their component's propsSchema
-        • Include appropriate tags for categorization
-        • Ensure all required fields (mustHave) are populated
-
-        OUTPUT STRUCTURE:
-        Generate a complete website with 12-20 components that tells a compelling story and drives action. 
-        The arrangement should feel natural and professional, not forced or template-driven.
-
-        Return ONLY valid JSON matching this schema:
-        {JSON_SCHEMA_TS}
-        """
 
+def _site_key(payload: GenerateRequest) -> Optional[str]:
+    """
+    Site cache key: the normalized request (same form as job dedup) and the
+    model settings. Only complete model-made sites are stored, never skeletons.
+    """
+    if not SITE_CACHE.enabled:
+        return None
+    return SITE_CACHE.key(request_hash(payload.model_dump()), GEMINI_MODEL, ROUTING_ENABLED, MAX_OUTPUT_TOKENS)
+
+
+def _deadline_s(payload: GenerateRequest) -> float:
+    if payload.deadline_ms:
+        return payload.deadline_ms / 1000.0
+    return GENERATION_DEADLINE_S
+
+
+def _call_model(ctx: dict):
+    """Routed model call with one fallback. Returns (model, response)."""
+    routing, system_msg = ctx["routing"], ctx["system_msg"]
+    with span("gemini_call"):
         try:
-            model = make_model(system_msg)
-            resp = model.generate_content(
-                user_msg,
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "temperature": 0.5,
-                    "top_p": 0.9,
-                    "max_output_tokens": 12288,
-                },
-            )
+            model = make_model(system_msg, routing["model"])
+            return model, model.generate_content(ctx["user_msg"], generation_config=ctx["gen_config"])
         except Exception as model_error:
             # Try with a fallback model
-            print(f"Model error with {GEMINI_MODEL}, trying fallback: {str(model_error)}")
-            fallback_model = genai.GenerativeModel("models/gemini-2.0-flash-001", system_instruction=system_msg)
-            resp = fallback_model.generate_content(
-                user_msg,
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "temperature": 0.5,
-                    "top_p": 0.9,
-                    "max_output_tokens": 12288,
-                },
-            )
-
-        # Parse model output
+            inc("webgenai_model_fallbacks_total")
+            log.warning("model call failed, trying fallback",
+                        extra=kv(model=routing["model"], fallback=FALLBACK_MODEL, error=str(model_error)))
+            model = genai.GenerativeModel(FALLBACK_MODEL, system_instruction=system_msg)
+            return model, model.generate_content(ctx["user_msg"], generation_config=ctx["gen_config"])
+
+
+def _finish_site(payload: GenerateRequest, ctx: dict, model, resp, late: bool = False) -> dict:
+    """
+    Parse → recover/continue → expand → sanitize → defaults for one model response.
+    `late`: the request already got a skeleton (counted as degraded), so the
+    result is counted under webgenai_late_results_total instead.
+    """
+    request_id, system_msg, user_msg = ctx["request_id"], ctx["system_msg"], ctx["user_msg"]
+    routing, prompt_chars, wire_format, aliases = ctx["routing"], ctx["prompt_chars"], ctx["wire_format"], ctx["aliases"]
+    compact = wire_format == WIRE_COMPACT
+    usage = usage_from_response(resp)
+
+    # Parse model output (tolerates truncation: keeps every fully-closed component)
+    raw_text, parse_error = "", None
+    with span("json_parse"):
         try:
             raw_text = resp.text or "{}"
-            try:
-                with open("/tmp/backend.json", "w", encoding="utf-8") as f:
-                    f.write(raw_text)
-            except Exception:
-                pass
-            data = json.loads(raw_text)
+            data, recovery, compact = recover_reply(raw_text, compact)
         except Exception as e:
-            raise HTTPException(status_code=502, detail=f"Invalid JSON from model: {str(e)}")
+            parse_error = str(e)
+
+    # Hand the raw output to the background capture writer (never blocks on disk);
+    # the record is only built for requests that are captured
+    if CAPTURE.wants(request_id):
+        CAPTURE.submit({
+            "request_id": request_id,
+            "ts": time.time(),
+            "model": getattr(model, "model_name", None),
+            "routing": routing,
+            "prompt_hash": prompt_hash(system_msg, user_msg),
+            "request": payload.model_dump(),
+            "timings": request_timings(),
+            "usage": dict(usage),
+            "prompt_chars": prompt_chars,
+            "raw_output": raw_text,
+            "parse_error": parse_error,
+        })
+    if parse_error is not None:
+        raise HTTPException(status_code=502, detail=f"Invalid JSON from model: {parse_error}")
+
+    if recovery["recovered"]:
+        log.warning("recovered truncated/malformed model output", extra=kv(**recovery))
+        inc("webgenai_recovered_outputs_total", truncated=recovery["truncated"])
+        if recovery["truncated"] and CONTINUE_ON_TRUNCATION:
+            with span("continuation"):
+                recovery["continuation"] = request_continuation(
+                    model, user_msg, raw_text, data, target_min=payload.component_count or MIN_COMPONENTS,
+                    compact=compact)
+            add_usage(usage, recovery["continuation"].pop("usage", None))
+        data["recovery"] = recovery
+
+    if compact:
+        with span("wire_expand"):
+            data = expand_site(data, aliases)
+
+    # ---- Auto-sanitize all image-like fields ----
+    with span("sanitize"):
+        data = sanitize_images_in_obj(data)
 
-        # ---- Auto-sanitize all image-like fields ----
+    # Defaults
+    data["request_id"] = request_id
+    data.setdefault("success", True)
+    data.setdefault("websiteName", payload.business_name)
+    data.setdefault("industry", payload.industry)
+    data.setdefault("style", payload.style)
+    data.setdefault("tags", [])
+    for i, comp in enumerate(data.get("components", []) or []):
+        comp.setdefault("id", f"c{i + 1}")
+        comp.setdefault("props", {})
+        comp.setdefault("tags", [])
+
+    usage["model"] = getattr(model, "model_name", None) or routing["model"]
+    usage["format"] = wire_format
+    data["usage"] = usage
+    data["routing"] = routing
+    USAGE.record(payload.industry, payload.style, usage["model"], usage, prompt_chars, wire_format=wire_format,
+                 latency_ms=round((time.perf_counter() - ctx["t_start"]) * 1000, 2))
+
+    inc("webgenai_late_results_total" if late else "webgenai_generations_total",
+        outcome="recovered" if recovery["recovered"] else "ok")
+    log.info("generated", extra=kv(components=len(data.get("components") or []), timings_ms=request_timings(),
+                                   usage=usage, prompt_chars=prompt_chars))
+    return data
+
+
+def _degraded_site(payload: GenerateRequest, rag_payload: dict, ctx: dict, reason: str, future=None) -> dict:
+    """
+    Skeleton page from the slate + request fields, served without the model.
+    If the model call is still running, its result is parked in the job store.
+    """
+    with span("skeleton"):
+        data = build_skeleton(
+            rag_payload.get("templates") or [],
+            rag_payload.get("schema_defaults") or {},
+            payload.business_name,
+            payload.description,
+            payload.unique_selling_points,
+            role_order=ORDER,
+            max_components=payload.component_count or MIN_COMPONENTS,
+        )
         data = sanitize_images_in_obj(data)
+    data.update(
+        request_id=ctx["request_id"], industry=payload.industry, style=payload.style,
+        routing=ctx["routing"], degraded=True, degraded_reason=reason,
+    )
+    if future is not None and DELIVER_LATE_RESULTS:
+        job_id = job_store().adopt(payload.model_dump())
+        data["job_id"] = job_id
+        # the callback runs on whichever thread finishes the call: give it this request's context
+        late_ctx = contextvars.copy_context()
+        future.add_done_callback(lambda f: late_ctx.run(_deliver_late, job_id, payload, ctx, f))
+    inc("webgenai_generations_total", outcome="degraded")
+    log.warning("serving skeleton page", extra=kv(reason=reason, components=len(data["components"]),
+                                                  job_id=data.get("job_id")))
+    return data
+
+def _deliver_late(job_id: str, payload: GenerateRequest, ctx: dict, future) -> None:
+    """Done-callback of a model call that outlived its request: finish it into the job store."""
+    try:
+        model, resp = future.result()
+        data = _finish_site(payload, ctx, model, resp, late=True)
+        job_store().complete(job_id, GenerateResponse.model_validate(data).model_dump(exclude_none=True))
+        log.info("late result delivered", extra=kv(job_id=job_id))
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        # re-queued with backoff: a job worker retries the whole generation
+        status = job_store().fail(job_id, str(detail), attempts=1)
+        inc("webgenai_late_results_total", outcome="failed")
+        log.warning("late result failed", extra=kv(job_id=job_id, status=status, error=str(detail)))
 
-        # Defaults
-        data.setdefault("success", True)
-        data.setdefault("websiteName", payload.business_name)
-        data.setdefault("industry", payload.industry)
-        data.setdefault("style", payload.style)
-        data.setdefault("tags", [])
-        for i, comp in enumerate(data.get("components", []) or []):
-            comp.setdefault("id", f"c{i + 1}")
-            comp.setdefault("props", {})
-            comp.setdefault("tags", [])
 
-        return data
+# 7b) Bulk generation endpoint (NDJSON stream, completion order)
+@app.post("/api/generate-websites")
+async def generate_websites(payloads: List[GenerateRequest]):
+    """
+    Generate many sites in one call. Retrieval for the whole batch is done
+    up front (one embedding batch + one catalog matmul); model calls then run
+    with at most BATCH_CONCURRENCY in flight. Each finished site is streamed
+    as one NDJSON line: {"index", "business_name", "ok", "result" | "error"}.
+    """
+    if len(payloads) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} requests per batch")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        return GenerateResponse(success=False, error=str(e))
+    rag_payloads = await run_in_threadpool(
+        retrieve_by_roles_payload_many, [_retrieval_args(p) for p in payloads]
+    )
+    sem = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+    async def run_one(i: int, payload: GenerateRequest, rag_payload: dict) -> dict:
+        global _BATCH_INFLIGHT
+        line = {"index": i, "business_name": payload.business_name}
+        async with sem:
+            _BATCH_INFLIGHT += 1
+            try:
+                data = await run_in_threadpool(_generate_site, payload, rag_payload or {}, True)
+                result = GenerateResponse.model_validate(data).model_dump(exclude_none=True)
+                line.update(ok=bool(result.get("success", True)), result=result)
+            except HTTPException as e:
+                line.update(ok=False, error=str(e.detail))
+            except Exception as e:
+                line.update(ok=False, error=str(e))
+            finally:
+                _BATCH_INFLIGHT -= 1
+        return line
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run_one(i, p, rp)) for i, (p, rp) in enumerate(zip(payloads, rag_payloads))]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                line = await fut
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# 8) Async job mode: POST returns a job id, workers run the pipeline, results land in SQLite.
+# The store is opened on first use (the startup hook, or a `python jobs.py` worker), not at
+# import, so importing main does not create JOBS_DB_PATH.
+JOB_STORE: Optional[JobStore] = None
+JOB_POOL: Optional[WorkerPool] = None
+_JOB_STORE_LOCK = threading.Lock()
+
+def job_store() -> JobStore:
+    global JOB_STORE
+    if JOB_STORE is None:
+        with _JOB_STORE_LOCK:
+            if JOB_STORE is None:
+                JOB_STORE = JobStore()
+    return JOB_STORE
+
+def run_generation_job(payload: dict) -> dict:
+    """
+    Worker entry point: one full generation for a stored request payload.
+    Model/JSON failures raise so the job is retried with backoff.
+    """
+    try:
+        data = _generate_site(GenerateRequest(**payload))
+    except HTTPException as e:
+        raise RuntimeError(str(e.detail))
+    return GenerateResponse.model_validate(data).model_dump(exclude_none=True)
+
+@app.on_event("startup")
+def _start_job_workers():
+    global JOB_POOL
+    JOB_POOL = WorkerPool(job_store(), run_generation_job, workers=JOB_WORKERS)
+    JOB_POOL.start()
+
+@app.on_event("shutdown")
+def _stop_job_workers():
+    if JOB_POOL is not None:
+        JOB_POOL.stop()
+    _MODEL_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+def _job_status_view(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "expires_at": job["expires_at"],
+    }
+
+@app.post("/api/jobs", status_code=202)
+def submit_generation_job(payload: GenerateRequest):
+    """Enqueue a generation; identical (normalized) requests share one job."""
+    job_id, status, deduped = job_store().submit(payload.model_dump())
+    return {"job_id": job_id, "status": status, "deduped": deduped}
+
+@app.get("/api/jobs/{job_id}")
+def get_generation_job(job_id: str):
+    job = job_store().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return _job_status_view(job)
+
+@app.get("/api/jobs/{job_id}/result", response_model=GenerateResponse)
+def get_generation_job_result(job_id: str):
+    job = job_store().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job["status"] == STATUS_SUCCEEDED:
+        return job["result"]
+    if job["status"] == STATUS_FAILED:
+        return GenerateResponse(success=False, error=job["error"])
+    return JSONResponse(status_code=202, content=_job_status_view(job))
+
+# 9) Raw output captures (sampled; see capture.py)
+@app.get("/api/captures/{request_id}")
+def get_capture(request_id: str):
+    rec = CAPTURE.find(request_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="No capture for this request id (not sampled or rotated out)")
+    return rec
+
+@app.on_event("shutdown")
+def _flush_captures():
+    CAPTURE.close()
+
+# 10) Metrics: stage histograms, counters, queue/cache gauges (Prometheus text)
+register_gauge("webgenai_capture_queue_depth", lambda: {(): CAPTURE.queue_depth()}, "Records waiting for the capture writer")
+register_counter("webgenai_capture_records_total", lambda: {(("state", k),): v for k, v in CAPTURE.stats.items()},
+                 "Capture records by state")
+register_gauge("webgenai_jobs",
+               lambda: {(("status", k),): v for k, v in (JOB_STORE.counts() if JOB_STORE else {}).items()},
+               "Generation jobs by status")
+register_gauge("webgenai_batch_inflight", lambda: {(): _BATCH_INFLIGHT}, "Batch model calls in flight")
+register_gauge("webgenai_process_memory_bytes", lambda: {(("kind", k),): v for k, v in process_memory().items()},
+               "This worker's memory (uss = private, pss = with shared pages split across workers)")
+
+@app.get("/api/usage")
+def usage_summary(window_s: float = USAGE_WINDOW_S, group_by: str = "industry,style,model"):
+    """Rolling token usage, grouped by any of industry/style/model (comma separated)."""
+    return USAGE.summary(window_s=window_s, group_by=[f.strip() for f in group_by.split(",") if f.strip()])
+
+@app.get("/api/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache")
+def cache_summary():
+    """Result cache stats per cache: hits by tier, hit rates, L1 size, backend."""
+    return cache_stats()
 
 # Page role ordering used throughout
 ORDER = ["header","hero","value","media","social-proof","conversion","core-content","footer","aux"]
@@ -818,6 +880,9 @@ def summarize_coverage(components: list[dict]) -> dict:
     }
 
 def log_retrieval_debug(q_terms, role_map, initial, balanced):
+    # Coverage summaries are only worth computing when the dump will be emitted
+    if not should_dump(log):
+        return
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     coverage_init = summarize_coverage(initial)
     coverage_final = summarize_coverage(balanced)
@@ -831,5 +896,4 @@ def log_retrieval_debug(q_terms, role_map, initial, balanced):
         "coverage_initial": coverage_init,
         "coverage_final": coverage_final,
     }
-    print("\n[RETRIEVAL DEBUG]")
-    pprint.pprint(info, width=120)
+    dump(log, "retrieval debug", info=lazy_pformat(info, width=120))
@@ -0,0 +1,202 @@
+# backend/metrics.py
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Stage latency histograms + counters/gauges, rendered as Prometheus text.
+# A span costs two perf_counter_ns calls, one bisect and one short locked
+# update (~1µs, see bench/span_overhead.py).
+
+# Bucket upper bounds in seconds (50µs .. 60s)
+BUCKETS_S: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_S) + 1)  # last slot = +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value_s: float) -> None:
+        i = bisect_left(BUCKETS_S, value_s)
+        with _lock:
+            self.counts[i] += 1
+            self.total += value_s
+            self.count += 1
+
+
+_STAGES: Dict[str, Histogram] = {}
+_COUNTERS: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+# scrape-time series: name -> (prometheus type, help, fn)
+_GAUGES: Dict[str, Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = {}
+
+# Per-request span log, used for the Server-Timing header
+_REQUEST_SPANS: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+def _hist(stage: str) -> Histogram:
+    h = _STAGES.get(stage)
+    if h is None:
+        with _lock:
+            h = _STAGES.setdefault(stage, Histogram())
+    return h
+
+
+def observe(stage: str, seconds: float) -> None:
+    _hist(stage).observe(seconds)
+    spans = _REQUEST_SPANS.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+class span:
+    """
+    Time a pipeline stage:
+        with span("gemini_call"):
+            ...
+    or, around long straight-line code:
+        sp = span("prompt_assembly").start()
+        ...
+        sp.stop()
+    """
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, (perf_counter_ns() - self.t0) / 1e9)
+        return False
+
+    start = __enter__
+
+    def stop(self) -> None:
+        self.__exit__()
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        _COUNTERS[key] = _COUNTERS.get(key, 0.0) + value
+
+
+def register_gauge(name: str, fn: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]], help_text: str = "") -> None:
+    """
+    `fn` is evaluated at scrape time and returns {labels_tuple: value};
+    use () as the key for an unlabelled gauge.
+    """
+    _GAUGES[name] = ("gauge", help_text, fn)
+
+
+def register_counter(name: str, fn: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]], help_text: str = "") -> None:
+    """Like register_gauge, for a value kept elsewhere that only ever grows (exported as a counter)."""
+    _GAUGES[name] = ("counter", help_text, fn)
+
+
+# ---- per-request timings ----
+def begin_request() -> None:
+    _REQUEST_SPANS.set([])
+
+
+def request_timings() -> Dict[str, float]:
+    """Milliseconds per stage for the current request (repeated stages are summed)."""
+    out: Dict[str, float] = {}
+    for stage, s in _REQUEST_SPANS.get() or []:
+        out[stage] = out.get(stage, 0.0) + s * 1000.0
+    return {k: round(v, 3) for k, v in out.items()}
+
+
+def server_timing_header() -> str:
+    counts: Dict[str, int] = {}
+    for stage, _ in _REQUEST_SPANS.get() or []:
+        counts[stage] = counts.get(stage, 0) + 1
+    parts = []
+    for stage, ms in request_timings().items():
+        n = counts.get(stage, 1)
+        parts.append(f'{stage};dur={ms}' + (f';desc="x{n}"' if n > 1 else ""))
+    return ", ".join(parts)
+
+
+# ---- process memory ----
+_SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+                 "Private_Clean": "uss", "Private_Dirty": "uss", "Swap": "swap"}
+
+
+def process_memory(pid: str = "self") -> Dict[str, int]:
+    """
+    Bytes from /proc/<pid>/smaps_rollup (Linux; {} elsewhere): rss, pss
+    (shared pages split between the processes mapping them), uss (pages only
+    this process maps: what one more worker costs), shared and swap.
+    """
+    out = {"rss": 0, "pss": 0, "uss": 0, "shared": 0, "swap": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    out[_SMAPS_FIELDS[key]] += int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    return out
+
+
+# ---- exposition ----
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    items = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def render_prometheus() -> str:
+    lines: List[str] = [
+        "# HELP webgenai_stage_seconds Pipeline stage latency",
+        "# TYPE webgenai_stage_seconds histogram",
+    ]
+    with _lock:
+        stages = {k: (list(h.counts), h.total, h.count) for k, h in _STAGES.items()}
+        counters = dict(_COUNTERS)
+    for stage, (counts, total, count) in sorted(stages.items()):
+        lab = (("stage", stage),)
+        cum = 0
+        for bound, c in zip(BUCKETS_S, counts):
+            cum += c
+            le = 'le="%s"' % bound
+            lines.append(f"webgenai_stage_seconds_bucket{_fmt_labels(lab, le)} {cum}")
+        le = 'le="+Inf"'
+        lines.append(f"webgenai_stage_seconds_bucket{_fmt_labels(lab, le)} {count}")
+        lines.append(f"webgenai_stage_seconds_sum{_fmt_labels(lab)} {total}")
+        lines.append(f"webgenai_stage_seconds_count{_fmt_labels(lab)} {count}")
+
+    by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], float]]] = {}
+    for (name, labels), v in counters.items():
+        by_name.setdefault(name, []).append((labels, v))
+    for name, series in sorted(by_name.items()):
+        lines.append(f"# TYPE {name} counter")
+        for labels, v in sorted(series):
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+
+    for name, (kind, help_text, fn) in sorted(_GAUGES.items()):
+        try:
+            series = fn() or {}
+        except Exception:
+            continue
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, v in sorted(series.items()):
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+    return "\n".join(lines) + "\n"
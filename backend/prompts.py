@@ -0,0 +1,461 @@
+# backend/prompts.py
+import json, sys
+import textwrap
+from typing import Dict, List, Optional, Tuple
+
+# Prompt assembly. Everything static (system message, industry guidance,
+# website standards) is dedented and interned once at import; each industry
+# gets a prebuilt prefix. Per-request data (RAG payload, business fields,
+# allowed types, schema) is only ever appended after that prefix, so the
+# prefix is byte-identical across requests and can hit prefix caches.
+
+SYSTEM_MSG = sys.intern(
+    "You are a senior UX writer + information architect who outputs ONLY valid JSON (no prose). "
+    "Strictly use component props keys that exist in the provided propsSchema; do not invent keys. "
+    "Write specific, production-ready copy; no lorem ipsum."
+)
+
+# Flexible, non-restrictive industry guidance that encourages natural narrative flow
+INDUSTRY_GUIDANCE: Dict[str, str] = {
+    "restaurant": """
+    RESTAURANT & FOOD INDUSTRY - Professional Website Guidance
+    
+    Overall Approach:
+    Create a compelling culinary journey that makes visitors hungry for the experience.
+    Focus on storytelling through food, ambiance, and service excellence.
+    
+    Key Narrative Elements to Consider Naturally:
+    • First Impressions: Strong visual identity showcasing restaurant atmosphere and cuisine style
+    • Credibility Building: Awards, chef credentials, press features, or unique selling points
+    • Culinary Experience: Menu highlights, special dishes, chef's philosophy, ingredient sourcing
+    • Visual Journey: Restaurant ambiance, food photography, behind-the-scenes moments
+    • Social Proof: Customer experiences, reviews, regular patron stories
+    • Practical Information: Location, hours, reservation process, contact details
+    • Conversion Opportunities: Multiple reservation points, special offers, event bookings
+    
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with atmosphere, building desire with food storytelling, 
+    establishing trust through social proof, and making conversion easy.
+    
+    Content Principles:
+    • Use sensory language that evokes taste, aroma, and dining experience
+    • Highlight what makes the restaurant unique (cuisine style, chef story, local sourcing)
+    • Include practical information naturally within the narrative flow
+    • Create multiple natural conversion opportunities
+    • Show, don't just tell - use high-quality food and ambiance photography
+    
+    Professional Standards:
+    • All imagery should be high-quality, professionally styled food and restaurant photography
+    • Copy should be specific to the actual cuisine and dining experience
+    • Maintain consistent tone that matches the restaurant's style (casual, fine dining, etc.)
+    • Ensure all practical information is clear and accessible
+    """,
+
+    "technology": """
+    TECHNOLOGY & SOFTWARE INDUSTRY - Professional Website Guidance
+
+    Overall Approach:
+    Build trust through clear value proposition, technical credibility, and proven results.
+
+    Key Narrative Elements to Consider Naturally:
+    • Problem & Solution: Clearly articulate the pain points and how your technology solves them
+    • Technical Depth: Show appropriate level of technical sophistication for the target audience
+    • Credibility Signals: Case studies, security certifications, customer logos, performance metrics
+    • Product Demonstration: Clear explanation of features, integrations, and user benefits
+    • Conversion Pathways: Free trials, demos, documentation access, pricing transparency
+
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with the core value proposition, demonstrating technical capabilities,
+    building trust through social proof, and providing clear next steps for evaluation.
+
+    Essential Components for Technology Websites:
+    • Clear value proposition and problem/solution framing
+    • Feature demonstrations with concrete benefits
+    • Technical specifications and capabilities
+    • Integration ecosystem and API documentation
+    • Security and compliance certifications
+    • Customer success stories and case studies
+    • Transparent pricing and trial options
+    • Developer resources and SDK availability
+
+    Content Principles:
+    • Focus on outcomes and benefits, not just features
+    • Use concrete metrics and performance data where possible
+    • Balance technical depth with accessibility for decision-makers
+    • Include specific integration examples and use cases
+    • Highlight security and reliability for enterprise buyers
+
+    Professional Standards:
+    • All technical claims should be verifiable and specific
+    • Include real customer examples and results
+    • Provide clear paths for both technical and business evaluation
+    • Maintain consistent technical accuracy throughout
+    • Ensure all conversion points are clear and accessible
+    """,
+    "fitness": """
+    FITNESS & WELLNESS INDUSTRY - Professional Website Guidance
+
+    Overall Approach:
+    Inspire transformation through community, expertise, and proven results.
+
+    Key Narrative Elements to Consider Naturally:
+    • Transformation Stories: Real member results and success journeys
+    • Expert Credibility: Certified trainers, professional facilities, proven methodologies
+    • Community Atmosphere: Supportive environment, group energy, social proof
+    • Comprehensive Offerings: Classes, personal training, nutrition, recovery services
+    • Accessible Entry Points: Free trials, introductory offers, flexible memberships
+
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with inspirational transformations, showcasing expert trainers and facilities,
+    demonstrating the variety of programs, highlighting community success, and making membership accessible.
+
+    Essential Components for Fitness Websites:
+    • Inspirational member transformations and results
+    • Professional trainer profiles with certifications
+    • Comprehensive class schedules and program offerings
+    • State-of-the-art facility and equipment showcase
+    • Nutrition and wellness service integration
+    • Transparent membership options and pricing
+    • Community testimonials and social proof
+    • Easy trial and onboarding processes
+
+    Content Principles:
+    • Focus on outcomes and lifestyle benefits, not just workouts
+    • Use real member stories and specific results
+    • Balance motivation with professional credibility
+    • Highlight the community and support system
+    • Make fitness accessible and non-intimidating
+
+    Professional Standards:
+    • All fitness claims should be realistic and achievable
+    • Include proper certifications and trainer qualifications
+    • Show real facilities and equipment (no stock photos if possible)
+    • Provide clear pricing without hidden fees
+    • Emphasize safety and proper technique
+    • Include appropriate disclaimers for health and fitness
+    """,
+
+    "beauty": """
+    BEAUTY & SPA INDUSTRY - Professional Website Guidance
+
+    Overall Approach:
+    Create an atmosphere of luxury, relaxation, and transformation that appeals to self-care and wellness.
+
+    Key Narrative Elements to Consider Naturally:
+    • Sensory Experience: Evoke feelings of relaxation, luxury, and transformation
+    • Expertise & Trust: Highlight professional credentials, certifications, and experience
+    • Results & Benefits: Showcase tangible outcomes and wellness benefits
+    • Luxury & Quality: Emphasize premium products, facilities, and experiences
+    • Accessibility: Make booking and information easily accessible
+
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with an inviting atmosphere, showcasing services and expertise,
+    building trust through results and testimonials, and making booking effortless.
+
+    Essential Components for Beauty & Spa Websites:
+    • Comprehensive service menus with clear pricing
+    • Professional team profiles with credentials
+    • Treatment results and transformations
+    • Luxury facility amenities
+    • Retail product offerings
+    • Special packages and promotions
+    • Client testimonials and reviews
+    • Easy booking and gift options
+
+    Content Principles:
+    • Use sensory language that evokes relaxation and luxury
+    • Focus on benefits and outcomes, not just services
+    • Highlight expertise and professional qualifications
+    • Include specific product brands and ingredients
+    • Show real results with before/after when appropriate
+
+    Professional Standards:
+    • Maintain a consistent luxury aesthetic throughout
+    • Use high-quality, professional photography
+    • Include clear pricing and service durations
+    • Highlight safety, hygiene, and professional standards
+    • Provide multiple booking and contact options
+
+    Visual & Tone Guidelines:
+    • Soft, calming color palettes
+    • Elegant, clean typography
+    • Professional before/after photography
+    • Luxury product imagery
+    • Serene spa environment shots
+    """,
+    "ecommerce": """
+    E-COMMERCE & RETAIL INDUSTRY - Professional Website Guidance
+
+    Overall Approach:
+    Create a compelling shopping experience that builds trust, showcases products effectively, and drives conversions.
+
+    Key Narrative Elements to Consider Naturally:
+    • Product Discovery: Easy navigation and product discovery through categories and search
+    • Visual Merchandising: High-quality product imagery and compelling presentation
+    • Trust Building: Customer reviews, security badges, return policies, shipping transparency
+    • Value Proposition: Clear pricing, promotions, and unique selling points
+    • Conversion Optimization: Streamlined checkout process and multiple payment options
+
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with hero promotions, showcasing featured products, building trust through social proof, 
+    providing essential shopping information, and making purchase decisions easy and secure.
+
+    Essential Components for E-commerce Websites:
+    • Clear product categorization and navigation
+    • High-quality product imagery with multiple angles
+    • Customer reviews and rating systems
+    • Transparent pricing and promotion displays
+    • Shipping and return policy information
+    • Security badges and trust signals
+    • Shopping cart and checkout process features
+    • Mobile-responsive product displays
+
+    Content Principles:
+    • Use compelling product descriptions with benefits and features
+    • Include social proof through reviews and ratings
+    • Be transparent about pricing, shipping costs, and policies
+    • Highlight promotions and limited-time offers clearly
+    • Provide detailed product information and specifications
+
+    Professional Standards:
+    • All product images should be high-quality and consistent
+    • Pricing information must be clear and transparent
+    • Shipping costs and delivery times should be prominently displayed
+    • Return policies and guarantees should be easy to find
+    • Security and payment trust badges should be visible
+    """,
+    "healthcare": """
+    HEALTHCARE & MEDICAL INDUSTRY - Professional Website Guidance
+
+    Overall Approach:
+    Build trust through compassion, expertise, and clear patient-focused communication.
+
+    Key Narrative Elements to Consider Naturally:
+    • Compassionate Introduction: Understanding patient concerns and healthcare needs
+    • Professional Credentials: Expertise, qualifications, and medical experience
+    • Service Clarity: Clear explanation of treatments, procedures, and approaches
+    • Patient Experience: What to expect, process transparency, and care philosophy
+    • Trust Building: Patient stories, success outcomes, facility quality, staff credentials
+    • Accessibility: Easy appointment scheduling, location information, insurance details
+
+    Natural Flow Ideas (not prescriptive):
+    Consider starting with compassionate understanding of patient needs, establishing medical credibility,
+    clearly explaining services and approach, building trust through patient experiences, and making
+    care accessible through clear next steps.
+
+    Essential Components for Healthcare Websites:
+    • Clear service offerings with medical accuracy
+    • Professional medical team profiles with credentials
+    • Easy appointment scheduling and contact information
+    • Insurance and payment options transparency
+    • Patient portal access and digital health tools
+    • Telehealth and virtual care availability
+    • Patient education and health resources
+    • Emergency and after-hours information
+
+    Content Principles:
+    • Use compassionate, reassuring, and professional language
+    • Highlight medical expertise and credentials naturally
+    • Maintain appropriate medical discretion and HIPAA compliance
+    • Focus on patient outcomes and quality of life improvements
+    • Include clear calls to action for appointments and information
+    • Balance medical accuracy with patient-friendly explanations
+
+    Professional Standards:
+    • All medical information should be accurate and evidence-based
+    • Include proper disclaimers for medical content
+    • Maintain patient privacy and confidentiality in all content
+    • Ensure accessibility for patients with different health literacy levels
+    • Provide clear emergency and urgent care instructions
+    • Include proper credentials and certifications
+
+    Compliance Considerations:
+    • Avoid making specific medical outcome guarantees
+    • Include appropriate medical disclaimers where needed
+    • Ensure all provider credentials are accurately represented
+    • Maintain HIPAA compliance in all patient-facing content
+    • Provide clear scope of practice information
+    """
+}
+
+DEFAULT_GUIDANCE = """
+    PROFESSIONAL BUSINESS WEBSITE - General Guidance
+    
+    Overall Approach:
+    Create a compelling narrative that builds trust and drives action.
+    
+    Key Narrative Elements:
+    • Strong value proposition and unique selling points
+    • Credibility building through expertise and social proof
+    • Clear explanation of products/services and benefits
+    • Multiple natural conversion opportunities
+    • Professional presentation and user experience
+    
+    Content Principles:
+    • Write specific, benefit-focused copy
+    • Use high-quality, relevant imagery
+    • Create logical information hierarchy
+    • Maintain consistent brand voice
+    • Ensure clear calls to action throughout
+    """
+
+# Website standards shared by every industry (was inlined in the per-request f-string)
+STANDARDS = """
+COMPONENT CONSTRAINTS:
+- For each component, props MUST follow the provided propsSchema
+- Use schema_defaults as guidance for expected data structure
+- Prefer higher-scoring templates from RAG results
+- Only use component types from the allowed list given below
+
+PROFESSIONAL WEBSITE STANDARDS:
+
+COMPREHENSIVE COVERAGE:
+Create a complete, professional website with natural narrative flow. Include:
+• Strong opening that establishes brand identity and value
+• Multiple sections that build credibility and trust
+• Rich content that showcases products/services naturally
+• Social proof and validation elements
+• Clear conversion pathways
+• Professional footer with essential information
+
+NATURAL NARRATIVE FLOW:
+Arrange components in a logical, compelling sequence that tells a story. Consider:
+1. Introduction & Value Proposition
+2. Credibility & Trust Building
+3. Product/Service Showcase
+4. Social Proof & Validation
+5. Conversion & Action
+6. Practical Information
+
+CONTENT QUALITY:
+• Write specific, production-ready copy tailored to the business
+• Avoid generic placeholder text - be concrete and descriptive
+• Use appropriate tone for the industry and audience
+• Create compelling headlines and benefit-focused descriptions
+• Ensure all copy serves a purpose in the overall narrative
+
+IMAGERY & VISUALS:
+• Use high-quality, contextually appropriate images
+• Generate images using the image keyword themes given below
+• All images must be HTTPS URLs from approved sources
+• Include descriptive alt text for accessibility
+• Ensure visual consistency throughout
+
+NAVIGATION & UX:
+• Create coherent internal navigation with logical anchor links
+• Include multiple conversion opportunities throughout the page
+• Ensure mobile-friendly component arrangement
+• Maintain consistent styling and spacing
+
+TECHNICAL REQUIREMENTS:
+• Output must be valid JSON matching the specified schema
+• All component types must exist in allowed_types list
+• All props must conform to their component's propsSchema
+• Include appropriate tags for categorization
+• Ensure all required fields (mustHave) are populated
+"""
+
+# Types the model may always use, on top of whatever retrieval returned
+CORE_TYPES = ("Header", "Hero", "Footer", "FAQ", "Testimonials", "Gallery", "Pricing", "Contact")
+DEFAULT_COMPONENT_RANGE = "12-20"
+
+_SCHEMA_HEAD = """
+type GeneratedSite = {
+  success: true;
+  websiteName: string;
+  industry: string;
+  style: string;
+  tags: string[];
+  components: Array<{
+    id: string;
+    type: """
+_SCHEMA_TAIL = """;
+    tags?: string[];
+    props: Record<string, any>;
+  }>;
+};
+"""
+
+
+def _clean(text: str) -> str:
+    return textwrap.dedent(text).strip()
+
+
+def _build_prefix(guidance: str) -> str:
+    return sys.intern(
+        "INDUSTRY-SPECIFIC GUIDANCE:\n" + guidance + "\n\n" + _clean(STANDARDS) + "\n\n"
+    )
+
+
+_GUIDANCE: Dict[str, str] = {k: sys.intern(_clean(v)) for k, v in INDUSTRY_GUIDANCE.items()}
+_DEFAULT_GUIDANCE = sys.intern(_clean(DEFAULT_GUIDANCE))
+_PREFIXES: Dict[str, str] = {k: _build_prefix(v) for k, v in _GUIDANCE.items()}
+_DEFAULT_PREFIX = _build_prefix(_DEFAULT_GUIDANCE)
+
+
+def get_flexible_industry_guidance(industry_lower: str) -> str:
+    """
+    Return flexible, non-restrictive industry guidance that encourages natural narrative flow
+    """
+    return _GUIDANCE.get(industry_lower, _DEFAULT_GUIDANCE)
+
+
+def industry_prefix(industry: str) -> str:
+    """The prebuilt, request-independent head of the user message for `industry`."""
+    return _PREFIXES.get((industry or "").strip().lower(), _DEFAULT_PREFIX)
+
+
+def allowed_types_for(templates: List[dict]) -> List[str]:
+    retrieved = [t.get("type") for t in templates or [] if t.get("type")]
+    return sorted(set(retrieved).union(CORE_TYPES))
+
+
+def schema_for(allowed_types: List[str]) -> str:
+    union = " | ".join(f'"{t}"' for t in allowed_types) or '"Header" | "Hero" | "Footer"'
+    return _SCHEMA_HEAD + union + _SCHEMA_TAIL
+
+
+def build_user_message(
+        industry: str,
+        rag_payload: dict,
+        business: Dict[str, str],
+        allowed_types: List[str],
+        component_range: str = DEFAULT_COMPONENT_RANGE,
+        rag_json: Optional[str] = None,
+        schema: Optional[str] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Prefix + variable tail. Returns (user_msg, prompt_chars) where
+    prompt_chars is the char size of each section (for usage accounting).
+    `schema` replaces the default output schema (e.g. the compact wire format).
+    """
+    prefix = industry_prefix(industry)
+    if rag_json is None:
+        rag_json = json.dumps(rag_payload, ensure_ascii=False)
+    if schema is None:
+        schema = schema_for(allowed_types)
+    business_block = "\n".join(f"- {k}: {v}" for k, v in business.items())
+    keywords = ", ".join(rag_payload.get("image_keywords") or [])
+
+    parts = [
+        prefix,
+        "RAG CONTEXT & COMPONENT LIBRARY:\n", rag_json,
+        "\n\nBUSINESS REQUIREMENTS:\n", business_block,
+        "\n\nAllowed component types: ", ", ".join(allowed_types),
+        "\nImage keyword themes: ", keywords,
+        "\n\nOUTPUT STRUCTURE:\nGenerate a complete website with ", component_range,
+        " components that tells a compelling story and drives action.\n"
+        "The arrangement should feel natural and professional, not forced or template-driven.\n\n"
+        "Return ONLY valid JSON matching this schema:", schema,
+    ]
+    user_msg = "".join(parts)
+    guidance = get_flexible_industry_guidance((industry or "").strip().lower())
+    chars = {
+        "system": len(SYSTEM_MSG),
+        "rag_payload": len(rag_json),
+        "industry_guidance": len(guidance),
+        "schema": len(schema),
+        "business": len(business_block),
+    }
+    chars["instructions"] = len(user_msg) - sum(chars.values()) + chars["system"]
+    return user_msg, chars
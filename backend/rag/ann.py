@@ -0,0 +1,171 @@
+# rag/ann.py
+import json, math, os, time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import faiss
+import numpy as np
+
+# Index types for the component catalog. All of them score by inner product
+# over normalized embeddings (= cosine):
+#   flat  - exact brute force (IndexFlatIP); the baseline
+#   hnsw  - graph index (IndexHNSWFlat), no training, ~exact at small efSearch
+#   ivfpq - inverted lists + product quantization (IndexIVFPQ); smallest memory,
+#           needs training data, so small catalogs fall back to flat
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "128"))
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))          # 0 = ~4*sqrt(N)
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("RAG_PQ_M", "48"))                   # sub-quantizers, must divide dim
+PQ_NBITS = 8
+IVFPQ_MIN_ENTRIES = int(os.getenv("RAG_IVFPQ_MIN_ENTRIES", "4096"))
+IVF_TRAIN_MAX = 100_000                                   # training sample cap
+
+# Scalar-quantizer codes used by flat/hnsw for a compressed embedding storage
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+# Candidates pulled from an ANN index before role/industry filtering
+ANN_POOL = int(os.getenv("RAG_ANN_POOL", "512"))
+
+# Map the stored vectors/codes of an index read from disk instead of copying
+# them into each process; workers then share the page cache.
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+
+
+def meta_path(index_path: Path) -> Path:
+    """Sidecar next to the index file: index.faiss -> index.meta.json"""
+    return Path(index_path).with_suffix(".meta.json")
+
+
+def _nlist_for(n: int) -> int:
+    # faiss wants >= 39 training points per centroid
+    return IVF_NLIST or max(1, min(65536, int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m_for(dim: int) -> int:
+    m = PQ_M
+    while m > 1 and dim % m:
+        m -= 1
+    return m
+
+
+def make_index(matrix: np.ndarray, index_type: str = INDEX_TYPE,
+               storage: str = "float32") -> Tuple[Any, Dict[str, Any]]:
+    """
+    Build an index of `index_type` over `matrix` (N, dim float32, normalized).
+    `storage` (see rag/quant.py) makes flat/hnsw keep float16/int8 codes
+    instead of a second float32 copy of the catalog.
+    Returns (index, meta) where meta records what was actually built.
+    """
+    n, dim = matrix.shape
+    requested = index_type if index_type in INDEX_TYPES else "flat"
+    effective, params, note = requested, {}, None
+    qtype = _SQ_TYPES.get(storage)
+    t0 = time.perf_counter()
+
+    if requested == "ivfpq" and n < IVFPQ_MIN_ENTRIES:
+        effective, note = "flat", f"ivfpq needs >= {IVFPQ_MIN_ENTRIES} entries to train; got {n}"
+
+    if effective == "hnsw":
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dim, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.add(matrix)
+        params = {"M": HNSW_M, "efConstruction": HNSW_EF_CONSTRUCTION, "efSearch": HNSW_EF_SEARCH}
+    elif effective == "ivfpq":
+        nlist, m = _nlist_for(n), _pq_m_for(dim)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        if n > IVF_TRAIN_MAX:
+            sample = matrix[np.random.default_rng(0).choice(n, IVF_TRAIN_MAX, replace=False)]
+        else:
+            sample = matrix
+        index.train(sample)
+        index.add(matrix)
+        params = {"nlist": nlist, "nprobe": IVF_NPROBE, "pq_m": m, "pq_nbits": PQ_NBITS}
+    elif qtype is not None:
+        index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+        index.train(matrix)
+        index.add(matrix)
+    else:
+        index = faiss.IndexFlatIP(dim)
+        index.add(matrix)
+
+    apply_search_params(index, effective)
+    meta = {
+        "type": requested,
+        "effective_type": effective,
+        "storage": storage,
+        "params": params,
+        "entries": int(n),
+        "dim": int(dim),
+        "build_s": round(time.perf_counter() - t0, 3),
+        "built_at": int(time.time()),
+    }
+    if note:
+        meta["note"] = note
+    return index, meta
+
+
+def apply_search_params(index: Any, effective_type: str) -> None:
+    """Search-time knobs are not serialized by faiss; set them after build/read."""
+    if effective_type == "hnsw":
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif effective_type == "ivfpq":
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+
+
+def search_params(effective_type: str, sel: Any = None) -> Any:
+    """
+    Per-call search parameters. Passing params replaces the index's own
+    search-time knobs, so efSearch / nprobe are set here too.
+    """
+    if effective_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=HNSW_EF_SEARCH)
+    if effective_type == "ivfpq":
+        return faiss.SearchParametersIVF(sel=sel, nprobe=IVF_NPROBE)
+    return faiss.SearchParameters(sel=sel)
+
+
+def id_selector(ids: np.ndarray, n: int) -> Any:
+    """Bitmap selector over entry ids in [0, n) (one bit per entry)."""
+    mask = np.zeros(n, dtype=bool)
+    mask[ids] = True
+    bitmap = np.packbits(mask, bitorder="little")
+    sel = faiss.IDSelectorBitmap(n, faiss.swig_ptr(bitmap))
+    sel.referenced_objects = [bitmap]  # the selector only holds a pointer
+    return sel
+
+
+def write_index(index: Any, meta: Dict[str, Any], index_path: Path) -> None:
+    # replaced, never rewritten in place: other processes may have the old file mapped
+    index_path = Path(index_path)
+    tmp = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, index_path)
+    tmp = meta_path(index_path).with_name(f"{meta_path(index_path).name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, meta_path(index_path))
+
+
+def read_meta(index_path: Path) -> Optional[Dict[str, Any]]:
+    p = meta_path(index_path)
+    if not p.exists():
+        # Indexes written before the sidecar existed are plain IndexFlatIP
+        return {"type": "flat", "effective_type": "flat", "params": {}, "legacy": True} if Path(index_path).exists() else None
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def read_index(index_path: Path, meta: Dict[str, Any]) -> Any:
+    index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP_IFC if INDEX_MMAP else 0)
+    apply_search_params(index, meta.get("effective_type", "flat"))
+    return index
@@ -0,0 +1,423 @@
+# rag/catalog.py
+import json, math, mmap, os, re, sys, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from cache import pack, unpack
+
+# Compiled catalog: components.jsonl compiled at index build into one binary
+# file next to the index (index.catalog), memory-mapped at load. Retrieval
+# scores entries on a few fields; those are stored as columns:
+#   type          string table (offsets + utf-8)
+#   role          pageRole code per entry (vocabulary in the header)
+#   ind / tag     industry / tag codes per entry (offsets + codes)
+#   flags         FLAG_IMAGE_FIT (image-ish propsSchema key), FLAG_IMAGES_REQUIRED
+#   tok           sorted lexical token codes per entry (offsets + codes),
+#                 with the token vocabulary and its idf over this catalog
+#                 (or over the catalog it was cut from, for a shard)
+#   post          entries per token (offsets + positions), for lexical scoring
+#   payload       offset table into each full entry, packed (cache.pack)
+# Full entries are decoded only for the components actually returned, so
+# startup is one header parse and resident memory is the pages touched; the
+# mapping is shared by every worker like the embedding files.
+# catalog[i] is a CatalogEntry: __slots__, the scored fields as codes into the
+# (interned) vocabularies, and the full dict decoded on first use. It still
+# answers entry["raw"], like the {"raw", "blob"} dicts loaded before; the
+# embedded blob is not kept once the index is built.
+FORMAT = 1
+_MAGIC = b"WGCATLG\x01"
+_ALIGN = 8
+
+FLAG_IMAGE_FIT = 1
+FLAG_IMAGES_REQUIRED = 2
+
+_MEMBER_CACHE_SIZE = 256  # cached "entries holding any of these codes" masks per catalog
+_LEX_CACHE_SIZE = 4       # per-query lexical vectors kept (shared by the role searches of a request)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_IMAGE_KEYS = {"src", "avatar", "logo", "background", "photo", "icon"}
+
+
+def catalog_path(index_path: Path) -> Path:
+    return Path(index_path).with_suffix(".catalog")
+
+
+def tokenize(s: str) -> List[str]:
+    return _TOKEN_RE.findall((s or "").lower())
+
+
+def lex_text(raw: Dict[str, Any]) -> str:
+    """The text lexical scoring matches query words against."""
+    return " ".join([
+        str(raw.get("type", "")),
+        " ".join(raw.get("tags") or []),
+        str(raw.get("description", "") or raw.get("notes", "")),
+        json.dumps(raw.get("propsSchema", {}), ensure_ascii=False),
+    ]).lower()
+
+
+def image_fit(raw: Dict[str, Any]) -> bool:
+    for k in (raw.get("propsSchema", {}) or {}).keys():
+        lk = k.lower()
+        if "image" in lk or lk in _IMAGE_KEYS:
+            return True
+    return False
+
+
+class _Vocab:
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+
+    def code(self, value) -> int:
+        return self.codes.setdefault(value, len(self.codes))
+
+    def names(self) -> list:
+        return list(self.codes)
+
+
+def _csr(lists: List[List[int]], dtype: str):
+    off = np.zeros(len(lists) + 1, dtype="int64")
+    off[1:] = np.cumsum([len(x) for x in lists])
+    vals = np.fromiter((v for x in lists for v in x), dtype=dtype, count=int(off[-1]))
+    return off, vals
+
+
+def _table(data: List[bytes]):
+    off = np.zeros(len(data) + 1, dtype="int64")
+    off[1:] = np.cumsum([len(b) for b in data])
+    return off, np.frombuffer(b"".join(data), dtype="uint8")
+
+
+def compile_catalog(rows: Iterable[Dict[str, Any]], path: Path, source: Optional[Dict[str, Any]] = None,
+                    idf: Optional[Dict[str, float]] = None) -> Path:
+    """
+    Write `rows` (catalog order) as a compiled catalog at `path`, atomically.
+    `idf` (token -> idf, see Catalog.token_idf) replaces the idf over `rows`.
+    """
+    roles, inds, tags, toks = _Vocab(), _Vocab(), _Vocab(), _Vocab()
+    types, role_col, flags = [], [], []
+    ind_lists, tag_lists, tok_lists, payloads = [], [], [], []
+    for raw in rows:
+        raw = raw or {}
+        types.append(str(raw.get("type", "") or ""))
+        role_col.append(roles.code(raw.get("pageRole")))
+        ind_lists.append([inds.code(str(x)) for x in (raw.get("industry") or [])])
+        tag_lists.append([tags.code(str(x)) for x in (raw.get("tags") or [])])
+        tok_lists.append(sorted({toks.code(t) for t in tokenize(lex_text(raw))}))
+        flags.append((FLAG_IMAGE_FIT if image_fit(raw) else 0)
+                     | (FLAG_IMAGES_REQUIRED if raw.get("imagesRequired") else 0))
+        payloads.append(pack(raw))
+    n = len(types)
+
+    tok_off, tok = _csr(tok_lists, "uint32")
+    owner = np.repeat(np.arange(n, dtype="uint32"), np.diff(tok_off))
+    df = np.bincount(tok, minlength=len(toks.codes))
+    post_off = np.zeros(len(df) + 1, dtype="int64")
+    post_off[1:] = np.cumsum(df)
+    N = max(1, n)
+    tok_idf = np.array([math.log((N - d + 0.5) / (d + 0.5) + 1.0) if idf is None else idf.get(t, 0.0)
+                        for t, d in zip(toks.names(), df.tolist())], dtype="float64")
+
+    sections: Dict[str, np.ndarray] = {}
+    sections["type.off"], sections["type"] = _table([t.encode("utf-8") for t in types])
+    sections["role"] = np.array(role_col, dtype="uint16")
+    sections["ind.off"], sections["ind"] = _csr(ind_lists, "uint16")
+    sections["tag.off"], sections["tag"] = _csr(tag_lists, "uint32")
+    sections["flags"] = np.array(flags, dtype="uint8")
+    sections["tok.off"], sections["tok"] = tok_off, tok
+    sections["tok.idf"] = tok_idf
+    sections["tok.vocab"] = np.frombuffer("\n".join(toks.names()).encode("utf-8"), dtype="uint8")
+    sections["post.off"], sections["post"] = post_off, owner[np.argsort(tok, kind="stable")]
+    sections["payload.off"], sections["payload"] = _table(payloads)
+
+    layout, pos = {}, 0
+    for name, arr in sections.items():
+        layout[name] = {"dtype": arr.dtype.str, "offset": pos, "count": int(arr.size)}
+        pos += -(-arr.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({"format": FORMAT, "entries": n, "source": source, "roles": roles.names(),
+                         "industries": inds.names(), "tags": tags.names(), "sections": layout},
+                        ensure_ascii=False).encode("utf-8")
+
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_MAGIC + len(header).to_bytes(4, "little") + header)
+        f.write(b"\0" * (-f.tell() % _ALIGN))
+        for arr in sections.values():
+            f.write(arr.tobytes())
+            f.write(b"\0" * (-arr.nbytes % _ALIGN))
+    os.replace(tmp, path)
+    return path
+
+
+class CatalogEntry:
+    """
+    One entry of a compiled catalog: type, role / industry / tag codes and
+    flags read from the columns, the full dict decoded on first access.
+    """
+    __slots__ = ("catalog", "index", "type", "role_code", "industry_codes", "tag_codes", "flags", "_raw")
+
+    def __init__(self, cat: "Catalog", i: int, type_: str, role_code: int, industry_codes: Tuple[int, ...],
+                 tag_codes: Tuple[int, ...], flags: int):
+        self.catalog, self.index = cat, i
+        self.type = type_
+        self.role_code = role_code
+        self.industry_codes = industry_codes
+        self.tag_codes = tag_codes
+        self.flags = flags
+        self._raw: Optional[Dict[str, Any]] = None
+
+    @property
+    def role(self) -> Optional[str]:
+        return self.catalog.role_names[self.role_code]
+
+    @property
+    def industries(self) -> List[str]:
+        return [self.catalog.industry_names[c] for c in self.industry_codes]
+
+    @property
+    def tags(self) -> List[str]:
+        return [self.catalog.tag_names[c] for c in self.tag_codes]
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        if self._raw is None:
+            self._raw = self.catalog.raw(self.index)
+        return self._raw
+
+    # the {"raw": ...} view of the entry dicts this replaces
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        if key != "raw":
+            raise KeyError(key)
+        return self.raw
+
+    def __contains__(self, key) -> bool:
+        return key == "raw"
+
+    def get(self, key: str, default=None):
+        return self.raw if key == "raw" else default
+
+    def __repr__(self) -> str:
+        return f"CatalogEntry({self.index}, {self.type!r}, role={self.role!r})"
+
+
+class Catalog:
+    """
+    A compiled catalog, memory-mapped. Entries are addressed by position (the
+    row of the embedding matrix); the columns answer what scoring needs,
+    raw(i) decodes the full entry (a fresh dict, callers may mutate it) and
+    catalog[i] is a CatalogEntry.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"not a compiled catalog: {self.path}")
+        hlen = int.from_bytes(self._mm[8:12], "little")
+        self.header = json.loads(self._mm[12:12 + hlen].decode("utf-8"))
+        base = -(-(12 + hlen) // _ALIGN) * _ALIGN
+        self._cols = {name: np.frombuffer(self._mm, dtype=s["dtype"], count=s["count"], offset=base + s["offset"])
+                      for name, s in self.header["sections"].items()}
+        # interned: the full catalog and its shards share one string per name
+        self.role_names: List[Optional[str]] = [r if r is None else sys.intern(r) for r in self.header["roles"]]
+        self.industry_names: List[str] = [sys.intern(x) for x in self.header["industries"]]
+        self.tag_names: List[str] = [sys.intern(x) for x in self.header["tags"]]
+        self.roles = self._cols["role"]
+        self.flags = self._cols["flags"]
+        self._idf = self._cols["tok.idf"]
+        self._tok_codes: Optional[Dict[str, int]] = None
+        self._lower: Dict[str, Dict[str, List[int]]] = {}
+        self._members: "OrderedDict[Tuple[str, Tuple[int, ...]], np.ndarray]" = OrderedDict()
+        self._containing: Dict[str, List[int]] = {}
+        self._lex: "OrderedDict[Tuple[str, ...], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self.header["entries"])
+
+    def __getitem__(self, i: int) -> CatalogEntry:
+        i = int(i)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return CatalogEntry(self, i, self.type(i), int(self.roles[i]), self.codes("ind", i), self.codes("tag", i),
+                            int(self.flags[i]))
+
+    def __iter__(self) -> Iterator[CatalogEntry]:
+        # whole columns at once: per-entry slices of the arrays cost more than the entries
+        types, toff = self._cols["type"].tobytes(), self._cols["type.off"].tolist()
+        roles, flags = self.roles.tolist(), self.flags.tolist()
+        cols = {}
+        for name in ("ind", "tag"):
+            off, vals = self._cols[name + ".off"].tolist(), self._cols[name].tolist()
+            cols[name] = [tuple(vals[off[i]:off[i + 1]]) for i in range(len(self))]
+        for i in range(len(self)):
+            yield CatalogEntry(self, i, types[toff[i]:toff[i + 1]].decode("utf-8"), roles[i], cols["ind"][i],
+                               cols["tag"][i], flags[i])
+
+    @property
+    def source(self) -> Optional[Dict[str, Any]]:
+        return self.header.get("source")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    # ---- per entry ----
+
+    def _str(self, name: str, i: int) -> bytes:
+        off = self._cols[name + ".off"]
+        return self._cols[name][int(off[i]):int(off[i + 1])].tobytes()
+
+    def type(self, i: int) -> str:
+        return self._str("type", i).decode("utf-8")
+
+    def role(self, i: int) -> Optional[str]:
+        return self.role_names[int(self.roles[i])]
+
+    def codes(self, name: str, i: int) -> Tuple[int, ...]:
+        """Vocabulary codes of entry i in column `name` ("ind" / "tag")."""
+        off = self._cols[name + ".off"]
+        return tuple(self._cols[name][off[i]:off[i + 1]].tolist())
+
+    def industries(self, i: int) -> List[str]:
+        return [self.industry_names[c] for c in self.codes("ind", i)]
+
+    def tags(self, i: int) -> List[str]:
+        return [self.tag_names[c] for c in self.codes("tag", i)]
+
+    def raw(self, i: int) -> Dict[str, Any]:
+        return unpack(self._str("payload", i))
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.raw(i)
+
+    # ---- columns ----
+
+    def role_ids(self) -> Dict[Optional[str], np.ndarray]:
+        """pageRole -> sorted entry positions"""
+        out = {}
+        for c, name in enumerate(self.role_names):
+            ids = np.flatnonzero(self.roles == c)
+            if len(ids):
+                out[name] = ids
+        return out
+
+    def industry_ids(self) -> Dict[str, np.ndarray]:
+        """lower-cased industry -> sorted entry positions"""
+        off, codes = self._cols["ind.off"], self._cols["ind"]
+        owner = np.repeat(np.arange(len(self), dtype="int64"), np.diff(off))
+        out: Dict[str, np.ndarray] = {}
+        for c, name in enumerate(self.industry_names):
+            ids = owner[codes == c]
+            key = name.lower()
+            out[key] = np.union1d(out[key], ids) if key in out else np.unique(ids)
+        return out
+
+    def _vocab(self, name: str) -> list:
+        return {"role": self.role_names, "ind": self.industry_names, "tag": self.tag_names}[name]
+
+    def entries_with(self, name: str, codes: Sequence[int]) -> np.ndarray:
+        """Per entry (bool): does its `name` column ("ind" / "tag") hold any of `codes`? Cached."""
+        key = (name, tuple(codes))
+        with self._lock:
+            hit = self._members.get(key)
+            if hit is not None:
+                self._members.move_to_end(key)
+                return hit
+        off, vals = self._cols[name + ".off"], self._cols[name]
+        want = np.zeros(len(self._vocab(name)), dtype=bool)
+        want[list(codes)] = True
+        owner = np.repeat(np.arange(len(self), dtype="int64"), np.diff(off))
+        out = np.zeros(len(self), dtype=bool)
+        out[owner[want[vals]]] = True
+        with self._lock:
+            self._members[key] = out
+            if len(self._members) > _MEMBER_CACHE_SIZE:
+                self._members.popitem(last=False)
+        return out
+
+    def has_any(self, name: str, codes: Sequence[int], ids: np.ndarray) -> np.ndarray:
+        """Per entry of `ids`: does its `name` column ("ind" / "tag") hold any of `codes`?"""
+        if not len(codes):
+            return np.zeros(len(ids), dtype=bool)
+        return self.entries_with(name, codes)[np.asarray(ids, dtype="int64")]
+
+    def has_role(self, codes: Sequence[int], ids: np.ndarray) -> np.ndarray:
+        want = np.zeros(len(self.role_names), dtype=bool)
+        want[list(codes)] = True
+        return want[self.roles[np.asarray(ids, dtype="int64")]]
+
+    def codes_of(self, name: str, value: str) -> List[int]:
+        """Vocabulary codes of column `name` ("role" / "ind" / "tag") whose lower-cased value is `value`."""
+        by_lower = self._lower.get(name)
+        if by_lower is None:
+            by_lower = {}
+            for c, v in enumerate(self._vocab(name)):
+                by_lower.setdefault((v or "").lower(), []).append(c)
+            self._lower[name] = by_lower
+        return by_lower.get(value, [])
+
+    def tags_containing(self, text: str, ids: np.ndarray) -> np.ndarray:
+        """Per entry of `ids`: is `text` a substring of its space-joined tags (case-insensitive)?"""
+        text = text.lower()
+        ids = np.asarray(ids, dtype="int64")
+        if " " in text:  # may span two tags
+            return np.array([text in " ".join(self.tags(i)).lower() for i in ids.tolist()], dtype=bool)
+        codes = self._containing.get(text)
+        if codes is None:
+            codes = [c for c, t in enumerate(self.tag_names) if text in t.lower()]
+            if len(self._containing) >= _MEMBER_CACHE_SIZE:
+                self._containing.clear()
+            self._containing[text] = codes
+        return self.has_any("tag", codes, ids)
+
+    def _token_codes(self) -> Dict[str, int]:
+        if self._tok_codes is None:
+            words = self._cols["tok.vocab"].tobytes().decode("utf-8")
+            self._tok_codes = {w: i for i, w in enumerate(words.split("\n"))} if words else {}
+        return self._tok_codes
+
+    def token_code(self, token: str) -> Optional[int]:
+        return self._token_codes().get(token)
+
+    def token_idf(self) -> Dict[str, float]:
+        """idf per lexical token, over this catalog."""
+        return {w: float(self._idf[i]) for w, i in self._token_codes().items()}
+
+    def lexical_scores(self, tokens: Iterable[str], ids: np.ndarray, cap: float = 0.2) -> np.ndarray:
+        """
+        Tiny BM25-ish score per entry of `ids`: idf of the query tokens the
+        entry contains, over 1 + log(1 + its token count), capped at `cap`.
+        """
+        ids = np.asarray(ids, dtype="int64")
+        key = tuple(sorted(set(tokens)))
+        codes = [c for c in (self.token_code(t) for t in key) if c is not None]
+        if not codes or not len(ids):
+            return np.zeros(len(ids), dtype="float64")
+        with self._lock:
+            num = self._lex.get(key)
+            if num is not None:
+                self._lex.move_to_end(key)
+        if num is None:
+            num = np.zeros(len(self), dtype="float64")
+            off, post = self._cols["post.off"], self._cols["post"]
+            for c in codes:
+                num[post[off[c]:off[c + 1]]] += self._idf[c]
+            with self._lock:
+                self._lex[key] = num
+                if len(self._lex) > _LEX_CACHE_SIZE:
+                    self._lex.popitem(last=False)
+        off = self._cols["tok.off"]
+        return np.minimum(num[ids] / (1.0 + np.log(1.0 + (off[ids + 1] - off[ids]))), cap)
+
+def open_catalog(path: Path) -> Optional[Catalog]:
+    """The compiled catalog at `path`, or None when missing, unreadable or of another format."""
+    try:
+        cat = Catalog(path)
+    except (OSError, ValueError):
+        return None
+    return cat if cat.header.get("format") == FORMAT else None
@@ -0,0 +1,303 @@
+# rag/embedder.py
+import json, os, queue, threading, time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Sentence embedder behind rag.vectorstore. Two backends:
+#   torch - sentence-transformers on torch (the reference)
+#   onnx  - the same transformer exported to ONNX (optionally int8 dynamic
+#           quantized) run by onnxruntime, with mean pooling + L2 norm done
+#           in numpy. Imports neither torch nor sentence-transformers.
+# Export once with:  python -m rag.embedder export [--int8]
+EMBED_BACKEND = os.getenv("RAG_EMBED_BACKEND", "torch").lower()
+EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", "all-MiniLM-L6-v2")
+ONNX_DIR = Path(os.getenv("RAG_ONNX_DIR", Path(__file__).resolve().parent / "onnx"))
+ONNX_QUANT = os.getenv("RAG_ONNX_QUANT", "none").lower()     # none | int8
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", "0"))       # 0 = onnxruntime default
+BATCH_SIZE = 32
+
+# Query micro-batching (BatchingEmbedder): concurrent encode() calls are run as
+# one batch on a dedicated thread instead of contending for torch's threads.
+MICROBATCH = os.getenv("RAG_EMBED_MICROBATCH", "1") == "1"
+MICROBATCH_MAX_ITEMS = int(os.getenv("RAG_EMBED_BATCH_MAX", "32"))
+MICROBATCH_WAIT_MS = float(os.getenv("RAG_EMBED_BATCH_WAIT_MS", "2"))  # linger for more, only under load
+TORCH_THREADS = int(os.getenv("RAG_TORCH_THREADS", "0"))                # 0 = torch default; process-wide
+
+_CONFIG = "embedder.json"
+_MODEL_FILES = {"none": "model.onnx", "int8": "model.int8.onnx"}
+
+
+class TorchEmbedder:
+    backend = "torch"
+
+    def __init__(self, model_name: str = EMBED_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+
+    @property
+    def dim(self) -> int:
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True, batch_size: int = BATCH_SIZE) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=normalize_embeddings,
+                                            batch_size=batch_size), dtype="float32")
+
+
+class OnnxEmbedder:
+    """onnxruntime session + fast tokenizer (tokenizer.json), configured from embedder.json."""
+    backend = "onnx"
+
+    def __init__(self, onnx_dir: Path = ONNX_DIR, quant: str = ONNX_QUANT, threads: int = ONNX_THREADS):
+        import onnxruntime  # noqa: F401  (fail early when not installed)
+        from tokenizers import Tokenizer
+
+        onnx_dir = Path(onnx_dir)
+        model_path = onnx_dir / _MODEL_FILES.get(quant, _MODEL_FILES["none"])
+        if not model_path.exists():
+            raise FileNotFoundError(f"{model_path} not found; run `python -m rag.embedder export"
+                                    f"{' --int8' if quant == 'int8' else ''}` first")
+        self.config: Dict[str, Any] = json.loads((onnx_dir / _CONFIG).read_text(encoding="utf-8"))
+        self.name = self.config["model"]
+        self.quant = quant
+        self.model_path = model_path
+        self.threads = threads
+        self._session: Any = None
+        self._inputs: set = set()
+        self._pid = 0
+        self._lock = threading.Lock()
+
+        self.tokenizer = Tokenizer.from_file(str(onnx_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=int(self.config["max_seq_length"]))
+        self.tokenizer.enable_padding(pad_id=int(self.config["pad_token_id"]), pad_token=self.config["pad_token"])
+
+    @property
+    def dim(self) -> int:
+        return int(self.config["dim"])
+
+    @property
+    def session(self) -> Any:
+        """Created on first use in each process: onnxruntime's thread pool does not survive fork."""
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    import onnxruntime as ort
+                    opts = ort.SessionOptions()
+                    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    if self.threads:
+                        opts.intra_op_num_threads = self.threads
+                    session = ort.InferenceSession(str(self.model_path), opts, providers=["CPUExecutionProvider"])
+                    self._inputs = {i.name for i in session.get_inputs()}
+                    self._session, self._pid = session, os.getpid()
+        return self._session
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in enc], dtype="int64"),
+            "attention_mask": np.array([e.attention_mask for e in enc], dtype="int64"),
+            "token_type_ids": np.array([e.type_ids for e in enc], dtype="int64"),
+        }
+        session = self.session
+        hidden = session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        mask = feeds["attention_mask"][:, :, None].astype("float32")
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)   # mean pooling
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True, batch_size: int = BATCH_SIZE) -> np.ndarray:
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        # length-sorted batches pad less (same trick as sentence-transformers)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for lo in range(0, len(order), batch_size):
+            idx = order[lo:lo + batch_size]
+            out[idx] = self._encode_batch([texts[i] for i in idx])
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+
+def load_embedder(backend: str = EMBED_BACKEND):
+    if backend == "onnx":
+        return OnnxEmbedder()
+    return TorchEmbedder()
+
+
+def _Encoder(transformer: Any, names: List[str]) -> Any:
+    """nn.Module calling `transformer` by keyword; its forward() signature differs across transformers versions."""
+    import torch
+
+    class Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(names, inputs)), return_dict=True).last_hidden_state
+
+    return Encoder()
+
+
+_Job = Tuple[List[str], bool, Future]
+
+
+class BatchingEmbedder:
+    """
+    Wraps an embedder so that concurrent encode() calls from request threads
+    are collected (up to `max_items` texts or `wait_ms`) and run as ONE
+    model.encode on a dedicated thread; each caller blocks on its own future.
+    An idle service runs a request as soon as it arrives; it only lingers for
+    more when the previous batch coalesced several callers (i.e. under load).
+    The thread is started on first use, and again in a forked child.
+    """
+
+    def __init__(self, model: Any, max_items: int = MICROBATCH_MAX_ITEMS, wait_ms: float = MICROBATCH_WAIT_MS,
+                 torch_threads: int = TORCH_THREADS):
+        self.model = model
+        self.backend = model.backend
+        self.name = model.name
+        self.max_items = max(1, max_items)
+        self.wait_s = max(0.0, wait_ms) / 1000.0
+        self.torch_threads = torch_threads
+        self._lock = threading.Lock()
+        self._queue: "queue.SimpleQueue[_Job]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = 0
+        self.requests = self.items = self.batches = self.max_batch = 0
+
+    @property
+    def dim(self) -> int:
+        return self.model.dim
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True, **_: Any) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype="float32")
+        self._start()
+        fut: Future = Future()
+        self._queue.put((texts, normalize_embeddings, fut))
+        return fut.result()
+
+    def _start(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self._queue = queue.SimpleQueue()   # a parent's queue/thread do not survive fork
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="embed-batch", daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: _Job, linger: bool) -> List[_Job]:
+        batch, n = [first], len(first[0])
+        deadline = time.perf_counter() + (self.wait_s if linger else 0.0)
+        while n < self.max_items:
+            timeout = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(job)
+            n += len(job[0])
+        return batch
+
+    def _run(self) -> None:
+        if self.torch_threads and self.backend == "torch":
+            import torch
+            # process-wide: also caps torch ops on other threads (index builds,
+            # direct model.encode calls), not just the batches run here
+            torch.set_num_threads(self.torch_threads)
+        q = self._queue
+        linger = False
+        while True:
+            batch = self._collect(q.get(), linger)
+            linger = len(batch) > 1
+            for normalize in {job[1] for job in batch}:
+                group = [job for job in batch if job[1] == normalize and job[2].set_running_or_notify_cancel()]
+                texts = [t for job in group for t in job[0]]
+                try:
+                    vecs = np.asarray(self.model.encode(texts, normalize_embeddings=normalize,
+                                                        batch_size=max(len(texts), 1)), dtype="float32")
+                except BaseException as e:
+                    for job in group:
+                        job[2].set_exception(e)
+                    continue
+                lo = 0
+                for job in group:
+                    job[2].set_result(vecs[lo:lo + len(job[0])])
+                    lo += len(job[0])
+            with self._lock:
+                self.requests += len(batch)
+                self.items += sum(len(job[0]) for job in batch)
+                self.batches += 1
+                self.max_batch = max(self.max_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "items": self.items,
+                "batches": self.batches,
+                "max_batch": self.max_batch,
+                "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            }
+
+
+def export_onnx(model_name: str = EMBED_MODEL, out_dir: Path = ONNX_DIR, int8: bool = False) -> Dict[str, Any]:
+    """
+    Export the sentence-transformers model's transformer to ONNX (+ tokenizer
+    and pooling config); with `int8`, also write a dynamically quantized copy.
+    Needs torch, sentence-transformers and onnx; serving does not.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = st[1].get_pooling_mode_str() if len(st) > 1 and hasattr(st[1], "get_pooling_mode_str") else "mean"
+    if pooling != "mean":
+        raise ValueError(f"{model_name}: only mean pooling is supported, got {pooling}")
+    transformer, tokenizer = st[0].auto_model.eval(), st.tokenizer
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    sample = tokenizer(["a sample sentence", "another"], padding=True, return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(_Encoder(transformer, names), tuple(sample[n] for n in names),
+                          str(out_dir / _MODEL_FILES["none"]), input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes,
+                          opset_version=17, dynamo=False)
+    tokenizer.save_pretrained(str(out_dir))
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out_dir / _MODEL_FILES["none"]), str(out_dir / _MODEL_FILES["int8"]),
+                         weight_type=QuantType.QInt8)
+
+    config = {
+        "model": model_name,
+        "dim": int(st.get_sentence_embedding_dimension()),
+        "max_seq_length": int(st.max_seq_length),
+        "pooling": pooling,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": int(tokenizer.pad_token_id),
+        "int8": bool(int8),
+        "export_s": round(time.perf_counter() - t0, 2),
+    }
+    (out_dir / _CONFIG).write_text(json.dumps(config, indent=2), encoding="utf-8")
+    return config
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Export the RAG embedder to ONNX")
+    ap.add_argument("command", choices=["export"])
+    ap.add_argument("--model", default=EMBED_MODEL)
+    ap.add_argument("--out", default=str(ONNX_DIR))
+    ap.add_argument("--int8", action="store_true", help="also write a dynamically quantized int8 model")
+    args = ap.parse_args()
+    print(json.dumps(export_onnx(args.model, Path(args.out), args.int8), indent=2))
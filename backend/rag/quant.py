@@ -0,0 +1,187 @@
+# rag/quant.py
+import mmap, os
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+# Storage for the catalog embedding matrix held by every worker:
+#   float32 - the encoder output as-is (4 bytes/dim); the baseline
+#   float16 - half precision (2 bytes/dim)
+#   int8    - symmetric scalar quantization with one float32 scale per row
+#             (1 byte/dim + 4 bytes/row)
+# With a compressed storage, candidate scoring runs on the codes and only the
+# top RERANK_TOP candidates are re-scored exactly against the float32 matrix,
+# which is kept on disk (.npy next to the index) and memory-mapped, so only the
+# rows actually re-scored are paged in (and the pages are shared by workers).
+# Loaded from disk (from_file), the stored codes are memory-mapped as well:
+# float32 straight from that .npy, float16/int8 from a codes cache written next
+# to it, so every worker process maps the same page-cache pages.
+STORAGES = ("float32", "float16", "int8")
+EMB_STORAGE = os.getenv("RAG_EMB_STORAGE", "float32").lower()
+RERANK_TOP = int(os.getenv("RAG_RERANK_TOP", "64"))
+
+SCORE_CHUNK_ROWS = 4096  # rows dequantized per block while scoring (~6 MB float32 at dim 384)
+_INT8_MAX = 127.0
+
+
+def exact_path(index_path: Path) -> Path:
+    """float32 sidecar next to the index file: index.faiss -> index.f32.npy"""
+    return Path(index_path).with_suffix(".f32.npy")
+
+
+def codes_path(exact_file: Path, storage: str) -> Path:
+    """Codes cache next to a float32 .npy: index.f32.npy -> index.int8.npy"""
+    name = Path(exact_file).name
+    stem = name[:-len(".f32.npy")] if name.endswith(".f32.npy") else Path(name).stem
+    return Path(exact_file).with_name(f"{stem}.{storage}.npy")
+
+
+def _save_atomic(path: Path, matrix: np.ndarray) -> None:
+    # workers may write it concurrently at startup; readers never see a partial file
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp, path)
+
+
+class EmbeddingMatrix:
+    """
+    (N, dim) L2-normalized catalog embeddings in one of STORAGES.
+    rows()/scores() work on the stored codes (approximate unless float32);
+    exact_rows()/exact_scores() use the float32 values.
+    """
+
+    def __init__(self, matrix: np.ndarray, storage: str = EMB_STORAGE, exact_file: Optional[Path] = None):
+        """With `exact_file`, the float32 matrix is written there and used memory-mapped."""
+        matrix = np.ascontiguousarray(matrix, dtype="float32")
+        self.storage = storage if storage in STORAGES else "float32"
+        self.shape = matrix.shape
+        self.scales: Optional[np.ndarray] = None
+        self.exact: Optional[np.ndarray] = None
+        if exact_file is not None:
+            _save_atomic(Path(exact_file), matrix)
+            matrix = np.load(exact_file, mmap_mode="r")
+        if self.storage == "float32":
+            self.codes = matrix
+            self.exact = matrix
+            return
+        self.codes, self.scales = self._quantize(matrix)
+        if exact_file is not None:
+            self.exact = matrix
+
+    def _quantize(self, matrix: np.ndarray):
+        if self.storage == "float16":
+            return matrix.astype("float16"), None
+        scales = np.abs(matrix).max(axis=1) / _INT8_MAX
+        scales[scales == 0] = 1.0
+        scales = scales.astype("float32")
+        return np.clip(np.rint(matrix / scales[:, None]), -_INT8_MAX, _INT8_MAX).astype("int8"), scales
+
+    @classmethod
+    def from_file(cls, path: Path, storage: str = EMB_STORAGE) -> "EmbeddingMatrix":
+        """
+        From a float32 .npy written earlier, memory-mapped. Compressed codes
+        come from (or are written to) codes_path() and are mapped too; the
+        float32 file stays mapped for exact re-scoring.
+        """
+        path = Path(path)
+        mapped = np.load(path, mmap_mode="r")
+        emb = cls.__new__(cls)
+        emb.storage = storage if storage in STORAGES else "float32"
+        emb.shape = mapped.shape
+        emb.exact = mapped
+        emb.codes, emb.scales = mapped, None
+        if emb.compressed:
+            emb.codes, emb.scales = emb._load_codes(path, mapped)
+        return emb
+
+    def _load_codes(self, exact_file: Path, mapped: np.ndarray):
+        cpath = codes_path(exact_file, self.storage)
+        spath = cpath.with_suffix(".scales.npy")
+        try:
+            # the cache is only trusted if written after the float32 file it was derived from
+            if cpath.stat().st_mtime_ns >= exact_file.stat().st_mtime_ns:
+                codes = np.load(cpath, mmap_mode="r")
+                scales = np.load(spath, mmap_mode="r") if self.storage == "int8" else None
+                if codes.shape == mapped.shape and (scales is None or scales.shape == (mapped.shape[0],)):
+                    return codes, scales
+        except (OSError, ValueError):
+            pass
+        codes, scales = self._quantize(np.asarray(mapped))
+        if scales is not None:
+            _save_atomic(spath, scales)
+        _save_atomic(cpath, codes)                              # written last: its mtime validates both
+        return np.load(cpath, mmap_mode="r"), (np.load(spath, mmap_mode="r") if scales is not None else None)
+
+    @property
+    def compressed(self) -> bool:
+        return self.storage != "float32"
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _dequantize(self, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        out = codes.astype("float32")
+        if scales is not None:
+            out *= scales[:, None]
+        return out
+
+    def rows(self, idx: Sequence[int]) -> np.ndarray:
+        """(M, dim) float32 vectors for `idx` from the stored codes."""
+        idx = np.asarray(idx, dtype="int64")
+        return self._dequantize(self.codes[idx], None if self.scales is None else self.scales[idx])
+
+    def exact_rows(self, idx: Sequence[int]) -> np.ndarray:
+        idx = np.asarray(idx, dtype="int64")
+        if self.exact is None:
+            return self.rows(idx)
+        return np.asarray(self.exact[idx], dtype="float32")
+
+    def scores_many(self, Q: np.ndarray) -> np.ndarray:
+        """(B, N) inner products of each query row with the whole catalog, from the codes."""
+        Q = np.asarray(Q, dtype="float32")
+        if not self.compressed:
+            return Q.dot(self.codes.T)
+        out = np.empty((Q.shape[0], self.shape[0]), dtype="float32")
+        for lo in range(0, self.shape[0], SCORE_CHUNK_ROWS):
+            hi = min(lo + SCORE_CHUNK_ROWS, self.shape[0])
+            block = self.codes[lo:hi].astype("float32")          # cache-sized block
+            out[:, lo:hi] = Q.dot(block.T)
+            if self.scales is not None:
+                out[:, lo:hi] *= self.scales[lo:hi]
+        return out
+
+    def scores(self, q: np.ndarray) -> np.ndarray:
+        """(N,) inner products of one query with the whole catalog, from the codes."""
+        return self.scores_many(np.asarray(q, dtype="float32")[None, :])[0]
+
+    def exact_scores(self, q: np.ndarray, idx: Sequence[int]) -> np.ndarray:
+        idx = np.asarray(idx, dtype="int64")
+        if not len(idx):
+            return np.empty(0, dtype="float32")
+        return self.exact_rows(idx).dot(np.asarray(q, dtype="float32"))
+
+    def memory(self) -> Dict[str, int]:
+        """
+        Bytes of the stored codes, and how much of that is private to this
+        process (memory-mapped arrays are page cache, shared by all workers).
+        The float32 mmap kept for re-scoring is reported separately.
+        """
+        out = {
+            "codes": int(self.codes.nbytes),
+            "scales": int(self.scales.nbytes) if self.scales is not None else 0,
+            "float32_equivalent": int(self.shape[0] * self.shape[1] * 4),
+        }
+        out["resident"] = out["codes"] + out["scales"]
+        out["private"] = sum(int(a.nbytes) for a in (self.codes, self.scales) if a is not None and not _is_mapped(a))
+        out["exact_mmap"] = int(self.exact.nbytes) if self.compressed and self.exact is not None else 0
+        return out
+
+
+def _is_mapped(a: np.ndarray) -> bool:
+    # np.memmap results of arithmetic are np.memmap too; only a view chain ending in an mmap is file-backed
+    while isinstance(a, np.ndarray):
+        if isinstance(a.base, mmap.mmap):
+            return True
+        a = a.base
+    return False
@@ -0,0 +1,248 @@
+# rag/shards.py
+import json, os, re, shutil, threading, time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from rag import ann, catalog, quant
+
+# Sharded catalog: one sub-index per industry value plus a shared "general"
+# shard (entries tagged general or with no industry). Each shard has its own
+# embedding block, FAISS index and (built at load) lexical stats and role id
+# sets, so a worker only holds the shards of the industries it actually serves.
+# Shards are loaded lazily and evicted LRU. Each shard's entries are a compiled
+# catalog (rag/catalog.py) of its own, with the full catalog's idf so lexical
+# scores match the unsharded search.
+# Sharding widens an industry filter on purpose: the general shard is searched
+# for every industry, so entries tagged general or with no industry are
+# candidates for any industry-filtered query, where the unsharded filter only
+# takes entries whose industry contains the requested one.
+SHARDS_ENABLED = os.getenv("RAG_SHARDS", "0") == "1"
+SHARD_DIR = Path(os.getenv("RAG_SHARD_DIR", Path(__file__).resolve().parent / "shards"))
+SHARD_CACHE_SIZE = int(os.getenv("RAG_SHARD_CACHE", "8"))       # shards kept loaded per worker
+GENERAL = "general"
+FULL = "*"                                                      # key of the unsharded catalog view
+
+_MANIFEST = "manifest.json"
+_LAYOUT = 2                  # bumped when the shard files change meaning (2: full-catalog idf)
+_SLUG_RE = re.compile(r"[^a-z0-9_-]+")
+_FILTER_CACHE_SIZE = 512
+
+
+def shard_keys(industries: List[str]) -> List[str]:
+    inds = sorted({str(x).lower() for x in industries if str(x).strip()})
+    return inds or [GENERAL]
+
+
+def _slug(key: str) -> str:
+    return _SLUG_RE.sub("_", key) or "_"
+
+
+class Shard:
+    """
+    One searchable slice of the catalog: its entries (catalog.Catalog), their
+    embeddings (quant.EmbeddingMatrix), a FAISS index over them and `ids`
+    mapping local -> catalog position (None for the full catalog).
+    """
+
+    def __init__(self, key: str, entries: catalog.Catalog, emb: quant.EmbeddingMatrix, index: Any,
+                 meta: Dict[str, Any], ids: Optional[np.ndarray] = None):
+        self.key = key
+        self.entries = entries
+        self.emb = emb
+        self.index = index
+        self.meta = meta
+        self.ids = ids
+        self.index_bytes = 0
+        self._filters: "OrderedDict[Tuple[Optional[str], str], Optional[Tuple[np.ndarray, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.role_ids = entries.role_ids()
+        self.industry_ids = entries.industry_ids()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def use_ann(self) -> bool:
+        return self.meta.get("effective_type", "flat") != "flat"
+
+    def global_id(self, local: int) -> int:
+        return int(self.ids[local]) if self.ids is not None else int(local)
+
+    def filter_ids(self, role: Optional[str], industry: str) -> Optional[Tuple[np.ndarray, Any]]:
+        """
+        (sorted local ids, FAISS selector over them) for a pageRole / industry
+        filter; None when nothing is filtered. An entry matches the industry
+        when any of its industry values contains it.
+        """
+        if not role and not industry:
+            return None
+        key = (role, industry)
+        with self._lock:
+            if key in self._filters:
+                self._filters.move_to_end(key)
+                return self._filters[key]
+        ids = self.role_ids.get(role, np.empty(0, dtype="int64")) if role else None
+        if industry:
+            matching = [v for x, v in self.industry_ids.items() if industry in x]
+            ind_ids = np.unique(np.concatenate(matching)) if matching else np.empty(0, dtype="int64")
+            ids = ind_ids if ids is None else np.intersect1d(ids, ind_ids, assume_unique=True)
+        flt = ids, ann.id_selector(ids, len(self.entries))
+        with self._lock:
+            self._filters[key] = flt
+            if len(self._filters) > _FILTER_CACHE_SIZE:
+                self._filters.popitem(last=False)
+        return flt
+
+    def nbytes(self) -> int:
+        return self.emb.memory()["resident"] + self.index_bytes + self.entries.nbytes
+
+    @classmethod
+    def load(cls, root: Path, key: str, info: Dict[str, Any]) -> "Shard":
+        base = Path(root) / info["file"]
+        entries = catalog.open_catalog(base.with_suffix(".catalog"))
+        if entries is None:
+            raise FileNotFoundError(f"shard catalog missing or unreadable: {base.with_suffix('.catalog')}")
+        ids = np.load(base.with_suffix(".ids.npy"))
+        emb = quant.EmbeddingMatrix.from_file(base.with_suffix(".f32.npy"), quant.EMB_STORAGE)
+        index_path = base.with_suffix(".faiss")
+        meta = ann.read_meta(index_path) or {}
+        shard = cls(key, entries, emb, ann.read_index(index_path, meta), meta, ids)
+        shard.index_bytes = index_path.stat().st_size
+        return shard
+
+
+def write_shards(entries: catalog.Catalog, matrix: np.ndarray, root: Path, source: Dict[str, Any],
+                 index_type: str = ann.INDEX_TYPE, storage: str = quant.EMB_STORAGE) -> Dict[str, Any]:
+    """
+    Split the catalog (entries + their float32 embeddings, same order) into
+    per-industry shards plus GENERAL and write them under `root` with a
+    manifest. An entry with several industries goes into each of their shards.
+    Written to a temp dir and swapped in, so readers never see a partial set.
+    """
+    t0 = time.perf_counter()
+    root = Path(root)
+    tmp_root = root.with_name(f".{root.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    tmp_root.mkdir(parents=True)
+    idf = entries.token_idf()
+    members: Dict[str, List[int]] = defaultdict(list)
+    for i in range(len(entries)):
+        for key in shard_keys(entries.industries(i)):
+            members[key].append(i)
+
+    shards: Dict[str, Any] = {}
+    for key, idx in sorted(members.items()):
+        ids = np.array(idx, dtype="int64")
+        block = np.ascontiguousarray(matrix[ids], dtype="float32")
+        base = tmp_root / _slug(key)
+        catalog.compile_catalog((entries.raw(i) for i in idx), base.with_suffix(".catalog"), source, idf)
+        np.save(base.with_suffix(".ids.npy"), ids)
+        np.save(base.with_suffix(".f32.npy"), block)
+        index, meta = ann.make_index(block, index_type, storage)
+        ann.write_index(index, meta, base.with_suffix(".faiss"))
+        roles = defaultdict(int)
+        for i in idx:
+            roles[str(entries.role(i))] += 1
+        shards[key] = {"file": base.name, "entries": len(idx), "roles": dict(roles)}
+
+    manifest = {
+        "source": source,
+        "entries": len(entries),
+        "type": index_type,
+        "storage": storage,
+        "catalog_format": catalog.FORMAT,
+        "layout": _LAYOUT,
+        "shards": shards,
+        "build_s": round(time.perf_counter() - t0, 3),
+        "built_at": int(time.time()),
+    }
+    (tmp_root / _MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp_root, root)
+    return manifest
+
+
+def read_manifest(root: Path = SHARD_DIR) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((Path(root) / _MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def manifest_is_current(manifest: Optional[Dict[str, Any]], source: Dict[str, Any]) -> bool:
+    """Shards match the catalog file and the configured index type / storage."""
+    return bool(manifest) and manifest.get("source") == source and manifest.get("type") == ann.INDEX_TYPE \
+        and manifest.get("storage") == quant.EMB_STORAGE and manifest.get("catalog_format") == catalog.FORMAT \
+        and manifest.get("layout") == _LAYOUT
+
+
+class ShardCache:
+    """
+    Lazily loaded shards, at most `max_shards` resident (least recently used
+    evicted first). `on_load(shard)` runs once per load, before the shard is
+    visible to other threads.
+    """
+
+    def __init__(self, root: Path, manifest: Dict[str, Any], on_load: Optional[Callable[[Shard], None]] = None,
+                 max_shards: int = SHARD_CACHE_SIZE):
+        self.root = Path(root)
+        self.manifest = manifest
+        self.on_load = on_load
+        self.max_shards = max(1, max_shards)
+        self._shards: "OrderedDict[str, Shard]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self.hits = self.misses = self.evictions = 0
+        self.load_s = 0.0
+
+    def keys_for(self, industry: str) -> List[str]:
+        """
+        Shards an industry-filtered query needs: every industry value
+        containing it, plus GENERAL (searched without the industry filter).
+        """
+        industry = (industry or "").lower()
+        keys = [k for k in self.manifest["shards"] if k != GENERAL and industry and industry in k]
+        if GENERAL in self.manifest["shards"]:
+            keys.append(GENERAL)
+        return keys
+
+    def get(self, key: str) -> Shard:
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None:
+                self._shards.move_to_end(key)
+                self.hits += 1
+                return shard
+            load_lock = self._loading[key]
+        with load_lock:  # one load per shard even when several requests miss at once
+            with self._lock:
+                shard = self._shards.get(key)
+                if shard is not None:
+                    self.hits += 1
+                    return shard
+            t0 = time.perf_counter()
+            shard = Shard.load(self.root, key, self.manifest["shards"][key])
+            if self.on_load:
+                self.on_load(shard)
+            with self._lock:
+                self.misses += 1
+                self.load_s += time.perf_counter() - t0
+                self._shards[key] = shard
+                while len(self._shards) > self.max_shards:
+                    self._shards.popitem(last=False)
+                    self.evictions += 1
+        return shard
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = list(self._shards.values())
+        return {
+            "shards": len(self.manifest["shards"]),
+            "loaded": [s.key for s in loaded],
+            "resident_bytes": sum(s.nbytes() for s in loaded),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "load_s": round(self.load_s, 3),
+        }
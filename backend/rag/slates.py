@@ -0,0 +1,119 @@
+# rag/slates.py
+import gzip, json, os, re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from cache import pack, unpack
+
+# Default page slates: the role-bucketed payload for every catalog industry x
+# supported style, computed at index build time (rag/vectorstore.py) from the
+# bare "<industry> <style>" query. Many descriptions are short or generic, so
+# their slate is effectively that one; such requests get the stored payload
+# instead of nine role searches. With too few informative words they skip the
+# query embedding as well, otherwise the query has to embed close to the
+# slate's own query. Requests never build slates: missing or stale ones are
+# rebuilt by build_index / preload, and until then every request is a miss.
+SLATES_ENABLED = os.getenv("RAG_SLATES", "1") == "1"
+SLATE_STYLES = [s.strip().lower() for s in os.getenv(
+    "RAG_SLATE_STYLES", "modern,professional,creative,minimal,luxury,playful,dark,vintage").split(",") if s.strip()]
+SLATE_MIN_WORDS = int(os.getenv("RAG_SLATE_MIN_WORDS", "3"))    # fewer informative words: slate, no embedding
+SLATE_SIM = float(os.getenv("RAG_SLATE_SIM", "0.9"))            # else slate if cos(query, slate query) >= this
+
+# The request shape slates are built for: what main.py asks for on every page
+SLATE_ROLES = ["header", "hero", "value", "media", "social-proof", "conversion", "core-content", "footer", "aux"]
+SLATE_K = 10
+SLATE_NEED_IMAGES = True
+
+# Words that say nothing about which components fit
+_GENERIC = frozenset("""
+a an and are as at be by for from has have in is it its of on or our that the their this to we with you your
+all any best more most new one very will can get just also into who what which where when how
+website site web page pages online business company companies brand service services solution solutions
+small local professional quality great good high top leading trusted offer offering offers provide providing
+provides help helping helps customer customers client clients people team
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def slates_path(index_path: Path) -> Path:
+    return index_path.with_suffix(".slates.json.gz")
+
+
+def slate_key(industry: str, style: str) -> str:
+    return f"{(industry or '').strip().lower()}|{(style or '').strip().lower()}"
+
+
+def has_slate_shape(roles: List[str], k: int, need_images: bool) -> bool:
+    """Slates only stand in for requests of the shape they were built for."""
+    return list(roles) == SLATE_ROLES and k == SLATE_K and bool(need_images) == SLATE_NEED_IMAGES
+
+
+def informative_words(q_terms: List[str], industry: str, style: str) -> List[str]:
+    """Words of the query beyond industry/style that could change the slate."""
+    base = set(_TOKEN_RE.findall(f"{industry} {style}".lower()))
+    out = []
+    for t in q_terms:
+        for w in _TOKEN_RE.findall((t or "").lower()):
+            if len(w) > 2 and w not in _GENERIC and w not in base and not w.isdigit():
+                out.append(w)
+    return out
+
+
+class Slates:
+    """Loaded slates: one base-query vector and one packed payload per (industry, style)."""
+
+    def __init__(self, meta: Dict[str, Any], keys: List[str], vecs: np.ndarray, blobs: List[bytes]):
+        self.meta = meta
+        self.vecs = vecs
+        self._pos = {k: i for i, k in enumerate(keys)}
+        self._blobs = blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def find(self, industry: str, style: str) -> Optional[int]:
+        return self._pos.get(slate_key(industry, style))
+
+    def similarity(self, i: int, q_vec: np.ndarray) -> float:
+        return float(np.dot(self.vecs[i], q_vec))
+
+    def payload(self, i: int) -> dict:
+        """A fresh copy of slate `i` (callers may mutate it)."""
+        return unpack(self._blobs[i])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"slates": len(self), "bytes": self.vecs.nbytes + sum(len(b) for b in self._blobs),
+                "built_at": self.meta.get("built_at"), "build_s": self.meta.get("build_s")}
+
+
+def write_slates(path: Path, meta: Dict[str, Any], items: Dict[str, Tuple[np.ndarray, dict]]) -> None:
+    """Persist {key: (base query vector, payload)} atomically as gzip'ed JSON."""
+    doc = {"meta": meta,
+           "slates": {key: {"vec": [round(float(x), 7) for x in vec], "payload": payload}
+                      for key, (vec, payload) in items.items()}}
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+    os.replace(tmp, path)
+
+
+def read_slates(path: Path) -> Optional[Slates]:
+    if not path.exists():
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        return None
+    keys = list(doc.get("slates", {}))
+    if not keys:
+        return Slates(doc.get("meta") or {}, [], np.zeros((0, 0), dtype="float32"), [])
+    vecs = np.asarray([doc["slates"][k]["vec"] for k in keys], dtype="float32")
+    return Slates(doc.get("meta") or {}, keys, vecs, [pack(doc["slates"][k]["payload"]) for k in keys])
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
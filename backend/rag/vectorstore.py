@@ -1,15 +1,17 @@
 # backend/rag/vectorstore.py
-import json, re, math
+import json, re, threading, time
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
-from collections import Counter, defaultdict
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import os, random
-from functools import lru_cache
 import hashlib
 import requests
+from logutil import get_logger, kv, dump, lazy_json
+from metrics import span, inc, register_gauge
+from cache import get_cache, CACHE_TTL_EMBEDDING_S, CACHE_TTL_RETRIEVAL_S
+from rag import ann, catalog, embedder, quant, shards, slates
+
+log = get_logger("rag")
 
 
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
@@ -27,7 +29,8 @@ def _generate_unsplash_image_url_enhanced(
         keywords: List[str],
         width: int = 1600,
         height: int = 1200,
-        use_api: bool = False
+        use_api: bool = False,
+        seed: Optional[int] = None
 ) -> str:
     """
     Generate Unsplash image URL with optional API support for better results
@@ -36,7 +39,8 @@ def _generate_unsplash_image_url_enhanced(
         return f"https://picsum.photos/{width}/{height}"
 
     query = ",".join(keywords[:3])
-    seed = random.randint(1, 1000)
+    if seed is None:
+        seed = random.randint(1, 1000)
 
     if use_api and UNSPLASH_ACCESS_KEY:
         # Use official API for better results
@@ -77,31 +81,48 @@ def _generate_picsum_image_url(
         return f"{base_url}?grayscale"
     return base_url
 
+# Seeds, tie-break jitter and cache keys come from a keyed blake2b, never from
+# hash(): that is salted per process (PYTHONHASHSEED), so the same request would
+# rank differently in each worker and after every restart.
+_HASH_KEY = os.getenv("RAG_HASH_KEY", "webgenai-rag").encode("utf-8")[:64]
+
+def _stable_hash(*parts) -> int:
+    """64-bit keyed hash of the parts, identical in every process."""
+    raw = "||".join(str(p) for p in parts)
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8, key=_HASH_KEY).digest(), "big")
+
 def _sig(*parts) -> str:
     raw = "||".join(str(p) for p in parts)
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16, key=_HASH_KEY).hexdigest()
 
-# Where your JSONL lives
-DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "components.jsonl"
-INDEX_PATH = Path(__file__).resolve().parent / "index.faiss"
+# Where your JSONL lives, and the index built from it (overridable, e.g. for bench catalogs)
+DATA_PATH = Path(os.getenv("RAG_DATA_PATH", Path(__file__).resolve().parent.parent / "data" / "components.jsonl"))
+INDEX_PATH = Path(os.getenv("RAG_INDEX_PATH", Path(__file__).resolve().parent / "index.faiss"))
 
-# Embedder
-MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+# Embedder (RAG_EMBED_BACKEND=torch|onnx, see rag/embedder.py). Index builds call
+# MODEL directly; request-time queries go through the micro-batching wrapper.
+MODEL = embedder.load_embedder()
+_QUERY_MODEL = embedder.BatchingEmbedder(MODEL) if embedder.MICROBATCH else MODEL
+# Query embeddings and role payloads, shared across workers when CACHE_BACKEND is set (cache.py)
+_EMBED_CACHE = get_cache("embedding", CACHE_TTL_EMBEDDING_S)
+_PAYLOAD_CACHE = get_cache("retrieval", CACHE_TTL_RETRIEVAL_S)
 
 # ---- Globals ----
-_ENTRIES: List[Dict[str, Any]] | None = None          # [{"raw": <obj>, "blob": <str>}...]
-_EMB_MATRIX: np.ndarray | None = None                 # (N, dim) normalized embeddings
-_INDEX = None                                         # FAISS IP index over _EMB_MATRIX
+_ENTRIES: catalog.Catalog | None = None               # compiled catalog, mmapped (rag/catalog.py)
+_EMB: quant.EmbeddingMatrix | None = None            # (N, dim) normalized embeddings, RAG_EMB_STORAGE
+_INDEX = None                                         # FAISS IP index over the same vectors
+_INDEX_META: Dict[str, Any] = {}                      # what _INDEX is (see rag/ann.py), from the sidecar
 _DIM: int | None = None
+_CATALOG: shards.Shard | None = None                  # search view over the globals above (+ lexical stats)
+_SHARDS: shards.ShardCache | None = None              # RAG_SHARDS=1: per-industry views, loaded lazily
+_SLATES: slates.Slates | None = None                  # default payload per industry x style (rag/slates.py)
+_ENSURE_LOCK = threading.Lock()
+_SLATES_LOCK = threading.Lock()
+_SLATES_MISSING = False                               # request path found none: live retrieval until a build
 
 # Page role taxonomy (used by role-aware retrieval)
 _PAGE_ROLES = ["header","hero","value","social-proof","media","conversion","core-content","footer"]
 
-# ---- Lexical (tiny BM25-ish) caches ----
-_LEX_READY = False
-_DF = defaultdict(int)       # token -> doc freq
-_IDF: Dict[str, float] = {}  # token -> idf
-_DOC_TOKS: List[set] = []    # per-entry token sets, same order as _ENTRIES
 
 # =========================
 # Loading & Index building
@@ -109,7 +130,7 @@ _DOC_TOKS: List[set] = []    # per-entry token sets, same order as _ENTRIES
 def _seed_from_payload(industry: str, style: str, description: str = "") -> int:
     # deterministic seed per combo; tweak if you want
     base = f"{industry}|{style}|{(description or '')[:64]}".lower()
-    return abs(hash(base)) % (2**31)
+    return _stable_hash(base) % (2**31)
 
 def _shuffle_deterministic(items, seed: int):
     rng = random.Random(seed)
@@ -158,11 +179,6 @@ def _mock_bucketed(entries, industry: str, seed: int, k_per_role: int = 4):
         "schema_defaults": schema_defaults,
         "debug": {"mock": True}
     }
-@lru_cache(maxsize=256)
-def _cached_retrieve_key(industry: str, style: str, qsig: str) -> dict:
-    # This wrapper allows caching deterministic results for repeated queries
-    # (You’ll pass a small signature "qsig" so different descriptions don’t collapse too much)
-    return {}
 
 def _entry_text_blob(e: Dict[str, Any]) -> str:
     """
@@ -181,8 +197,23 @@ def _entry_text_blob(e: Dict[str, Any]) -> str:
         ]
     return " | ".join([p for p in parts if p.strip()])
 
-def _load_entries() -> List[Dict[str, Any]]:
-    entries: List[Dict[str, Any]] = []
+def _entry_blob(obj: Dict[str, Any]) -> str:
+    """Text embedded for one catalog entry."""
+    blob = _entry_text_blob(obj) if obj else ""
+    if not blob:
+        tags = obj.get("tags", [])
+        notes = obj.get("description") or obj.get("notes") or ""
+        props_schema = obj.get("propsSchema", {})
+        blob = (
+            f"type: {obj.get('type','')}\n"
+            f"tags: {', '.join(tags)}\n"
+            f"notes: {notes}\n"
+            f"propsSchema: {json.dumps(props_schema, ensure_ascii=False)}"
+        )
+    return blob
+
+def _load_rows() -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
     if not DATA_PATH.exists():
         raise FileNotFoundError(f"components.jsonl not found at {DATA_PATH}")
     with open(DATA_PATH, "r", encoding="utf-8") as f:
@@ -191,55 +222,114 @@ def _load_entries() -> List[Dict[str, Any]]:
             if not line:
                 continue
             try:
-                obj = json.loads(line)
+                rows.append(json.loads(line))
             except json.JSONDecodeError:
                 continue
-            blob = _entry_text_blob(obj) if obj else ""
-            if not blob:
-                tags = obj.get("tags", [])
-                notes = obj.get("description") or obj.get("notes") or ""
-                props_schema = obj.get("propsSchema", {})
-                blob = (
-                    f"type: {obj.get('type','')}\n"
-                    f"tags: {', '.join(tags)}\n"
-                    f"notes: {notes}\n"
-                    f"propsSchema: {json.dumps(props_schema, ensure_ascii=False)}"
-                )
-            entries.append({"raw": obj, "blob": blob})
-    return entries
-
-
-def _build_index(entries: List[Dict[str, Any]]):
-    global _EMB_MATRIX, _INDEX, _DIM
-    texts = [e["blob"] for e in entries]
-    embs = MODEL.encode(texts, normalize_embeddings=True)
-    _EMB_MATRIX = np.array(embs, dtype="float32")
-    _DIM = _EMB_MATRIX.shape[1]
-    index = faiss.IndexFlatIP(_DIM)
-    index.add(_EMB_MATRIX)
-    faiss.write_index(index, str(INDEX_PATH))
-    _INDEX = index
-
-    # build lexical stats in same order as entries
-    _build_lex_stats(entries)
+    return rows
+
+def _compile_catalog(rows: List[Dict[str, Any]]) -> catalog.Catalog:
+    path = catalog.compile_catalog(rows, catalog.catalog_path(INDEX_PATH), _source_sig())
+    log.info("catalog compiled", extra=kv(entries=len(rows), bytes=path.stat().st_size, path=str(path)))
+    return catalog.open_catalog(path)
+
+def _open_catalog() -> catalog.Catalog:
+    """The compiled catalog next to the index, compiled from DATA_PATH first if missing or stale."""
+    cat = catalog.open_catalog(catalog.catalog_path(INDEX_PATH))
+    if cat is None or cat.source != _source_sig():
+        cat = _compile_catalog(_load_rows())
+    return cat
+
+def _catalog_texts() -> List[str]:
+    return [_entry_blob(raw) for raw in _ENTRIES.rows()]
+
+
+def _set_embeddings(embs) -> np.ndarray:
+    # written next to the index and used memory-mapped (shared by all workers)
+    global _EMB, _DIM
+    matrix = np.array(embs, dtype="float32")
+    _EMB = quant.EmbeddingMatrix(matrix, quant.EMB_STORAGE, quant.exact_path(INDEX_PATH))
+    _DIM = matrix.shape[1]
+    return matrix
+
+def _load_embeddings(index) -> bool:
+    """Map the embeddings saved with `index`; False when missing or not the same shape."""
+    global _EMB, _DIM
+    path = quant.exact_path(INDEX_PATH)
+    try:
+        if np.load(path, mmap_mode="r").shape != (index.ntotal, index.d):
+            return False
+    except (OSError, ValueError):
+        return False
+    _EMB = quant.EmbeddingMatrix.from_file(path, quant.EMB_STORAGE)
+    _DIM = _EMB.shape[1]
+    return True
+
+def _build_index(texts: List[str]):
+    global _INDEX, _INDEX_META
+    matrix = _set_embeddings(MODEL.encode(texts, normalize_embeddings=True))
+    index, meta = ann.make_index(matrix, ann.INDEX_TYPE, quant.EMB_STORAGE)
+    ann.write_index(index, meta, INDEX_PATH)
+    if ann.INDEX_MMAP:
+        index = ann.read_index(INDEX_PATH, meta)  # the mapped copy, like every later start
+    _INDEX, _INDEX_META = index, meta
+    log.info("index built", extra=kv(**{k: v for k, v in meta.items() if k != "params"}, **meta["params"]))
+
+    # search view in the same order as the catalog
+    _set_catalog(_ENTRIES)
     return index
 
+def _set_catalog(entries: catalog.Catalog) -> None:
+    global _CATALOG
+    _CATALOG = shards.Shard(shards.FULL, entries, _EMB, _INDEX, _INDEX_META)
+
+def _index_is_current(meta: Optional[dict]) -> bool:
+    """The on-disk index matches the configured type and the catalog size."""
+    if not meta or meta.get("type") != ann.INDEX_TYPE:
+        return False
+    if meta.get("storage", "float32") != quant.EMB_STORAGE:
+        return False
+    return meta.get("entries") in (None, len(_ENTRIES or []))
+
 def _ensure():
-    global _ENTRIES, _INDEX, _EMB_MATRIX, _DIM
+    if _CATALOG is not None:
+        return
+    with _ENSURE_LOCK:  # request threads may all arrive before the first load finishes
+        if _CATALOG is None:
+            _load()
+
+def _load():
+    global _ENTRIES, _INDEX, _INDEX_META
     if _ENTRIES is None:
-        _ENTRIES = _load_entries()
+        _ENTRIES = _open_catalog()
     if _INDEX is None:
-        if INDEX_PATH.exists():
-            _INDEX = faiss.read_index(str(INDEX_PATH))
-            # Also rebuild _EMB_MATRIX in-memory so we can role-filter w/out FAISS requery
-            texts = [e["blob"] for e in _ENTRIES]
-            embs = MODEL.encode(texts, normalize_embeddings=True)
-            _EMB_MATRIX = np.array(embs, dtype="float32")
-            _DIM = _EMB_MATRIX.shape[1]
-            # rebuild lexical stats
-            _build_lex_stats(_ENTRIES)
-        else:
-            _INDEX = _build_index(_ENTRIES)
+        meta = ann.read_meta(INDEX_PATH)
+        if INDEX_PATH.exists() and _index_is_current(meta):
+            _INDEX, _INDEX_META = ann.read_index(INDEX_PATH, meta), meta
+        if _INDEX is not None and _INDEX.ntotal != len(_ENTRIES):
+            _INDEX = None  # stale (catalog changed since it was written)
+    if _INDEX is not None:
+        # embeddings saved with the index; re-encode the catalog only if they are missing
+        if not _load_embeddings(_INDEX):
+            _set_embeddings(MODEL.encode(_catalog_texts(), normalize_embeddings=True))
+        _set_catalog(_ENTRIES)
+    else:
+        _INDEX = _build_index(_catalog_texts())
+
+def preload() -> Dict[str, Any]:
+    """
+    Load everything retrieval needs (catalog, embeddings, index, lexical
+    stats, default slates; the shard manifest with RAG_SHARDS=1) in this process. Run in the
+    gunicorn master before workers fork (see gunicorn.conf.py): the arrays are
+    file-backed mmaps and the rest is inherited copy-on-write, so workers
+    start ready and share one copy.
+    """
+    t0 = time.perf_counter()
+    _ensure()
+    if shards.SHARDS_ENABLED:
+        _ensure_shards()
+    _ensure_slates(build=True)
+    return {"entries": len(_ENTRIES or []), "load_s": round(time.perf_counter() - t0, 3),
+            "memory": embedding_memory()}
 
 # =========================
 # Helpers
@@ -311,6 +401,169 @@ def _gather_image_keywords(components: list[dict]) -> list[str]:
     return out[:24]  # cap a bit
 
 
+def _encode_queries(queries: List[str]) -> np.ndarray:
+    """
+    Embed one or more query strings in a single batched encode call (shared
+    with concurrent callers when micro-batching is on).
+    Returns (len(queries), dim) float32, L2-normalized.
+    """
+    queries = list(queries)
+    if not _EMBED_CACHE.enabled:
+        with span("embedding"):
+            return _QUERY_MODEL.encode(queries, normalize_embeddings=True).astype("float32")
+    keys = [_EMBED_CACHE.key(MODEL.backend, MODEL.name, getattr(MODEL, "quant", None), q) for q in queries]
+    with span("embedding_cache"):
+        vecs = [_EMBED_CACHE.get(k) for k in keys]
+    todo = [i for i, v in enumerate(vecs) if v is None]
+    if todo:
+        with span("embedding"):
+            Q = _QUERY_MODEL.encode([queries[i] for i in todo], normalize_embeddings=True).astype("float32")
+        for row, i in enumerate(todo):
+            vecs[i] = Q[row]
+            _EMBED_CACHE.set(keys[i], Q[row])
+    return np.stack(vecs).astype("float32", copy=False)
+
+def _use_ann() -> bool:
+    return _INDEX_META.get("effective_type", "flat") != "flat"
+
+def _source_sig() -> Dict[str, Any]:
+    st = DATA_PATH.stat()
+    return {"path": str(DATA_PATH), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _ensure_shards() -> shards.ShardCache:
+    """
+    Open the shard manifest (building the shards from the full catalog once
+    if they are missing or stale). Shards themselves load on first use.
+    """
+    global _SHARDS
+    if _SHARDS is None:
+        manifest = shards.read_manifest(shards.SHARD_DIR)
+        if not shards.manifest_is_current(manifest, _source_sig()):
+            manifest = _write_shards()
+        _SHARDS = shards.ShardCache(shards.SHARD_DIR, manifest)
+    return _SHARDS
+
+def _write_shards() -> Dict[str, Any]:
+    _ensure()
+    manifest = shards.write_shards(_ENTRIES, _EMB.exact_rows(np.arange(len(_ENTRIES))), shards.SHARD_DIR,
+                                   _source_sig(), ann.INDEX_TYPE, quant.EMB_STORAGE)
+    log.info("shards built", extra=kv(shards=len(manifest["shards"]), entries=manifest["entries"],
+                                      build_s=manifest["build_s"], dir=str(shards.SHARD_DIR)))
+    return manifest
+
+def _slate_meta() -> Dict[str, Any]:
+    """What the slates depend on; a stored set with different values is rebuilt."""
+    return {"source": _source_sig(), "type": ann.INDEX_TYPE, "storage": quant.EMB_STORAGE,
+            "sharded": shards.SHARDS_ENABLED, "model": MODEL.name, "styles": slates.SLATE_STYLES,
+            "shape": {"roles": slates.SLATE_ROLES, "k": slates.SLATE_K, "need_images": slates.SLATE_NEED_IMAGES}}
+
+def _ensure_slates(build: bool = False) -> Optional[slates.Slates]:
+    """
+    The default slates (RAG_SLATES=1), read from next to the index. Missing
+    or stale slates are rebuilt only with `build` (build_index / preload);
+    on the request path they are a miss, logged once, until the next build.
+    """
+    global _SLATES, _SLATES_MISSING
+    if not slates.SLATES_ENABLED:
+        return None
+    if _SLATES is None and (build or not _SLATES_MISSING):
+        with _SLATES_LOCK:
+            if _SLATES is None and (build or not _SLATES_MISSING):
+                loaded = slates.read_slates(slates.slates_path(INDEX_PATH))
+                want = _slate_meta()
+                if loaded is not None and any(loaded.meta.get(k) != v for k, v in want.items()):
+                    loaded = None
+                if loaded is None and build:
+                    loaded = _write_slates()
+                elif loaded is None:
+                    log.warning("slates missing or stale; serving live retrieval until the next index build",
+                                extra=kv(path=str(slates.slates_path(INDEX_PATH))))
+                _SLATES, _SLATES_MISSING = loaded, loaded is None
+    return _SLATES
+
+def _write_slates() -> slates.Slates:
+    """Bucketed retrieval for every catalog industry x slate style, persisted with its query vector."""
+    t0 = time.perf_counter()
+    _ensure()
+    pairs = [(ind, style) for ind in _industries_present() for style in slates.SLATE_STYLES]
+    items: Dict[str, Tuple[np.ndarray, dict]] = {}
+    if pairs:
+        Q = _encode_queries([_query_of([ind, style]) for ind, style in pairs])
+        for (ind, style), q_vec in zip(pairs, Q):
+            items[slates.slate_key(ind, style)] = (q_vec, retrieve_bucketed_context(
+                q_terms=[ind, style], industry=ind, need_images=slates.SLATE_NEED_IMAGES,
+                k_per_role=max(slates.SLATE_K, 2), role_hints=slates.SLATE_ROLES, q_vec=q_vec))
+    meta = {**_slate_meta(), "built_at": time.time(), "build_s": round(time.perf_counter() - t0, 3)}
+    path = slates.slates_path(INDEX_PATH)
+    slates.write_slates(path, meta, items)
+    log.info("slates built", extra=kv(slates=len(items), build_s=meta["build_s"], path=str(path)))
+    return slates.read_slates(path)
+
+def _slate_for(q_terms: List[str], industry: str, style: str, need_images: bool, roles: List[str], k: int,
+               q_vec: Optional[np.ndarray] = None, encode: bool = True) -> Tuple[Optional[dict], Optional[np.ndarray]]:
+    """
+    The precomputed slate for (industry, style) when the rest of the query
+    adds little to it: fewer than RAG_SLATE_MIN_WORDS informative words, or a
+    query embedding within RAG_SLATE_SIM of the slate's own query. Returns
+    (payload or None, q_vec) so a miss can reuse the embedding. Without
+    `encode`, a request that needs the embedding check is a miss.
+    """
+    if not (slates.SLATES_ENABLED and industry and style and slates.has_slate_shape(roles, k, need_images)):
+        return None, q_vec
+    sl = _ensure_slates()
+    i = sl.find(industry, style) if sl is not None else None
+    if i is None:
+        return None, q_vec
+    words = slates.informative_words(q_terms, industry, style)
+    sim = None
+    if len(words) >= slates.SLATE_MIN_WORDS:
+        if q_vec is None:
+            if not encode:
+                return None, None
+            q_vec = _encode_queries([_query_of(q_terms)])[0]
+        sim = round(sl.similarity(i, q_vec), 4)
+        if sim < slates.SLATE_SIM:
+            inc("webgenai_rag_slates_total", outcome="skipped")
+            return None, q_vec
+    inc("webgenai_rag_slates_total", outcome="served")
+    payload = sl.payload(i)
+    payload["debug"].update(query_terms=[t for t in q_terms if t], slate=slates.slate_key(industry, style),
+                            slate_sim=sim, slate_words=len(words))
+    return payload, q_vec
+
+def _industries_present() -> List[str]:
+    return sorted({t.lower() for t in (_ENTRIES.industry_names if _ENTRIES is not None else [])})
+
+def _views_for(industry: Optional[str]) -> List[shards.Shard]:
+    """
+    Search views for a query: the full catalog, or with RAG_SHARDS=1 and an
+    industry, just that industry's shards plus the general one.
+    """
+    if shards.SHARDS_ENABLED and industry:
+        cache = _ensure_shards()
+        return [cache.get(key) for key in cache.keys_for(industry)]
+    _ensure()
+    return [_CATALOG]
+
+def _ann_pools(Q: np.ndarray, n: int = ann.ANN_POOL) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Top-`n` candidates per query row from the ANN index, re-scored exactly
+    against the float32 embeddings (PQ/SQ distances are approximate). Returns
+    [(entry_indices, sims)] per row, best first.
+    """
+    with span("ann_search"):
+        _, I = _INDEX.search(np.ascontiguousarray(Q, dtype="float32"), min(n, len(_ENTRIES)))
+    pools = []
+    for row in range(Q.shape[0]):
+        idx = I[row][I[row] >= 0]
+        sims = _EMB.exact_scores(Q[row], idx)
+        order = np.argsort(-sims)
+        pools.append((idx[order], sims[order]))
+    return pools
+
+def _query_of(q_terms: List[str]) -> str:
+    return " ".join([t for t in q_terms if t]).strip()
+
 def _cosine_dot_normed(query_vec: np.ndarray, entry_vecs: np.ndarray) -> np.ndarray:
     """
     All vectors are already L2-normalized → cosine = dot.
@@ -345,76 +598,74 @@ def _mmr_select(candidates, topn: int = 3, lambda_: float = 0.7):
 # ---- Lexical scoring (tiny BM25-ish) ----
 
 def _tok(s: str) -> List[str]:
-    return re.findall(r"[a-z0-9]+", (s or "").lower())
-
-def _entry_text_for_lex(raw: Dict[str, Any]) -> str:
-    return " ".join([
-        str(raw.get("type","")),
-        " ".join(raw.get("tags") or []),
-        str(raw.get("description","") or raw.get("notes","")),
-        json.dumps(raw.get("propsSchema", {}), ensure_ascii=False),
-    ]).lower()
-
-def _build_lex_stats(entries: List[Dict[str, Any]]) -> None:
-    global _LEX_READY, _DF, _IDF, _DOC_TOKS
-    _DF.clear()
-    _DOC_TOKS = []
-    for ent in entries:
-        raw = ent["raw"]
-        toks = set(_tok(_entry_text_for_lex(raw)))
-        _DOC_TOKS.append(toks)
-        for t in toks:
-            _DF[t] += 1
-    N = max(1, len(entries))
-    _IDF = {t: math.log((N - df + 0.5) / (df + 0.5) + 1.0) for t, df in _DF.items()}
-    _LEX_READY = True
-
-def _lexical_score(query: str, doc_idx: int) -> float:
-    if not _LEX_READY or doc_idx < 0 or doc_idx >= len(_DOC_TOKS):
-        return 0.0
-    q_toks = _tok(query)
-    if not q_toks:
-        return 0.0
-    d_toks = _DOC_TOKS[doc_idx]
-    num = sum(_IDF.get(t, 0.0) for t in set(q_toks) if t in d_toks)
-    den = 1.0 + math.log(1.0 + len(d_toks))
-    raw = num / den
-    return min(raw, 0.2)  # cap the influence
-
-def _hybrid_score(
+    return catalog.tokenize(s)
+
+def _filtered_search(
+        view: shards.Shard,
+        q_vec: np.ndarray,
+        flt: Optional[Tuple[np.ndarray, Any]],
+        k: int,
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """
+    Candidates passing `flt` (see Shard.filter_ids) straight from the view's
+    index, best first: every match for the flat index, the top ANN_POOL for
+    ANN modes (re-scored exactly). Returns (entry_indices, sims, approx) where
+    approx means the sims are scalar-quantizer distances.
+    """
+    ids, sel = flt if flt is not None else (None, None)
+    total = len(view) if ids is None else len(ids)
+    n = min(ann.ANN_POOL, total) if view.use_ann else total
+    with span("filtered_search"):
+        D, I = view.index.search(np.ascontiguousarray(q_vec[None, :], dtype="float32"), n,
+                                 params=ann.search_params(view.meta.get("effective_type", "flat"), sel))
+    found = I[0] >= 0
+    idx, sims = I[0][found], D[0][found]
+    if not view.use_ann:
+        return idx, sims, view.emb.compressed
+    if len(idx) < min(k, total):
+        # graph/IVF search can come back short under a selective filter
+        idx = ids if ids is not None else np.arange(total)
+    sims = view.emb.exact_scores(q_vec, idx)
+    order = np.argsort(-sims)[:n]
+    return idx[order], sims[order], False
+
+def _lexical_scores(query: str, ids: np.ndarray, view: Optional[shards.Shard] = None) -> np.ndarray:
+    """Lexical bonus (0..0.2) per entry of `ids`; token sets and idf are compiled into the catalog."""
+    view = view or _CATALOG
+    return view.entries.lexical_scores(_tok(query), ids)
+
+def _hybrid_scores(
         *,
-        sim: float,
-        item: Dict[str, Any],
-        idx: int,
+        sims: np.ndarray,
+        ids: np.ndarray,
         query: str,
         industry: str,
         need_images: bool,
         role_hint: Optional[str] = None,
-) -> float:
-    raw = item["raw"]
-    tags = [t.lower() for t in (raw.get("tags") or [])]
-    inds = [str(i).lower() for i in (raw.get("industry") or [])]
+        view: Optional[shards.Shard] = None,
+) -> np.ndarray:
+    """Hybrid score per candidate `ids` of `view` with vector similarities `sims`."""
+    view = view or _CATALOG
+    cat = view.entries
+    ids = np.asarray(ids, dtype="int64")
     industry_l = (industry or "").lower().strip()
 
-    tag_boost = 0.2 if (industry_l and (industry_l in tags or industry_l in inds)) else 0.0
+    tag_boost = 0.0
+    if industry_l:
+        hit = cat.has_any("tag", cat.codes_of("tag", industry_l), ids) | \
+              cat.has_any("ind", cat.codes_of("ind", industry_l), ids)
+        tag_boost = np.where(hit, 0.2, 0.0)
 
-    # simple image-fit: if caller needs images and schema has image-ish keys
-    ps = raw.get("propsSchema", {}) or {}
-    image_fit = 0.0
-    for k in ps.keys():
-        lk = k.lower()
-        if "image" in lk or lk in {"src","avatar","logo","background","photo","icon"}:
-            image_fit = 0.1
-            break
+    # simple image-fit: schema has image-ish keys (flag compiled into the catalog)
+    image_fit = np.where(cat.flags[ids] & catalog.FLAG_IMAGE_FIT, 0.1, 0.0)
 
     role_fit = 0.0
-    pr = (raw.get("pageRole") or "").lower()
-    if role_hint and pr == role_hint.lower():
-        role_fit = 0.2
+    if role_hint:
+        role_fit = np.where(cat.has_role(cat.codes_of("role", role_hint.lower()), ids), 0.2, 0.0)
 
-    lex = _lexical_score(query, idx)  # 0..~0.2
+    lex = _lexical_scores(query, ids, view)  # 0..~0.2
 
-    return float(sim) + tag_boost + image_fit + role_fit + lex
+    return np.asarray(sims, dtype="float64") + tag_boost + image_fit + role_fit + lex
 
 # =========================
 # Legacy public API (now hybrid re-ranked)
@@ -450,7 +701,8 @@ def _generate_contextual_image_url(
         keywords: List[str] = None,
         width: int = 1600,
         height: int = 1200,
-        prefer_unsplash: bool = True
+        prefer_unsplash: bool = True,
+        seed: Optional[int] = None
 ) -> str:
     """
     Generate highly contextual image URLs with enhanced fallback logic
@@ -674,12 +926,13 @@ def _generate_contextual_image_url(
 
     if prefer_unsplash and final_keywords:
         return _generate_unsplash_image_url_enhanced(
-            final_keywords, width, height, use_api=bool(UNSPLASH_ACCESS_KEY)
+            final_keywords, width, height, use_api=bool(UNSPLASH_ACCESS_KEY), seed=seed
         )
     else:
         # Fallback to Picsum
         return _generate_picsum_image_url(width, height)
-def _generate_unsplash_image_url(keywords: List[str], width: int = 1600, height: int = 1200) -> str:
+def _generate_unsplash_image_url(keywords: List[str], width: int = 1600, height: int = 1200,
+                                 seed: Optional[int] = None) -> str:
     """
     Generate a dynamic Unsplash image URL based on keywords
     """
@@ -690,7 +943,7 @@ def _generate_unsplash_image_url(keywords: List[str], width: int = 1600, height:
     query = "+".join([k.replace(" ", "+") for k in keywords[:3]])
 
     # Add some randomness to get different images
-    random_seed = random.randint(1, 1000)
+    random_seed = random.randint(1, 1000) if seed is None else seed
 
     # Use Unsplash source URL
     return f"https://source.unsplash.com/featured/{width}x{height}/?{query}&sig={random_seed}"
@@ -717,12 +970,15 @@ def _replace_static_images_with_dynamic_inplace(component: Dict[str, Any], indus
                 )
 
                 if isinstance(value, str) and is_image_field and value.startswith(("http://", "https://")):
-                    # Generate contextual image based on component type and industry
+                    # Generate contextual image based on component type and industry; the
+                    # sig varies per field (different images) but not per process
+                    field = f"{current_path}.{key}" if current_path else key
                     contextual_image = _generate_contextual_image_url(
                         component_type=component_type,
                         industry=industry,
                         content_context=component,
-                        keywords=image_keywords
+                        keywords=image_keywords,
+                        seed=_stable_hash(component_type, industry, field) % 1000 + 1
                     )
                     obj[key] = contextual_image
                 elif isinstance(value, (dict, list)):
@@ -741,9 +997,16 @@ def retrieve_bucketed_context(
         need_images: bool = True,
         k_per_role: int = 20,
         role_hints: Optional[List[str]] = None,
+        q_vec: Optional[np.ndarray] = None,
+        sims: Optional[np.ndarray] = None,
+        pool: Optional[Tuple[np.ndarray, np.ndarray]] = None,
 ) -> dict:
     """
     Role-bucketed retrieval with hybrid scoring + MMR diversity.
+    The query is embedded once and scored against the whole catalog once
+    (or, with an ANN index, searched once for a shared candidate pool);
+    pass `q_vec` / `sims` (row of catalog similarities) / `pool` to reuse
+    work that was already done in a batch.
     Returns a DICT:
     {
       "templates": [ ...trimmed entries in a good order... ],
@@ -754,33 +1017,48 @@ def retrieve_bucketed_context(
       "debug": {...}
     }
     """
-    _ensure()
-
     # --- Mock mode (no embeddings required) ---
     if os.getenv("RAG_MOCK") == "1":
+        _ensure()
         seed = _seed_from_payload(industry or "", (q_terms[1] if len(q_terms) > 1 else ""))
-        return _mock_bucketed([e["raw"] for e in (_ENTRIES or [])], industry or "", seed, k_per_role)
+        return _mock_bucketed(list(_ENTRIES.rows()), industry or "", seed, k_per_role)
 
     roles = role_hints or ORDER_ROLES
+    sharded = _views_for(industry)[0] is not _CATALOG
+
+    query = _query_of(q_terms)
+    if query and q_vec is None:
+        q_vec = _encode_queries([query])[0]
+    if query and sharded:
+        pass  # every role searches the industry's shards (filtered search)
+    elif query and _use_ann():
+        if pool is None:
+            pool = _ann_pools(q_vec[None, :])[0]
+    elif query and sims is None:
+        sims = _EMB.scores(q_vec)
 
     selected_per_role: Dict[str, List[Dict[str, Any]]] = {}
     all_selected: List[Dict[str, Any]] = []
 
     for role in roles:
-        # Wider pool per role; MMR happens in search_entries_composite
-        cands = search_entries_composite(
-            q_terms=q_terms,
-            role=role,
-            industry=industry,
-            need_images=need_images,
-            k=k_per_role,
-            extra_boost_tags=[industry] if industry else None,
-            use_mmr=True,
-        )
+        # Wider pool per role; MMR happens in _composite_picks
+        with span("role_retrieval"):
+            cands = _composite_picks(
+                q_terms=q_terms,
+                role=role,
+                industry=industry,
+                need_images=need_images,
+                k=k_per_role,
+                extra_boost_tags=[industry] if industry else None,
+                use_mmr=True,
+                q_vec=q_vec,
+                sims=sims,
+                pool=pool,
+            )
 
-        # Pick fewer for singleton roles
+        # Pick fewer for singleton roles; only those are decoded from the catalog
         topn = 1 if role in ("header", "hero", "footer") else 2
-        picked = cands[:topn]
+        picked = [_pick_entry(c, need_images) for c in cands[:topn]]
 
         # Ensure pageRole set on raw objects
         for p in picked:
@@ -803,12 +1081,13 @@ def retrieve_bucketed_context(
 
     # Now apply image replacement to all selected components
     if need_images and image_keywords:
-        for role in roles:
-            for component in selected_per_role.get(role, []):
-                _replace_static_images_with_dynamic_inplace(component, industry, image_keywords)
+        with span("image_resolution"):
+            for role in roles:
+                for component in selected_per_role.get(role, []):
+                    _replace_static_images_with_dynamic_inplace(component, industry, image_keywords)
 
-        for component in all_selected:
-            _replace_static_images_with_dynamic_inplace(component, industry, image_keywords)
+            for component in all_selected:
+                _replace_static_images_with_dynamic_inplace(component, industry, image_keywords)
 
     # Final ordered slate (trim view + carry score/role)
     ordered_templates: List[Dict[str, Any]] = []
@@ -840,6 +1119,11 @@ def retrieve_bucketed_context(
                 defaults.setdefault(key, None)
             schema_defaults[t] = defaults
 
+    log.debug("bucketed retrieval", extra=kv(
+        industry=industry, roles=len(roles), selected=len(ordered_templates), image_keywords=len(image_keywords),
+    ))
+    dump(log, "bucketed roles", roles=lazy_json({r: [t.get("type") for t in selected_per_role.get(r, [])] for r in roles}))
+
     # Copy notes: short hints the model should consider
     copy_notes = []
     if industry:
@@ -868,26 +1152,39 @@ def retrieve_by_roles_payload(
         need_images: bool = True,
         role_hints: Optional[List[str]] = None,
         k: int = 6,
+        q_vec: Optional[np.ndarray] = None,
+        sims: Optional[np.ndarray] = None,
+        pool: Optional[Tuple[np.ndarray, np.ndarray]] = None,
 ) -> dict:
     """
     Thin wrapper that:
       - supports mock mode (env RAG_MOCK=1)
-      - warms a small LRU cache by (industry, style, roles, k, qsig)
+      - serves repeated requests from the retrieval cache (cache.py), keyed by
+        (industry, style, query, roles, k) and the catalog/index it came from
+      - serves the precomputed industry x style slate when the description
+        adds little to it (rag/slates.py)
       - returns a DICT with templates, image_keywords, schema_defaults, debug
     """
-    _ensure()
     roles = role_hints or ORDER_ROLES
 
     # Mock mode (raw dicts)
     if os.getenv("RAG_MOCK") == "1":
+        _ensure()
         seed = _seed_from_payload(industry or "", style or "", " ".join(q_terms))
-        raw_entries = [e["raw"] for e in (_ENTRIES or [])]
+        raw_entries = list(_ENTRIES.rows())
         return _mock_bucketed(raw_entries, industry or "", seed, k_per_role=max(k, 2))
 
-    # Stable signature + warm cache
-    qsig = _sig(industry, style, " ".join(q_terms)[:256], need_images, ",".join(roles), k)
-    _cached_bucketed_key.cache_clear()
-    _cached_bucketed_key(industry, style, need_images, max(k, 2), tuple(roles), qsig)
+    key = _payload_key(q_terms, industry, style, need_images, roles, k)
+    if key:
+        with span("retrieval_cache"):
+            hit = _PAYLOAD_CACHE.get(key)
+        if hit is not None:
+            return hit
+
+    # Weak description: the precomputed industry x style slate
+    slate, q_vec = _slate_for(q_terms, industry, style, need_images, roles, k, q_vec)
+    if slate is not None:
+        return slate
 
     # Compute via bucketed (keeps `_score` inside templates)
     view = retrieve_bucketed_context(
@@ -896,24 +1193,96 @@ def retrieve_by_roles_payload(
         need_images=need_images,
         k_per_role=max(k, 2),
         role_hints=roles,
+        q_vec=q_vec,
+        sims=sims,
+        pool=pool,
     )
+    if key:
+        _PAYLOAD_CACHE.set(key, view)
     return view
 
-@lru_cache(maxsize=256)
-def _cached_bucketed_key(
-        industry: str,
-        style: str,
-        need_images: bool,
-        k_per_role: int,
-        role_hints_tuple: tuple,
-        qsig: str,
-) -> str:
+def _payload_key(q_terms: List[str], industry: str, style: str, need_images: bool, roles: List[str],
+                 k: int) -> Optional[str]:
+    """
+    Retrieval cache key for one request. It covers everything the payload
+    depends on: the request, the catalog file, index/storage/shard settings
+    and the embedding model, so a rebuilt catalog or a config change misses.
     """
-    Signature-only cache. We don't compute retrieval here.
-    It simply caches the key so repeated identical requests are throttled.
-    Real retrieval is done outside (deterministic, easier to test).
+    if not _PAYLOAD_CACHE.enabled:
+        return None
+    qsig = _sig(industry, style, " ".join(q_terms), need_images, ",".join(roles), k)
+    src = _source_sig()
+    return _PAYLOAD_CACHE.key(qsig, src["size"], src["mtime_ns"], ann.INDEX_TYPE, quant.EMB_STORAGE,
+                              shards.SHARDS_ENABLED, MODEL.name, bool(UNSPLASH_ACCESS_KEY))
+
+def retrieve_by_roles_payload_many(requests: List[Dict[str, Any]]) -> List[dict]:
     """
-    return qsig
+    Batched retrieve_by_roles_payload for bulk generation.
+    `requests` is a list of kwargs dicts for retrieve_by_roles_payload.
+    All queries are embedded in ONE MODEL.encode call and scored against the
+    catalog with ONE matrix multiply; per-request role bucketing then reuses
+    its row of similarities. Cached payloads and default slates are served
+    without either. Results are in input order. With RAG_SHARDS=1, requests
+    with an industry only reuse their query embedding (their roles search the
+    industry's shards).
+    """
+    if not requests:
+        return []
+    if os.getenv("RAG_MOCK") == "1":
+        return [retrieve_by_roles_payload(**r) for r in requests]
+
+    # Cached payloads and no-embedding slates first; only the rest are embedded
+    out: List[Optional[dict]] = [None] * len(requests)
+    shape = [(r.get("q_terms") or [], r.get("industry", ""), r.get("style", ""), r.get("need_images", True),
+              r.get("role_hints") or ORDER_ROLES, r.get("k", 6)) for r in requests]
+    keys = [_payload_key(*a) for a in shape]
+    for i, key in enumerate(keys):
+        if key:
+            out[i] = _PAYLOAD_CACHE.get(key)
+        if out[i] is None:
+            out[i], _ = _slate_for(*shape[i], encode=False)
+    todo = [i for i, hit in enumerate(out) if hit is None]
+
+    queries = {i: _query_of(requests[i].get("q_terms") or []) for i in todo}
+    live = [i for i in todo if queries[i]]
+    q_vecs: Dict[int, np.ndarray] = {}
+    sims: Dict[int, np.ndarray] = {}
+    pools: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    if live:
+        Q = _encode_queries([queries[i] for i in live])      # (B, dim)
+        q_vecs = {i: Q[row] for row, i in enumerate(live)}
+        for i in live:                                       # slates that needed the embedding check
+            out[i], _ = _slate_for(*shape[i], q_vec=q_vecs[i])
+        todo = [i for i in todo if out[i] is None]
+        live = [i for i in live if out[i] is None]
+        rows = [row for row, i in enumerate(live) if not (shards.SHARDS_ENABLED and requests[i].get("industry"))]
+        if rows:
+            _ensure()
+            Qf = np.stack([q_vecs[live[row]] for row in rows])
+            if _use_ann():
+                for row, p in zip(rows, _ann_pools(Qf)):
+                    pools[live[row]] = p
+            else:
+                S = _EMB.scores_many(Qf)                     # (B, N)
+                for j, row in enumerate(rows):
+                    sims[live[row]] = S[j]
+
+    for i in todo:
+        r = requests[i]
+        out[i] = retrieve_bucketed_context(
+            q_terms=r.get("q_terms") or [],
+            industry=r.get("industry", ""),
+            need_images=r.get("need_images", True),
+            k_per_role=max(r.get("k", 6), 2),
+            role_hints=r.get("role_hints") or ORDER_ROLES,
+            q_vec=q_vecs.get(i),
+            sims=sims.get(i),
+            pool=pools.get(i),
+        )
+        if keys[i]:
+            _PAYLOAD_CACHE.set(keys[i], out[i])
+    return out
+
 
 def retrieve_context(
         query: str,
@@ -931,33 +1300,32 @@ def retrieve_context(
     _ensure()
 
     # 1) vector search
-    q_emb = MODEL.encode([query], normalize_embeddings=True).astype("float32")
-    D, I = _INDEX.search(q_emb, k)
-    cand_idx = [idx for idx in I[0] if idx >= 0]
+    q_emb = _encode_queries([query])
+    fetch = max(k, quant.RERANK_TOP) if _EMB.compressed else k
+    D, I = _INDEX.search(q_emb, min(fetch, len(_ENTRIES)))
+    cand_idx = [int(idx) for idx in I[0] if idx >= 0]
 
     # 2) hybrid re-rank
-    # map idx->sim
-    sim_map = {idx: float(sim) for idx, sim in zip(I[0], D[0]) if idx >= 0}
-    scored = []
-    for idx in cand_idx:
-        ent = _ENTRIES[idx]
-        h = _hybrid_score(
-            sim=sim_map.get(idx, 0.0),
-            item=ent,
-            idx=idx,
-            query=query,
-            industry=industry,
-            need_images=need_images,
-            role_hint=None,  # role-agnostic here
-        )
-        scored.append((h, idx, ent))
-    scored.sort(key=lambda x: x[0], reverse=True)
+    # map idx->sim (exact cosine: ANN/PQ/SQ distances are approximate)
+    exact = _EMB.exact_scores(q_emb[0], cand_idx)
+    if fetch > k:
+        keep = np.argsort(-exact, kind="stable")[:k]
+        cand_idx, exact = [cand_idx[j] for j in keep], exact[keep]
+    hs = _hybrid_scores(
+        sims=exact,
+        ids=np.array(cand_idx, dtype="int64"),
+        query=query,
+        industry=industry,
+        need_images=need_images,
+        role_hint=None,  # role-agnostic here
+    )
+    scored = sorted(zip(hs.tolist(), cand_idx), key=lambda x: x[0], reverse=True)
 
     # 3) take top-N and optionally inject https-image policy
     top: List[Dict[str, Any]] = []
     seen_types: set[str] = set()
-    for _, idx, ent in scored[: min(len(scored), 18) ]:
-        obj = ent["raw"].copy()
+    for _, idx in scored[: min(len(scored), 18) ]:
+        obj = _ENTRIES.raw(idx)
         t = obj.get("type")
         if t in seen_types and "general" in (obj.get("tags") or []):
             continue
@@ -981,95 +1349,143 @@ def search_entries_composite(
         extra_boost_tags: Optional[List[str]] = None,
         use_mmr: bool = True,
         mmr_lambda: float = 0.7,
+        q_vec: Optional[np.ndarray] = None,
+        sims: Optional[np.ndarray] = None,
+        pool: Optional[Tuple[np.ndarray, np.ndarray]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Role-aware search with hybrid scoring + MMR diversity:
-      - embed concatenated q_terms
-      - filter by pageRole and industry
+      - embed concatenated q_terms (or reuse `q_vec` / full-catalog `sims`)
+      - filter by pageRole and industry inside the index search (FAISS ID
+        selector over precomputed id sets), or on the shared `pool` / `sims`
+        row when given; a pool with too few survivors falls back to the
+        filtered search
       - score with hybrid score (vector + lexical + tag/image + role fit)
       - apply MMR to reduce redundancy
     Returns a list of raw entry dicts.
     """
-    _ensure()
-    query = " ".join([t for t in q_terms if t]).strip()
-    if not query:
-        return []
+    picks = _composite_picks(q_terms, role, industry, need_images, k, extra_boost_tags, use_mmr, mmr_lambda,
+                             q_vec, sims, pool)
+    return [_pick_entry(c, need_images) for c in picks]
 
-    q_vec = MODEL.encode([query], normalize_embeddings=True).astype("float32")[0]
-
-    # Filter candidate indices by role/industry upfront
-    cand_indices: List[int] = []
-    for i, ent in enumerate(_ENTRIES):
-        raw = ent["raw"] or {}
-        if role and raw.get("pageRole") != role:
-            continue
-        if industry:
-            inds = set((raw.get("industry") or []))
-            lowset = {x.lower() for x in inds}
-            ilow = industry.lower()
-            if (ilow not in lowset) and (not any(ilow in x for x in lowset)):
-                continue
-        cand_indices.append(i)
+def _pick_entry(c: Dict[str, Any], need_images: bool) -> Dict[str, Any]:
+    """The full entry of a search pick, decoded from the catalog (a fresh dict)."""
+    obj = c["view"].entries.raw(c["idx"])
+    if need_images:
+        obj = _inject_https_note(obj)
+    obj["_score"] = round(float(c["score"]), 6)  # <-- carry score to the caller
+    return obj
 
-    if not cand_indices:
+def _composite_picks(
+        q_terms: List[str],
+        role: Optional[str] = None,
+        industry: Optional[str] = None,
+        need_images: bool = False,
+        k: int = 5,
+        extra_boost_tags: Optional[List[str]] = None,
+        use_mmr: bool = True,
+        mmr_lambda: float = 0.7,
+        q_vec: Optional[np.ndarray] = None,
+        sims: Optional[np.ndarray] = None,
+        pool: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> List[Dict[str, Any]]:
+    """search_entries_composite before decoding: [{"view", "idx", "score", "vec"}] best first."""
+    query = _query_of(q_terms)
+    if not query:
         return []
+    views = _views_for(industry)
+
+    if q_vec is None:
+        q_vec = _encode_queries([query])[0]
+    if views[0] is not _CATALOG:
+        sims = pool = None                 # both index the full catalog
 
-    # Vectors + cosine sims
-    cand_vecs = _EMB_MATRIX[cand_indices]  # (M, dim)
-    sims = cand_vecs.dot(q_vec)            # (M,)
-
-    # Hybrid score each candidate (includes tiny lexical bonus)
-    scored = []
-    for j, idx in enumerate(cand_indices):
-        ent = _ENTRIES[idx]
-        h = _hybrid_score(
-            sim=float(sims[j]),
-            item=ent,
-            idx=idx,
+    def _scores(view: shards.Shard, ids: np.ndarray, sims: np.ndarray) -> List[float]:
+        h = _hybrid_scores(
+            sims=sims,
+            ids=ids,
             query=query,
             industry=industry or "",
             need_images=need_images,
             role_hint=role,
+            view=view,
         )
 
         # tiny deterministic jitter to break ties, stable for same (role, industry, query)
         if role:
             seed_str = f"{role}|{industry or ''}|{query}"
-            h += (abs(hash(seed_str + str(idx))) % 1000) / 1e7  # 0..0.0001
-
-        # optional tiny extra tag boosts...
+            h = h + np.array([(_stable_hash(seed_str, view.global_id(i)) % 1000) / 1e7  # 0..0.0001
+                              for i in ids.tolist()], dtype="float64")
 
         # optional tiny extra tag boosts
-        if extra_boost_tags:
-            raw = ent["raw"] or {}
-            entry_tags = " ".join(raw.get("tags") or []).lower()
-            for t in extra_boost_tags:
-                if t and t.lower() in entry_tags:
-                    h += 0.05
-
-        # Keep vec + score for MMR
-        scored.append({
-            "score": h,
-            "vec": cand_vecs[j],
-            "ent": ent,
-        })
-
-    # Sort by relevance first (helps MMR seed from strong items)
-    scored.sort(key=lambda x: x["score"], reverse=True)
+        for t in extra_boost_tags or []:
+            if t:
+                h = h + np.where(view.entries.tags_containing(t, ids), 0.05, 0.0)
+        return h.tolist()
+
+    scored_by_id: Dict[int, Dict[str, Any]] = {}
+    for view in views:
+        # Role/industry filter as precomputed id sets, applied inside the index
+        # search (or to a precomputed similarity row / shared ANN pool). The
+        # general shard is industry-agnostic.
+        flt = view.filter_ids(role, "" if view.key == shards.GENERAL else (industry or "").lower())
+        if flt is not None and not len(flt[0]):
+            continue
 
-    # MMR for diversity
-    picked = _mmr_select(scored, topn=k, lambda_=mmr_lambda) if use_mmr else scored[:k]
+        approx = False                     # sims from float16/int8 codes or SQ distances
+        view_sims = None
+        if pool is not None:
+            pool_idx, pool_sims = pool
+            keep = np.isin(pool_idx, flt[0], assume_unique=True) if flt is not None else np.ones(len(pool_idx), bool)
+            if int(keep.sum()) >= k:
+                cand_idx, view_sims = pool_idx[keep], pool_sims[keep]
+        if view_sims is None:
+            if sims is not None:
+                cand_idx = flt[0] if flt is not None else np.arange(len(view))
+                view_sims = sims[cand_idx]  # (M,) from the precomputed catalog row
+                approx = view.emb.compressed
+            else:
+                # (also when a shared pool had too few survivors for this role/industry)
+                cand_idx, view_sims, approx = _filtered_search(view, q_vec, flt, k)
+
+        # Hybrid score each candidate (includes tiny lexical bonus)
+        cand_idx = np.asarray(cand_idx, dtype="int64")
+        scored = [{"score": h, "idx": idx, "view": view}
+                  for idx, h in zip(cand_idx.tolist(), _scores(view, cand_idx, view_sims))]
+
+        # Approximate sims: re-score the head exactly
+        if approx:
+            scored.sort(key=lambda x: x["score"], reverse=True)
+            head = scored[:max(quant.RERANK_TOP, k)]
+            head_idx = np.array([c["idx"] for c in head], dtype="int64")
+            exact = view.emb.exact_scores(q_vec, head_idx)
+            for c, h in zip(head, _scores(view, head_idx, exact)):
+                c["score"] = h
+
+        # an entry with several industries can sit in more than one shard
+        for c in scored:
+            gid = view.global_id(c["idx"])
+            if gid not in scored_by_id or c["score"] > scored_by_id[gid]["score"]:
+                scored_by_id[gid] = c
+
+    if not scored_by_id:
+        return []
 
-    # Finalize objects (inject HTTPS policy if needed)
-    # Finalize objects (inject HTTPS policy if needed)
-    results: List[Dict[str, Any]] = []
-    for c in picked:
-        obj = (c["ent"]["raw"] or {}).copy()
-        if need_images:
-            obj = _inject_https_note(obj)
-        obj["_score"] = round(float(c["score"]), 6)  # <-- carry score to the caller
-        results.append(obj)
-    return results
+    # Sort by relevance first (helps MMR seed from strong items); only the
+    # best ANN_POOL are kept, so vectors are gathered for those alone
+    scored = sorted(scored_by_id.values(), key=lambda x: x["score"], reverse=True)[:max(ann.ANN_POOL, k)]
+    for view in views:
+        mine = [c for c in scored if c["view"] is view]
+        for c, vec in zip(mine, view.emb.rows([c["idx"] for c in mine])):
+            c["vec"] = vec
+
+    # MMR for diversity
+    if use_mmr:
+        with span("mmr"):
+            picked = _mmr_select(scored, topn=k, lambda_=mmr_lambda)
+    else:
+        picked = scored[:k]
+    return picked
 
 def debug_retrieval(query_terms, industry, role_hints=None, k=10):
     """
@@ -1129,14 +1545,24 @@ def retrieve_by_roles(
 # Utility / maintenance
 # =========================
 
-def build_index() -> int:
+def build_index(sharded: bool = shards.SHARDS_ENABLED) -> int:
     """
-    Build (or overwrite) the FAISS index from DATA_PATH.
+    Build (or overwrite) the compiled catalog and the FAISS index from
+    DATA_PATH, the default industry x style slates, and with `sharded` the per-industry shards under
+    RAG_SHARD_DIR too.
     Returns the number of entries indexed.
     """
-    global _ENTRIES, _INDEX, _EMB_MATRIX, _DIM
-    _ENTRIES = _load_entries()
-    _INDEX = _build_index(_ENTRIES)
+    global _ENTRIES, _INDEX, _SHARDS, _SLATES, _SLATES_MISSING
+    rows = _load_rows()
+    _ENTRIES = _compile_catalog(rows)
+    texts = [_entry_blob(raw) for raw in rows]
+    del rows                                    # only the compiled catalog is kept
+    _INDEX = _build_index(texts)
+    if sharded:
+        _SHARDS = None
+        _write_shards()
+    if slates.SLATES_ENABLED:
+        _SLATES, _SLATES_MISSING = _write_slates(), False
     return len(_ENTRIES)
 
 def rebuild_index() -> int:
@@ -1145,8 +1571,49 @@ def rebuild_index() -> int:
     """
     if INDEX_PATH.exists():
         INDEX_PATH.unlink()
+    ann.meta_path(INDEX_PATH).unlink(missing_ok=True)
     return build_index()
 
+def embedding_memory() -> dict:
+    """
+    Per-worker bytes for the catalog: the embedding matrix plus the FAISS
+    index, the compiled catalog mapping, and the loaded shards (codes + index
+    + catalog) when sharded.
+    """
+    out: Dict[str, Any] = {"storage": quant.EMB_STORAGE}
+    if _EMB is not None:
+        out.update(_EMB.memory())
+        out["index"] = INDEX_PATH.stat().st_size if _INDEX is not None and INDEX_PATH.exists() else 0
+    if _ENTRIES is not None:
+        out["catalog"] = _ENTRIES.nbytes
+    if _SHARDS is not None:
+        out["shards"] = _SHARDS.stats()["resident_bytes"]
+    return out
+
+def _memory_gauge():
+    mem = embedding_memory()
+    return {(("part", part), ("storage", mem["storage"])): mem[part]
+            for part in ("codes", "scales", "private", "index", "exact_mmap", "catalog", "shards") if part in mem}
+
+register_gauge("webgenai_rag_memory_bytes", _memory_gauge, "Catalog embedding memory per worker")
+
+def _shard_gauge():
+    if _SHARDS is None:
+        return {}
+    st = _SHARDS.stats()
+    return {(("kind", kind),): (len(st["loaded"]) if kind == "loaded" else st[kind])
+            for kind in ("loaded", "hits", "misses", "evictions")}
+
+register_gauge("webgenai_rag_shard_cache", _shard_gauge, "Lazily loaded catalog shards")
+
+def _embed_batch_gauge():
+    if not isinstance(_QUERY_MODEL, embedder.BatchingEmbedder):
+        return {}
+    st = _QUERY_MODEL.stats()
+    return {(("kind", kind),): st[kind] for kind in ("requests", "items", "batches", "max_batch")}
+
+register_gauge("webgenai_embed_batches", _embed_batch_gauge, "Query embedding micro-batches")
+
 def index_info() -> dict:
     """
     Quick diagnostics for debugging.
@@ -1155,10 +1622,16 @@ def index_info() -> dict:
     return {
         "data_path": str(DATA_PATH),
         "index_path": str(INDEX_PATH),
+        "index": dict(_INDEX_META),
         "entries": len(_ENTRIES or []),
         "dim": _DIM,
-        "roles_present": sorted({(e["raw"] or {}).get("pageRole","") for e in (_ENTRIES or [])}),
-        "industries_present": sorted({t for e in (_ENTRIES or []) for t in (e["raw"] or {}).get("industry", [])}),
+        "embedder": {"backend": MODEL.backend, "model": MODEL.name, "quant": getattr(MODEL, "quant", None),
+                     "microbatch": _QUERY_MODEL.stats() if isinstance(_QUERY_MODEL, embedder.BatchingEmbedder) else None},
+        "memory": embedding_memory(),
+        "shards": _SHARDS.stats() if _SHARDS is not None else None,
+        "roles_present": sorted({r or "" for r in _ENTRIES.role_names}),
+        "industries_present": _industries_present(),
+        "slates": _SLATES.stats() if _SLATES is not None else None,
     }
 
 if __name__ == "__main__":
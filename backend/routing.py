@@ -0,0 +1,118 @@
+# backend/routing.py
+import json, math, os
+from typing import Any, Dict, List, Optional
+from logutil import get_logger, kv
+
+log = get_logger("routing")
+
+# Model routing: estimate the output size of a page from the retrieved slate
+# and the requested component count, then pick the cheapest policy tier that
+# fits it (and the caller's latency budget, when given).
+# Off by default: the estimate is not yet calibrated against real usage, and a
+# routed budget under the static MAX_OUTPUT_TOKENS (12288, main.py) truncates
+# pages that fill the prompt's 12-20 component range. Until then every request
+# gets the static model and budget; ROUTING_ENABLED=1 opts in.
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "0") == "1"
+
+DEFAULT_COMPONENT_COUNT = 16          # middle of the prompt's 12-20 range
+MAX_COMPONENT_COUNT = 40
+
+CHARS_PER_TOKEN = 4.0
+FILL_FACTOR = 3.0                     # generated copy runs much longer than exampleProps
+COMPONENT_OVERHEAD_TOKENS = 60        # id/type/tags wrapper per component
+PAGE_OVERHEAD_TOKENS = 120            # websiteName, industry, style, tags...
+FALLBACK_COMPONENT_TOKENS = 350       # when the slate tells us nothing
+OUTPUT_HEADROOM = 1.5                 # max_output_tokens = estimate * headroom
+MIN_OUTPUT_TOKENS = 4096
+
+# Ordered cheapest/fastest first. A tier is eligible when the estimate fits
+# under max_est_tokens; latency is estimated as base_ms + tokens / tokens_per_s.
+# Override with ROUTING_POLICY='[{...}, ...]' (same keys).
+DEFAULT_POLICY: List[Dict[str, Any]] = [
+    {"name": "small", "model": "models/gemini-2.0-flash-lite", "max_est_tokens": 3500,
+     "max_output_tokens": 6144, "base_ms": 700, "tokens_per_s": 260},
+    {"name": "standard", "model": os.getenv("GEMINI_MODEL", "gemini-1.5-flash"), "max_est_tokens": 9000,
+     "max_output_tokens": 12288, "base_ms": 900, "tokens_per_s": 180},
+    {"name": "large", "model": "models/gemini-2.0-flash-001", "max_est_tokens": 1_000_000,
+     "max_output_tokens": 16384, "base_ms": 1000, "tokens_per_s": 200},
+]
+
+
+def load_policy() -> List[Dict[str, Any]]:
+    raw = os.getenv("ROUTING_POLICY")
+    if not raw:
+        return DEFAULT_POLICY
+    try:
+        policy = json.loads(raw)
+        for tier in policy:
+            for key in ("name", "model", "max_est_tokens", "max_output_tokens", "base_ms", "tokens_per_s"):
+                if key not in tier:
+                    raise ValueError(f"tier missing {key!r}")
+        return policy
+    except (ValueError, TypeError) as e:
+        log.warning("invalid ROUTING_POLICY, using defaults", extra=kv(error=str(e)))
+        return DEFAULT_POLICY
+
+
+POLICY = load_policy()
+
+
+def _component_tokens(template: Dict[str, Any]) -> float:
+    shape = template.get("exampleProps") or template.get("propsSchema")
+    if not shape:
+        return FALLBACK_COMPONENT_TOKENS
+    chars = len(json.dumps(shape, ensure_ascii=False))
+    return chars / CHARS_PER_TOKEN * FILL_FACTOR + COMPONENT_OVERHEAD_TOKENS
+
+
+def estimate_output_tokens(templates: List[Dict[str, Any]], component_count: int) -> int:
+    """Average per-component size over the slate, times the number of components asked for."""
+    sizes = [_component_tokens(t) for t in templates or []]
+    per_component = sum(sizes) / len(sizes) if sizes else FALLBACK_COMPONENT_TOKENS
+    return int(PAGE_OVERHEAD_TOKENS + per_component * component_count)
+
+
+def _latency_ms(tier: Dict[str, Any], tokens: int) -> int:
+    return int(tier["base_ms"] + tokens / max(1.0, float(tier["tokens_per_s"])) * 1000)
+
+
+def route(
+        templates: List[Dict[str, Any]],
+        component_count: Optional[int] = None,
+        latency_budget_ms: Optional[int] = None,
+        policy: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the routing decision recorded in the response:
+      {tier, model, max_output_tokens, est_output_tokens, est_latency_ms,
+       component_count, latency_budget_ms, within_budget, reason}
+    """
+    policy = policy or POLICY
+    count = max(1, min(MAX_COMPONENT_COUNT, component_count or DEFAULT_COMPONENT_COUNT))
+    est = estimate_output_tokens(templates, count)
+
+    fitting = [t for t in policy if est <= t["max_est_tokens"]] or [policy[-1]]
+    tier, reason = fitting[0], "smallest tier that fits the estimate"
+    if latency_budget_ms:
+        in_budget = [t for t in fitting if _latency_ms(t, est) <= latency_budget_ms]
+        if in_budget:
+            if in_budget[0] is not tier:
+                reason = "smallest tier that fits the estimate and latency budget"
+            tier = in_budget[0]
+        else:
+            tier = min(fitting, key=lambda t: _latency_ms(t, est))
+            reason = "no tier meets the latency budget; fastest fitting tier"
+
+    max_out = min(int(tier["max_output_tokens"]), max(MIN_OUTPUT_TOKENS, math.ceil(est * OUTPUT_HEADROOM)))
+    est_latency = _latency_ms(tier, est)
+    return {
+        "tier": tier["name"],
+        "model": tier["model"],
+        "max_output_tokens": max_out,
+        "est_output_tokens": est,
+        "est_latency_ms": est_latency,
+        "component_count": count,
+        "latency_budget_ms": latency_budget_ms,
+        "within_budget": None if not latency_budget_ms else est_latency <= latency_budget_ms,
+        "reason": reason,
+    }
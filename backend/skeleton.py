@@ -0,0 +1,115 @@
+# backend/skeleton.py
+import copy, re
+from typing import Any, Dict, List, Optional
+
+# Degraded-mode page: built synchronously from the retrieved slate (exampleProps /
+# schema_defaults) and the request fields, with no model call. Used when the
+# model misses the generation deadline or fails outright.
+
+_BRAND_KEYS = {"logoText", "logo_text", "brand", "brandName", "companyName", "businessName", "siteName"}
+_TITLE_KEYS = ("title", "heading", "headline")
+_BODY_KEYS = ("subtitle", "subheading", "description", "tagline", "text", "body")
+_ITEM_TITLE_KEYS = ("title", "heading", "name", "label")
+_USP_SPLIT_RE = re.compile(r"[\n;,•]+")
+_KEEP_ROLES = ("header", "footer")  # never dropped by max_components
+
+
+def _usps(text: Optional[str]) -> List[str]:
+    return [p.strip(" -") for p in _USP_SPLIT_RE.split(text or "") if p.strip(" -")]
+
+
+def _fill_brand(obj: Any, business_name: str) -> None:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in _BRAND_KEYS and (v is None or isinstance(v, str)):
+                obj[k] = business_name
+            else:
+                _fill_brand(v, business_name)
+    elif isinstance(obj, list):
+        for v in obj:
+            _fill_brand(v, business_name)
+
+
+def _set_first(props: Dict[str, Any], keys, value: str) -> bool:
+    for k in keys:
+        if k in props and (props[k] is None or isinstance(props[k], str)):
+            props[k] = value
+            return True
+    return False
+
+
+def _fill_items(props: Dict[str, Any], usps: List[str]) -> bool:
+    """Put the USPs into the first list of titled items (features, benefits...)."""
+    for v in props.values():
+        if isinstance(v, list) and v and all(isinstance(i, dict) for i in v):
+            if not any(k in v[0] for k in _ITEM_TITLE_KEYS):
+                continue
+            for n, usp in enumerate(usps[:max(len(v), 3)]):
+                if n >= len(v):
+                    v.append(copy.deepcopy(v[0]))
+                _set_first(v[n], _ITEM_TITLE_KEYS, usp)
+            return True
+    return False
+
+
+def _role(t: Dict[str, Any]) -> Optional[str]:
+    return t.get("_role") or t.get("pageRole")
+
+
+def build_skeleton(
+        templates: List[Dict[str, Any]],
+        schema_defaults: Dict[str, Any],
+        business_name: str,
+        description: str,
+        unique_selling_points: Optional[str] = None,
+        role_order: Optional[List[str]] = None,
+        max_components: int = 12,
+) -> Dict[str, Any]:
+    """
+    One component per retrieved type, in page-role order, at most
+    max_components (the header and footer are always kept). Props come from
+    the template's exampleProps (else schema_defaults); brand, hero copy and
+    USPs are filled from the request.
+    """
+    order = {r: i for i, r in enumerate(role_order or [])}
+    ranked = sorted(
+        enumerate(templates or []),
+        key=lambda it: (order.get(_role(it[1]), len(order)), it[0]),
+    )
+    picked, seen = [], set()
+    for _, t in ranked:
+        ctype = t.get("type")
+        if ctype and ctype not in seen:
+            seen.add(ctype)
+            picked.append(t)
+    if len(picked) > max_components:
+        # over the cap: drop sections from the middle, not the page's first header / footer
+        keep = set()
+        for r in _KEEP_ROLES:
+            first = next((i for i, t in enumerate(picked) if _role(t) == r), None)
+            if first is not None:
+                keep.add(first)
+        rest = [i for i in range(len(picked)) if i not in keep][:max(0, max_components - len(keep))]
+        picked = [picked[i] for i in sorted(keep.union(rest))]
+
+    usps = _usps(unique_selling_points)
+    components: List[Dict[str, Any]] = []
+    hero_done = usps_done = False
+    for t in picked:
+        ctype = t.get("type")
+        props = copy.deepcopy(t.get("exampleProps") or (schema_defaults or {}).get(ctype) or {})
+        _fill_brand(props, business_name)
+        role = _role(t)
+        if not hero_done and (role == "hero" or ctype == "Hero"):
+            _set_first(props, _TITLE_KEYS, business_name)
+            _set_first(props, _BODY_KEYS, description)
+            hero_done = True
+        elif usps and not usps_done and role in ("value", "core-content"):
+            usps_done = _fill_items(props, usps)
+        components.append({
+            "id": f"c{len(components) + 1}",
+            "type": ctype,
+            "tags": list(t.get("tags") or []),
+            "props": props,
+        })
+    return {"success": True, "websiteName": business_name, "tags": [], "components": components}
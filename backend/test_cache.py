@@ -0,0 +1,164 @@
+# test_cache.py
+# Two-tier result cache: packing, the SQLite tier shared between "workers"
+# (separate TieredCache instances over one file), and the Redis-protocol
+# adapter against a small in-process stand-in server.
+import socketserver, threading, time
+
+import numpy as np
+import pytest
+
+import cache
+from cache import RespBackend, SQLiteBackend, TieredCache, pack, unpack
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*"
+        args = []
+        for _ in range(int(line[1:-2])):
+            n = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(n + 2)[:-2])
+        return args
+
+    def handle(self):
+        store, authed = self.server.store, self.server.password is None
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            self.server.commands.append(cmd)
+            if cmd == b"AUTH":
+                authed = args[-1].decode() == self.server.password
+                self.wfile.write(b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n")
+            elif not authed:
+                self.wfile.write(b"-NOAUTH Authentication required.\r\n")
+            elif cmd == b"SELECT":
+                self.wfile.write(b"+OK\r\n")
+            elif cmd == b"SET":
+                px = int(args[4]) if len(args) > 4 and args[3].upper() == b"PX" else None
+                store[args[1]] = (args[2], time.time() + px / 1000 if px else None)
+                self.wfile.write(b"+OK\r\n")
+            elif cmd == b"GET":
+                val, exp = store.get(args[1], (None, None))
+                if val is None or (exp is not None and exp <= time.time()):
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    self.wfile.write(b"$%d\r\n%s\r\n" % (len(val), val))
+            elif cmd == b"DEL":
+                self.wfile.write(b":%d\r\n" % int(store.pop(args[1], None) is not None))
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+            self.wfile.flush()
+
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.store, self.commands, self.password = {}, [], password
+
+
+def _url(port):
+    return f"redis://:s3cret@127.0.0.1:{port}/2"
+
+
+@pytest.fixture
+def resp_server():
+    srv = _RespServer(password="s3cret")
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_pack_roundtrip():
+    payload = {"templates": [{"type": "hero", "_score": np.float32(0.5), "text": "café " * 200}], "k": 3}
+    blob = pack(payload)
+    assert blob[:1] == b"Z" and len(blob) < len(str(payload))
+    assert unpack(blob) == {"templates": [{"type": "hero", "_score": 0.5, "text": "café " * 200}], "k": 3}
+    assert unpack(pack({"a": 1})) == {"a": 1}
+    vec = np.random.default_rng(0).standard_normal(384).astype("float32")
+    blob = pack(vec)
+    assert len(blob) < vec.nbytes + 16
+    out = unpack(blob)
+    assert out.dtype == np.float32 and out.shape == (384,) and np.array_equal(out, vec)
+    assert unpack(pack(np.zeros((2, 3), dtype="float16"))).shape == (2, 3)
+
+
+def test_l1_lru_bounds_and_fresh_copies():
+    c = TieredCache("t", ttl_s=60, l1_items=2)
+    for i in range(3):
+        c.set(c.key(i), {"i": i})
+    assert c.get(c.key(0)) is None                       # evicted (no L2)
+    hit = c.get(c.key(2))
+    hit["i"] = 99                                        # callers may mutate what they get
+    assert c.get(c.key(2)) == {"i": 2}
+    st = c.stats()
+    assert (st["l1_hits"], st["misses"], st["l1_items"]) == (2, 1, 2)
+    assert TieredCache("off", ttl_s=0).get("x") is None
+
+
+def test_sqlite_tier_is_shared_between_workers(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    a = TieredCache("retrieval", 60, SQLiteBackend(path))
+    b = TieredCache("retrieval", 60, SQLiteBackend(path))
+    key = a.key("restaurant", "modern", "wood-fired pizza")
+    assert key == b.key("restaurant", "modern", "wood-fired pizza")
+    a.set(key, {"templates": ["hero"]})
+    assert b.get(key) == {"templates": ["hero"]}         # other worker: L2 hit
+    assert b.get(key) == {"templates": ["hero"]}         # then L1
+    st = b.stats()
+    assert (st["l2_hits"], st["l1_hits"], st["l2_hit_rate"], st["hit_rate"]) == (1, 1, 1.0, 1.0)
+
+
+def test_sqlite_ttl_and_size_bound(tmp_path):
+    be = SQLiteBackend(tmp_path / "c.sqlite3", max_bytes=10_000, purge_every=1000)
+    be.set("old", b"x" * 10, ttl_s=0.05)
+    time.sleep(0.1)
+    assert be.get("old") is None
+    for i in range(40):
+        be.set(f"k{i}", b"y" * 1000, ttl_s=60 + i)       # later keys expire later
+    be.purge()
+    st = be.stats()
+    assert st["bytes"] <= 10_000 and st["evictions"] > 0
+    assert be.get("k39") is not None and be.get("k0") is None
+
+
+def test_resp_tier_against_stand_in_server(resp_server):
+    port = resp_server.server_address[1]
+    a, b = TieredCache("embedding", 60, RespBackend(_url(port))), TieredCache("embedding", 60, RespBackend(_url(port)))
+    vec = np.arange(8, dtype="float32")
+    key = a.key("minilm", "hello world")
+    a.set(key, vec)
+    out = b.get(key)
+    assert np.array_equal(out, vec) and b.stats()["l2_hits"] == 1
+    assert b"AUTH" in resp_server.commands and b"SELECT" in resp_server.commands
+    assert resp_server.store[key.encode()][1] is not None   # every key carries its TTL
+
+    c = TieredCache("site", 0.05, RespBackend(_url(port)))
+    c.set(c.key("x"), {"ok": True})
+    time.sleep(0.1)
+    c.clear_local()
+    assert c.get(c.key("x")) is None                      # expired server-side
+    a.delete(key)
+    b.clear_local()
+    assert b.get(key) is None
+
+
+def test_unreachable_backend_is_a_miss_not_an_error(resp_server, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_RETRY_S", 30)
+    port = resp_server.server_address[1]
+    resp_server.shutdown()
+    resp_server.server_close()
+    c = TieredCache("retrieval", 60, RespBackend(f"redis://127.0.0.1:{port}/0", timeout_s=0.1))
+    c.set(c.key("a"), {"a": 1})                          # L2 fails: stays in L1
+    assert c.get(c.key("a")) == {"a": 1}
+    assert c.get(c.key("b")) is None
+    st = c.stats()
+    assert st["l2_errors"] == 1 and st["misses"] == 1    # backend skipped after the first error
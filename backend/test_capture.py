@@ -0,0 +1,87 @@
+# test_capture.py
+# Raw output capture (capture.py): per-request sampling, segment rotation to
+# .ndjson.gz, the size cap (which only evicts rotated segments), and lookups
+# by request id in a directory other workers rotate and evict concurrently.
+import gzip, json, os
+from pathlib import Path
+
+import pytest
+
+from capture import CaptureWriter
+
+
+def _writer(tmp_path, **kw):
+    kw = {"sample_rate": 1.0, "enabled": True, **kw}
+    return CaptureWriter(directory=tmp_path, **kw)
+
+
+def _record(i: int, pad: int = 200) -> dict:
+    return {"request_id": f"req-{i}", "raw_output": "x" * pad}
+
+
+def test_sampling_is_per_request_and_counted(tmp_path):
+    ids = [f"req-{i}" for i in range(4000)]
+    assert all(_writer(tmp_path, sample_rate=1.0).wants(r) for r in ids)
+    assert not any(_writer(tmp_path, sample_rate=0.0).wants(r) for r in ids)
+    w = _writer(tmp_path, sample_rate=0.25)
+    kept = [r for r in ids if w.wants(r)]
+    assert 0.2 < len(kept) / len(ids) < 0.3
+    assert w.stats["sampled_out"] == len(ids) - len(kept)
+    assert kept == [r for r in ids if _writer(tmp_path, sample_rate=0.25).wants(r)]   # same ids every time
+    off = _writer(tmp_path, enabled=False)
+    assert not off.wants("req-1") and not off.submit(_record(1)) and off.stats["sampled_out"] == 0
+
+
+def test_rotation_compresses_segments_and_find_reads_them(tmp_path):
+    w = _writer(tmp_path, segment_bytes=1000)
+    for i in range(20):
+        assert w.submit(_record(i))
+    w.close()
+    gz = sorted(tmp_path.glob("capture-*.ndjson.gz"))
+    assert gz and w.stats["rotations"] == len(gz) and w.stats["written"] == 20
+    with gzip.open(gz[0], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["request_id"] == "req-0"
+    for i in (0, 19):
+        assert w.find(f"req-{i}")["request_id"] == f"req-{i}"
+    assert w.find("req-missing") is None
+
+
+def test_cap_evicts_oldest_rotated_segments_only(tmp_path):
+    other = tmp_path / "capture-99999-1-1.ndjson"          # another worker's open segment
+    other.write_text(json.dumps(_record(-1, pad=1000)) + "\n", encoding="utf-8")
+    os.utime(other, (1, 1))                                 # oldest of all
+    w = _writer(tmp_path, segment_bytes=500, max_bytes=4000)
+    for i in range(60):                                     # one record per write, as the writer thread would
+        w._write([{"request_id": f"req-{i}", "raw_output": os.urandom(300).hex()}])
+    assert other.exists()
+    gz = list(tmp_path.glob("capture-*.ndjson.gz"))
+    assert gz and w.stats["rotations"] > len(gz)            # the older ones were evicted
+    # within the cap, give or take the segment still open when the writer closed
+    assert sum(p.stat().st_size for p in tmp_path.glob("capture-*")) <= 4000 + 1000
+    assert w.find("req-59") is not None and w.find("req-0") is None
+
+
+def test_segments_vanishing_under_lookup_are_skipped(tmp_path, monkeypatch):
+    w = _writer(tmp_path)
+    for i in range(3):
+        seg = tmp_path / f"capture-1-{i}-1.ndjson.gz"
+        with gzip.open(seg, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(_record(i), separators=(",", ":")) + "\n")
+    gone = tmp_path / "capture-1-1-1.ndjson.gz"
+    stat = Path.stat
+
+    def racing_stat(self, *a, **kw):                        # evicted by another worker after the listing
+        if self == gone:
+            raise FileNotFoundError(self)
+        return stat(self, *a, **kw)
+
+    monkeypatch.setattr(Path, "stat", racing_stat)
+    assert {p.name for p, _ in w._segments()} == {"capture-1-0-1.ndjson.gz", "capture-1-2-1.ndjson.gz"}
+    assert w.find("req-2")["request_id"] == "req-2" and w.find("req-1") is None
+    w.max_bytes = 0
+    w._enforce_cap()                                        # must not raise either
+    assert not (tmp_path / "capture-1-0-1.ndjson.gz").exists()
+
+
+def test_missing_directory_finds_nothing(tmp_path):
+    assert _writer(tmp_path / "not-yet").find("req-1") is None
@@ -0,0 +1,75 @@
+# test_catalog.py
+# Compiled catalog (rag/catalog.py): entries round-trip through the binary
+# file, and the columns answer scoring questions the way the raw dicts did.
+import math
+
+import numpy as np
+import pytest
+
+from rag import catalog
+
+ROWS = [
+    {"type": "NavBar", "pageRole": "header", "industry": ["Restaurant", "cafe"], "tags": ["nav", "general"],
+     "description": "Top navigation with logo", "propsSchema": {"logo": "string", "links": "array"}},
+    {"type": "HeroSplit", "pageRole": "hero", "industry": ["restaurant"], "tags": ["wood fired", "pizza"],
+     "description": "Split hero with a large photo", "propsSchema": {"title": "string", "heroImage": "string"},
+     "imagesRequired": True, "exampleProps": {"title": "Café " * 200}},
+    {"type": "Pricing", "industry": ["saas"], "tags": ["plans"], "description": "Three pricing tiers"},
+    {},
+]
+
+
+def _compiled(tmp_path, rows=ROWS):
+    path = catalog.compile_catalog(rows, tmp_path / "index.catalog", {"size": 1})
+    return catalog.open_catalog(path)
+
+
+def test_entries_round_trip(tmp_path):
+    cat = _compiled(tmp_path)
+    assert len(cat) == 4 and cat.source == {"size": 1}
+    assert [cat.raw(i) for i in range(4)] == ROWS
+    cat.raw(1)["exampleProps"]["title"] = "changed"          # every decode is a fresh dict
+    assert cat.raw(1) == ROWS[1]
+    assert (cat.type(1), cat.role(1), cat.role(2), cat.tags(1)) == ("HeroSplit", "hero", None, ["wood fired", "pizza"])
+    assert cat.industries(0) == ["Restaurant", "cafe"]
+    assert catalog.open_catalog(tmp_path / "missing.catalog") is None
+    assert len(_compiled(tmp_path, [])) == 0
+
+
+def test_columns(tmp_path):
+    cat = _compiled(tmp_path)
+    assert {k: v.tolist() for k, v in cat.role_ids().items()} == {"header": [0], "hero": [1], None: [2, 3]}
+    assert cat.industry_ids()["restaurant"].tolist() == [0, 1]
+    ids = np.arange(4)
+    assert cat.has_any("ind", cat.codes_of("ind", "restaurant"), ids).tolist() == [True, True, False, False]
+    assert cat.has_role(cat.codes_of("role", "hero"), ids).tolist() == [False, True, False, False]
+    assert (cat.flags & catalog.FLAG_IMAGE_FIT).astype(bool).tolist() == [True, True, False, False]
+    # substring of the space-joined tags, as before
+    assert cat.tags_containing("fire", ids).tolist() == [False, True, False, False]
+    assert cat.tags_containing("fired pizza", ids).tolist() == [False, True, False, False]
+    assert cat.tags_containing("nav general", ids[::-1]).tolist() == [False, False, False, True]
+
+
+def test_lexical_scores_match_token_sets(tmp_path):
+    cat = _compiled(tmp_path)
+    docs = [set(catalog.tokenize(catalog.lex_text(r))) for r in ROWS]
+    df = {t: sum(t in d for d in docs) for d in docs for t in d}
+    idf = {t: math.log((4 - n + 0.5) / (n + 0.5) + 1.0) for t, n in df.items()}
+    for query in ("restaurant hero photo", "pricing tiers pricing", "nothing matches", ""):
+        q = set(catalog.tokenize(query))
+        want = [min(sum(idf[t] for t in q if t in d) / (1.0 + math.log(1.0 + len(d))), 0.2) for d in docs]
+        got = cat.lexical_scores(catalog.tokenize(query), np.array([3, 2, 1, 0]))
+        assert np.allclose(got, want[::-1], rtol=0, atol=1e-12), query
+
+
+def test_slotted_entries(tmp_path):
+    cat = _compiled(tmp_path)
+    ent = cat[1]
+    assert not hasattr(ent, "__dict__") and ent._raw is None          # nothing decoded yet
+    assert (ent.type, ent.role, ent.industries, ent.tags) == ("HeroSplit", "hero", ["restaurant"], ["wood fired", "pizza"])
+    assert ent.flags == catalog.FLAG_IMAGE_FIT | catalog.FLAG_IMAGES_REQUIRED
+    assert "raw" in ent and ent["raw"] == ROWS[1] and ent["raw"] is ent.raw and "blob" not in ent
+    assert cat[0].industry_codes == (0, 1) and cat[0].industries[0] is cat.industry_names[0]
+    assert [e.raw for e in cat] == ROWS and cat[3].role is None
+    with pytest.raises(IndexError):
+        cat[4]
@@ -0,0 +1,100 @@
+# test_degraded.py
+# Degraded mode in main.py with the model call stubbed out: only the request's
+# deadline (not the routing latency budget) serves a skeleton, model errors stay
+# errors unless GENERATION_DEGRADE_ON_ERROR is on, and a late result is finished
+# into the job store inside the original request's context, counted once.
+import contextvars, json, os, threading, time
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")            # main configures the client at import
+import main  # noqa: E402
+from jobs import STATUS_SUCCEEDED, JobStore  # noqa: E402
+from logutil import REQUEST_ID  # noqa: E402
+from metrics import _COUNTERS  # noqa: E402
+
+_CALLER = contextvars.ContextVar("caller", default=None)   # set by the test, never by main
+
+SLATE = {"templates": [
+    {"type": "NavBar", "_role": "header", "exampleProps": {"logoText": "x"}},
+    {"type": "Hero", "_role": "hero", "exampleProps": {"title": "t", "subtitle": "s"}},
+    {"type": "Footer", "_role": "footer", "exampleProps": {"brand": "x"}},
+], "schema_defaults": {}}
+SITE = {"websiteName": "Acme", "components": [{"id": "c1", "type": "Hero", "props": {"title": "Acme"}}]}
+
+
+def _count(name, **labels):
+    return _COUNTERS.get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+def _payload(**kw):
+    return main.GenerateRequest(business_name="Acme", description="d", industry="saas", style="modern",
+                                wire_format="full", **kw)
+
+
+@pytest.fixture
+def model(monkeypatch, tmp_path):
+    """Stub model call: sleeps `delay` seconds, then raises `error` or answers SITE."""
+    state = SimpleNamespace(delay=0.0, error=None, finished_in=[], done=threading.Event())
+
+    def call(ctx):
+        time.sleep(state.delay)
+        if state.error:
+            raise state.error
+        return SimpleNamespace(model_name="stub"), SimpleNamespace(text=json.dumps(SITE), usage_metadata=None)
+
+    finish = main._finish_site
+
+    def finish_site(payload, ctx, m, resp, **kw):
+        state.finished_in.append((REQUEST_ID.get(), _CALLER.get()))
+        try:
+            return finish(payload, ctx, m, resp, **kw)
+        finally:
+            state.done.set()
+
+    monkeypatch.setattr(main, "_call_model", call)
+    monkeypatch.setattr(main, "_finish_site", finish_site)
+    monkeypatch.setattr(main, "_site_key", lambda payload: None)
+    monkeypatch.setattr(main, "JOB_STORE", JobStore(tmp_path / "jobs.sqlite3"))
+    return state
+
+
+def test_deadline_serves_skeleton_and_delivers_late(model):
+    model.delay = 0.3
+    _CALLER.set("test")
+    before = {o: _count("webgenai_generations_total", outcome=o) for o in ("degraded", "ok")}
+    late_before = _count("webgenai_late_results_total", outcome="ok")
+    data = main._generate_site(_payload(deadline_ms=50), dict(SLATE), degrade=True)
+    assert data["degraded"] is True and "deadline" in data["degraded_reason"]
+    assert [c["type"] for c in data["components"]] == ["NavBar", "Hero", "Footer"]
+    assert model.done.wait(5)
+    for _ in range(50):
+        job = main.job_store().get(data["job_id"])
+        if job["status"] == STATUS_SUCCEEDED:
+            break
+        time.sleep(0.02)
+    assert job["status"] == STATUS_SUCCEEDED and job["result"]["components"][0]["props"]["title"] == "Acme"
+    assert model.finished_in == [(data["request_id"], "test")]  # the callback ran in the request's context
+    # one request, one generation outcome; the late result is counted apart
+    assert _count("webgenai_generations_total", outcome="degraded") == before["degraded"] + 1
+    assert _count("webgenai_generations_total", outcome="ok") == before["ok"]
+    assert _count("webgenai_late_results_total", outcome="ok") == late_before + 1
+
+
+def test_latency_budget_is_not_a_deadline(model, monkeypatch):
+    monkeypatch.setattr(main, "ROUTING_ENABLED", True)       # the budget only steers routing
+    model.delay = 0.1
+    data = main._generate_site(_payload(latency_budget_ms=1), dict(SLATE), degrade=True)
+    assert not data.get("degraded") and data["routing"]["latency_budget_ms"] == 1
+    assert data["components"][0]["props"]["title"] == "Acme"
+
+
+def test_model_errors_are_errors_unless_enabled(model, monkeypatch):
+    model.error = RuntimeError("quota")
+    assert main.DEGRADE_ON_ERROR is False
+    with pytest.raises(RuntimeError, match="quota"):
+        main._generate_site(_payload(), dict(SLATE), degrade=True)
+    monkeypatch.setattr(main, "DEGRADE_ON_ERROR", True)
+    data = main._generate_site(_payload(), dict(SLATE), degrade=True)
+    assert data["degraded"] is True and data["degraded_reason"] == "model error: quota"
@@ -0,0 +1,140 @@
+# test_embed_batching.py
+# Query micro-batching (rag/embedder.py BatchingEmbedder) around a stub model:
+# callers queued behind a running batch are coalesced into one model call and
+# each gets its own rows back, a model error reaches every caller of that batch,
+# and a forked child starts its own batching thread.
+import os, select, threading, time
+
+import numpy as np
+import pytest
+
+from rag.embedder import BatchingEmbedder
+
+
+class _Model:
+    """Encodes "7" as [7, 1 if normalized else 0]; each call waits for `gate`."""
+    backend, name, dim = "stub", "stub", 2
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.error = None
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32):
+        self.calls.append(list(texts))
+        assert self.gate.wait(5)
+        if self.error:
+            raise self.error
+        return np.array([[float(t), float(normalize_embeddings)] for t in texts], dtype="float32")
+
+
+def _encode_in_threads(emb, texts, normalize=True):
+    results = {}
+
+    def call(t):
+        try:
+            results[t] = emb.encode([t], normalize_embeddings=normalize)
+        except Exception as e:  # noqa: BLE001  (the test checks what each caller got)
+            results[t] = e
+
+    threads = [threading.Thread(target=call, args=(t,)) for t in texts]
+    for th in threads:
+        th.start()
+    return threads, results
+
+
+def _first_call_running(emb, model):
+    """One caller whose batch is inside the (blocked) model, so the next callers queue behind it."""
+    threads, results = _encode_in_threads(emb, ["1"])
+    for _ in range(500):
+        if model.calls:
+            return threads, results
+        time.sleep(0.01)
+    raise AssertionError("the first batch never reached the model")
+
+
+def _wait_queued(emb, n):
+    for _ in range(500):
+        if emb._queue.qsize() >= n:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"{n} callers never queued")
+
+
+@pytest.fixture
+def model():
+    m = _Model()
+    yield m
+    m.gate.set()                         # never leave the batching thread blocked
+
+
+def test_callers_behind_a_running_batch_are_coalesced(model):
+    emb = BatchingEmbedder(model, max_items=8, wait_ms=0)
+    first, got_first = _first_call_running(emb, model)
+    rest, got = _encode_in_threads(emb, ["2", "3", "4", "5"])
+    _wait_queued(emb, 4)
+    model.gate.set()
+    for th in first + rest:
+        th.join(5)
+    assert model.calls[0] == ["1"] and sorted(model.calls[1]) == ["2", "3", "4", "5"] and len(model.calls) == 2
+    for t, vec in {**got_first, **got}.items():
+        np.testing.assert_array_equal(vec, [[float(t), 1.0]])
+    assert emb.stats() == {"requests": 5, "items": 5, "batches": 2, "max_batch": 4, "mean_batch": 2.5}
+
+
+def test_normalize_flags_run_as_separate_model_calls(model):
+    emb = BatchingEmbedder(model, max_items=8, wait_ms=0)
+    first, _ = _first_call_running(emb, model)
+    a, got_a = _encode_in_threads(emb, ["2", "3"], normalize=True)
+    b, got_b = _encode_in_threads(emb, ["4"], normalize=False)
+    _wait_queued(emb, 3)
+    model.gate.set()
+    for th in first + a + b:
+        th.join(5)
+    assert sorted(map(sorted, model.calls[1:])) == [["2", "3"], ["4"]]
+    np.testing.assert_array_equal(got_a["3"], [[3.0, 1.0]])
+    np.testing.assert_array_equal(got_b["4"], [[4.0, 0.0]])
+
+
+def test_model_error_reaches_every_caller_in_the_batch(model):
+    emb = BatchingEmbedder(model, max_items=8, wait_ms=0)
+    model.error = RuntimeError("oom")
+    first, got_first = _first_call_running(emb, model)
+    rest, got = _encode_in_threads(emb, ["2", "3", "4"])
+    _wait_queued(emb, 3)
+    model.gate.set()
+    for th in first + rest:
+        th.join(5)
+    assert set(got) == {"2", "3", "4"}
+    for err in [*got_first.values(), *got.values()]:
+        assert isinstance(err, RuntimeError) and str(err) == "oom"
+    model.error = None                   # the batching thread survives and serves the next caller
+    np.testing.assert_array_equal(emb.encode(["6"]), [[6.0, 1.0]])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_restarts_the_batching_thread(model):
+    model.gate.set()
+    emb = BatchingEmbedder(model, max_items=8, wait_ms=0)
+    np.testing.assert_array_equal(emb.encode(["1"]), [[1.0, 1.0]])
+    parent_thread = emb._thread
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:                         # child: the parent's thread did not survive the fork
+        try:
+            vec = emb.encode(["2"])
+            ok = emb._thread is not parent_thread and emb._thread.is_alive() and vec.tolist() == [[2.0, 1.0]]
+            os.write(w, b"ok" if ok else b"bad")
+        finally:
+            os._exit(0)
+    os.close(w)
+    try:
+        ready, _, _ = select.select([r], [], [], 10)
+        out = os.read(r, 16) if ready else b"timeout"
+    finally:
+        os.close(r)
+        if out == b"timeout":
+            os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    assert out == b"ok"
+    assert emb._thread is parent_thread and emb._thread.is_alive()
@@ -0,0 +1,75 @@
+# test_embedder.py
+# Cosine drift of the ONNX embedder (fp32 and int8) against the torch
+# reference, on the catalog and on the test_retrieval.py queries. Exports the
+# configured model (RAG_EMBED_MODEL) to a temp dir; skipped when onnxruntime
+# is not installed or the model cannot be loaded.
+import subprocess, sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from rag import embedder  # noqa: E402
+
+FP32_MIN_COSINE = 0.9999
+INT8_MEAN_COSINE = 0.99
+INT8_MIN_COSINE = 0.97
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    try:
+        embedder.TorchEmbedder()
+    except Exception as e:  # no weights offline, etc.
+        pytest.skip(f"cannot load {embedder.EMBED_MODEL}: {e}")
+    out = tmp_path_factory.mktemp("onnx")
+    embedder.export_onnx(embedder.EMBED_MODEL, out, int8=True)
+    return out
+
+
+@pytest.fixture(scope="module")
+def texts():
+    from rag import vectorstore
+    from bench.common import QUERIES as test_cases
+    queries = [" ".join([industry, "modern", desc[:100]]) for industry, desc in test_cases]
+    return [vectorstore._entry_blob(r) for r in vectorstore._load_rows()] + queries
+
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    return embedder.TorchEmbedder().encode(texts)
+
+
+def _cosines(onnx_dir, quant, texts, reference):
+    got = embedder.OnnxEmbedder(onnx_dir, quant).encode(texts)
+    assert got.shape == reference.shape
+    return (got * reference).sum(axis=1)   # both sides are L2-normalized
+
+
+def test_onnx_fp32_matches_torch(onnx_dir, texts, reference):
+    cos = _cosines(onnx_dir, "none", texts, reference)
+    assert cos.min() > FP32_MIN_COSINE, cos.min()
+
+
+def test_onnx_int8_drift_is_bounded(onnx_dir, texts, reference):
+    cos = _cosines(onnx_dir, "int8", texts, reference)
+    assert cos.mean() > INT8_MEAN_COSINE, cos.mean()
+    assert cos.min() > INT8_MIN_COSINE, cos.min()
+
+
+def test_batching_does_not_change_vectors(onnx_dir, texts):
+    e = embedder.OnnxEmbedder(onnx_dir, "none")
+    one = np.vstack([e.encode([t]) for t in texts[:16]])
+    assert np.allclose(one, e.encode(texts[:16], batch_size=5), atol=1e-5)
+
+
+def test_onnx_backend_does_not_import_torch(onnx_dir):
+    code = ("import sys; from rag import embedder; "
+            f"embedder.OnnxEmbedder({str(onnx_dir)!r}, 'int8').encode(['hello']); "
+            "print('torch' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,154 @@
+# test_filtered_search.py
+# Role / industry filtering inside the FAISS search (rag/vectorstore.py
+# _filtered_search, Shard.filter_ids) returns what filtering a full similarity
+# row returns: the same candidates as a brute-force scan of the entries, and the
+# same role-aware picks and scores. With RAG_SHARDS=1 the picks are the
+# unsharded ones, plus general entries where the role has any, and a stale
+# shard manifest is rebuilt. Runs retrieval in a child process on a small
+# fixture catalog with its own index directory.
+import json, os, subprocess, sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent
+
+INDUSTRIES = ["restaurant", "saas", "fitness"]
+ROLES = ["header", "hero", "value", "footer"]
+QUERIES = [("restaurant", "wood fired pizza with a photo gallery"), ("saas", "pricing plans for devops teams"),
+           ("fitness", "group classes and personal training"), ("", "modern landing page")]
+
+
+def fixture_catalog() -> List[Dict]:
+    """~50 entries over a few industries (one multi-industry) and roles, plus industry-less / general footers."""
+    rows = []
+    words = {"restaurant": ["menu", "pizza", "reservations", "chef"], "saas": ["pricing", "dashboard", "api", "teams"],
+             "fitness": ["classes", "trainers", "membership", "schedule"]}
+    for ind in INDUSTRIES:
+        for role in ROLES:
+            for n in range(3):
+                w = words[ind]
+                rows.append({
+                    "type": f"{ind.title()}{role.title()}{n}", "pageRole": role, "industry": [ind],
+                    "tags": [w[n], w[(n + 1) % 4]] + (["general"] if n == 2 else []),
+                    "description": f"{role} section for a {ind} site with {w[n]} and {w[(n + 2) % 4]}",
+                    "propsSchema": {"title": "string", **({"heroImage": "string"} if n != 1 else {})},
+                })
+    rows.append({"type": "CafeHero", "pageRole": "hero", "industry": ["Restaurant", "cafe"], "tags": ["coffee"],
+                 "description": "hero for a cafe or restaurant with coffee", "propsSchema": {"photo": "string"}})
+    rows.append({"type": "PlainFooter", "pageRole": "footer", "tags": ["links"],
+                 "description": "simple footer with links", "propsSchema": {"links": "array"}})
+    rows.append({"type": "GeneralFooter", "pageRole": "footer", "industry": ["general"], "tags": ["contact"],
+                 "description": "footer with contact details", "propsSchema": {"email": "string"}})
+    return rows
+
+
+def write_fixture(tmp_path: Path) -> Path:
+    path = tmp_path / "components.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in fixture_catalog()), encoding="utf-8")
+    return path
+
+
+def run_child(tmp_path: Path, script: str, **env: str) -> dict:
+    """Run `script` (prints "RESULT <json>") against the fixture catalog; skip when retrieval can't run here."""
+    data = tmp_path / "components.jsonl"
+    if not data.exists():
+        write_fixture(tmp_path)
+    full_env = {**os.environ, "RAG_DATA_PATH": str(data), "RAG_INDEX_PATH": str(tmp_path / "index.faiss"),
+                "RAG_SHARD_DIR": str(tmp_path / "shards"), "RAG_SLATES": "0", "CACHE_TTL_EMBEDDING_S": "0",
+                "CACHE_TTL_RETRIEVAL_S": "0", **env}
+    proc = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=full_env, capture_output=True,
+                          text=True, timeout=600)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        pytest.skip(f"retrieval unavailable here: {proc.stderr.strip().splitlines()[-1:]}")
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+_SCRIPT = r"""
+import json, sys
+from rag import vectorstore as vs
+from test_filtered_search import INDUSTRIES, QUERIES, ROLES
+vs.preload()
+rows = list(vs._ENTRIES.rows())
+out = {"candidates": [], "picks": []}
+for ind, desc in QUERIES:
+    q_terms = [ind, "modern", desc]
+    q_vec = vs._encode_queries([vs._query_of(q_terms)])[0]
+    row = vs._EMB.scores(q_vec)
+    for role in ROLES + [None]:
+        for industry in INDUSTRIES + ["cafe", ""]:
+            flt = vs._CATALOG.filter_ids(role, industry)
+            got = sorted(vs._filtered_search(vs._CATALOG, q_vec, flt, 8)[0].tolist()) if flt is None or len(flt[0]) else []
+            want = [i for i, r in enumerate(rows) if (not role or r.get("pageRole") == role)
+                    and (not industry or any(industry in str(x).lower() for x in r.get("industry") or []))]
+            out["candidates"].append([role, industry, got, want])
+            picks = {}
+            for how, kw in (("selector", {}), ("row", {"sims": row})):
+                picks[how] = [[c["view"].global_id(c["idx"]), round(c["score"], 5)] for c in
+                              vs._composite_picks(q_terms, role, industry, True, 8, [industry] if industry else None,
+                                                  q_vec=q_vec, **kw)]
+            out["picks"].append([desc, role, industry, picks["selector"], picks["row"]])
+print("RESULT " + json.dumps(out))
+"""
+
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_selector_search_matches_filtered_similarity_row(tmp_path, storage):
+    out = run_child(tmp_path, _SCRIPT, RAG_INDEX_TYPE="flat", RAG_EMB_STORAGE=storage, RAG_SHARDS="0")
+    for role, industry, got, want in out["candidates"]:
+        assert got == want, (role, industry)
+    assert any(want for *_, want in out["candidates"])
+    for desc, role, industry, selector, row in out["picks"]:
+        assert [s for _, s in selector] == [s for _, s in row], (desc, role, industry)
+        if role:                           # without a role there is no tie-break jitter: equal scores in any order
+            assert selector == row, (desc, role, industry)
+
+
+_SHARDED_SCRIPT = r"""
+import json
+from rag import shards, vectorstore as vs
+from test_filtered_search import INDUSTRIES, QUERIES, ROLES
+vs.preload()
+out = {"built_at": shards.read_manifest(shards.SHARD_DIR)["built_at"], "picks": []}
+for ind, desc in QUERIES[:3]:
+    q_terms = [ind, "modern", desc]
+    q_vec = vs._encode_queries([vs._query_of(q_terms)])[0]
+    for role in ROLES:
+        for industry in INDUSTRIES + ["cafe"]:
+            picks = {}
+            for sharded in (True, False):
+                shards.SHARDS_ENABLED = sharded
+                picks[sharded] = [[c["view"].global_id(c["idx"]), round(c["score"], 5)] for c in
+                                  vs._composite_picks(q_terms, role, industry, True, 8, [industry], q_vec=q_vec)]
+            shards.SHARDS_ENABLED = True
+            out["picks"].append([desc, role, industry, picks[True], picks[False]])
+general = vs._ensure_shards().get(shards.GENERAL)
+out["general"] = general.ids.tolist()
+
+# a manifest from another build config is stale: rebuilt on next open
+manifest = shards.read_manifest(shards.SHARD_DIR)
+(shards.SHARD_DIR / "manifest.json").write_text(json.dumps({**manifest, "layout": 0}))
+vs._SHARDS = None
+out["rebuilt"] = shards.manifest_is_current(vs._ensure_shards().manifest, vs._source_sig())
+out["rebuilt_layout"] = shards.read_manifest(shards.SHARD_DIR)["layout"]
+print("RESULT " + json.dumps(out))
+"""
+
+
+def test_sharded_picks_match_unsharded_plus_general(tmp_path):
+    out = run_child(tmp_path, _SHARDED_SCRIPT, RAG_INDEX_TYPE="flat", RAG_EMB_STORAGE="float32", RAG_SHARDS="1")
+    general = set(out["general"])
+    assert len(general) == 2
+    widened = 0
+    for desc, role, industry, sharded, unsharded in out["picks"]:
+        if role != "footer":                   # the fixture's general entries are all footers
+            assert sharded == unsharded, (desc, role, industry)
+            continue
+        # the general footers join the candidates: picks may shift, shared picks keep their scores
+        scores = dict(map(tuple, unsharded))
+        assert all(i in general or scores[i] == score for i, score in sharded), (desc, role, industry)
+        widened += any(p[0] in general for p in sharded)
+    assert widened
+    assert out["rebuilt"] and out["rebuilt_layout"] != 0
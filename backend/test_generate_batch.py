@@ -0,0 +1,86 @@
+# test_generate_batch.py
+# Bulk endpoint /api/generate-websites in main.py with retrieval and the model
+# call stubbed out: retrieval runs once for the whole batch and each item gets
+# its own slate, one failing item does not fail the others, and every item is
+# streamed as one NDJSON line.
+import json, os, re
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("GEMINI_API_KEY", "test")            # main configures the client at import
+import main  # noqa: E402
+
+NAMES = ["Acme", "Broken", "Garbled", "Zenith"]
+
+
+def _slate(i: int) -> dict:
+    return {"templates": [{"type": f"Hero{i}", "_role": "hero", "exampleProps": {"title": "t"}}],
+            "schema_defaults": {}}
+
+
+@pytest.fixture
+def stubs(monkeypatch):
+    """Batch retrieval answering one slate per request; a model echoing the slate's component type."""
+    state = SimpleNamespace(retrievals=[])
+
+    def retrieve_many(args_list):
+        state.retrievals.append([a["q_terms"] for a in args_list])
+        return [_slate(i) for i in range(len(args_list))]
+
+    def retrieve_one(**kw):
+        raise AssertionError("batch items must not retrieve on their own")
+
+    def call(ctx):
+        if "Broken" in ctx["user_msg"]:
+            raise RuntimeError("quota exceeded")
+        text = "sorry, I can't" if "Garbled" in ctx["user_msg"] else json.dumps({
+            "websiteName": "x",
+            "components": [{"id": "c1", "type": re.search(r"Hero\d+", ctx["user_msg"]).group(0),
+                            "props": {"title": "ok"}}],
+        })
+        return SimpleNamespace(model_name="stub"), SimpleNamespace(text=text, usage_metadata=None)
+
+    monkeypatch.setattr(main, "retrieve_by_roles_payload_many", retrieve_many)
+    monkeypatch.setattr(main, "retrieve_by_roles_payload", retrieve_one)
+    monkeypatch.setattr(main, "_call_model", call)
+    monkeypatch.setattr(main, "_site_key", lambda payload: None)
+    monkeypatch.setattr(main, "CONTINUE_ON_TRUNCATION", False)
+    return state
+
+
+def _post(body):
+    return TestClient(main.app).post("/api/generate-websites", json=body)  # no lifespan: no preload or workers
+
+
+def test_batch_streams_one_line_per_item_and_isolates_failures(stubs):
+    body = [{"business_name": n, "description": f"{n} does things", "industry": "saas", "style": "modern",
+             "wire_format": "full"} for n in NAMES]
+    resp = _post(body)
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("application/x-ndjson")
+    assert resp.text.endswith("\n")
+    lines = [json.loads(ln) for ln in resp.text.splitlines()]
+    assert len(lines) == len(NAMES) and all(ln for ln in resp.text.split("\n")[:-1])
+    by_index = {ln["index"]: ln for ln in lines}
+    assert sorted(by_index) == list(range(len(NAMES)))
+    assert [by_index[i]["business_name"] for i in range(len(NAMES))] == NAMES
+
+    # one retrieval pass for the whole batch, in request order
+    assert len(stubs.retrievals) == 1 and len(stubs.retrievals[0]) == len(NAMES)
+    assert [terms[2].split()[0] for terms in stubs.retrievals[0]] == NAMES
+
+    for i in (0, 3):                                        # each item generated from its own slate
+        ok = by_index[i]
+        assert ok["ok"] is True and "error" not in ok
+        assert ok["result"]["success"] is True and ok["result"]["components"][0]["type"] == f"Hero{i}"
+    broken, garbled = by_index[1], by_index[2]
+    assert broken["ok"] is False and "quota exceeded" in broken["error"] and "result" not in broken
+    assert garbled["ok"] is False and garbled["error"] and "result" not in garbled
+
+
+def test_batch_size_is_capped(stubs, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_ITEMS", 2)
+    body = [{"business_name": n, "description": "d", "industry": "saas", "style": "modern"} for n in NAMES]
+    resp = _post(body)
+    assert resp.status_code == 413 and not stubs.retrievals
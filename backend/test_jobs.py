@@ -0,0 +1,35 @@
+# test_jobs.py
+# SQLite job store: dedup, retry with backoff, and jobs whose worker dies
+# mid-run (lease expiry) running out of attempts instead of looping forever.
+import jobs
+from jobs import STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, JobStore
+
+
+def test_submit_dedups_normalized_requests(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    a = store.submit({"industry": "Restaurant", "description": "  wood   fired "})
+    b = store.submit({"industry": "restaurant", "description": "wood fired", "style": ""})
+    assert a[2] is False and b == (a[0], STATUS_QUEUED, True)
+
+
+def test_failed_attempts_requeue_then_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_BACKOFF_BASE_S", 0.0)
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit({"industry": "x"})[0]
+    for attempt in range(1, jobs.JOB_MAX_ATTEMPTS + 1):
+        job = store.claim()
+        assert job["id"] == job_id and job["attempts"] == attempt
+        status = store.fail(job_id, "boom", job["attempts"])
+    assert status == STATUS_FAILED and store.claim() is None
+
+
+def test_expired_lease_counts_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_S", -1.0)            # every lease is already expired: the worker "died"
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit({"industry": "x"})[0]
+    for attempt in range(1, jobs.JOB_MAX_ATTEMPTS + 1):
+        job = store.claim()
+        assert job["status"] == STATUS_RUNNING and job["attempts"] == attempt
+    assert store.claim() is None
+    job = store.get(job_id)
+    assert job["status"] == STATUS_FAILED and "lease expired" in job["error"]
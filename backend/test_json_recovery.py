@@ -0,0 +1,119 @@
+# test_json_recovery.py
+# Salvaging model output (json_recovery.py): truncated documents keep every
+# closed component and report the one cut off, fences / trailing commas /
+# trailing text are tolerated, and a continuation only appends what is new.
+import json
+
+import pytest
+
+from json_recovery import continuation_prompt, merge_continuation, recover_site_json
+
+SITE = {
+    "websiteName": "Acme",
+    "components": [
+        {"id": "c1", "type": "NavBar", "props": {"logoText": "Acme"}},
+        {"id": "c2", "type": "Hero", "props": {"title": "Say \"hi\"", "subtitle": "a\\b"}},
+        {"id": "c3", "type": "Footer", "props": {"brand": "Acme"}},
+    ],
+}
+TEXT = json.dumps(SITE)
+
+
+def _cut_in(needle: str, offset: int = 0) -> str:
+    """TEXT truncated `offset` chars after the start of `needle`."""
+    return TEXT[:TEXT.index(needle) + offset]
+
+
+def test_clean_document_is_not_recovered():
+    data, report = recover_site_json(TEXT)
+    assert data == SITE
+    assert report == {"recovered": False, "truncated": False, "components_kept": 3, "dropped_chars": 0,
+                      "dropped_partial": None, "error": None}
+
+
+@pytest.mark.parametrize("cut", [
+    _cut_in('{"id": "c3"'),                          # between elements
+    _cut_in('{"id": "c3"', 1),                       # just inside the last element
+    _cut_in('"type": "Footer"', 12),                 # mid-string
+    _cut_in('"brand": "Acme"', 10),                  # mid-string, last value
+])
+def test_truncated_mid_array_keeps_closed_components(cut):
+    data, report = recover_site_json(cut)
+    assert data["websiteName"] == "Acme"
+    assert [c["id"] for c in data["components"]] == ["c1", "c2"]
+    assert report["recovered"] and report["truncated"] and report["components_kept"] == 2
+    assert report["dropped_chars"] == len(cut) - TEXT.index('{"id": "c3"')          # the partial c3
+    assert report["error"]
+
+
+def test_truncated_mid_escape():
+    cut = _cut_in('\\"hi', 1)                         # ends on the backslash of an escape
+    assert cut.endswith("\\")
+    data, report = recover_site_json(cut)
+    assert [c["id"] for c in data["components"]] == ["c1"]
+    assert report["truncated"] and report["dropped_partial"] == {"id": "c2", "type": "Hero"}
+
+
+def test_dropped_partial_reports_the_cut_component():
+    _, report = recover_site_json(_cut_in('"brand"'))
+    assert report["dropped_partial"] == {"id": "c3", "type": "Footer"}
+    _, report = recover_site_json(_cut_in('{"id": "c3"', 5))          # only '{"id"' left: nothing to name
+    assert report["dropped_partial"] is None and report["dropped_chars"] == 5
+
+
+def test_code_fences_are_stripped():
+    for fenced in (f"```json\n{TEXT}\n```", f"```\n{TEXT}```", f"  ```JSON {TEXT} ```  "):
+        data, report = recover_site_json(fenced)
+        assert data == SITE and not report["recovered"]
+    data, report = recover_site_json("```json\n" + _cut_in('{"id": "c3"'))
+    assert len(data["components"]) == 2 and report["truncated"]
+
+
+def test_trailing_commas_and_garbage():
+    text = TEXT[:-2] + ",]," + '"tags": ["x"],}'                     # trailing commas in the array and object
+    data, report = recover_site_json(text)
+    assert data["components"] == SITE["components"] and data["tags"] == ["x"]
+    assert report["recovered"] and not report["truncated"] and report["dropped_chars"] == 0
+
+    data, report = recover_site_json("Here is your site:\n" + TEXT + "\nHope you like it!")
+    assert data == SITE and report["recovered"] and not report["truncated"]
+
+
+def test_compact_components_key():
+    compact = json.dumps({"websiteName": "Acme", "c": [{"i": "c1", "t": "Hero"}, {"i": "c2", "t": "Fo"}]})
+    data, report = recover_site_json(compact[:compact.index('{"i": "c2"') + 8], components_key="c")
+    assert data["c"] == [{"i": "c1", "t": "Hero"}] and report["truncated"]
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"websiteName": "Ac', "[1, 2]"])
+def test_nothing_recoverable_raises(text):
+    with pytest.raises(ValueError):
+        recover_site_json(text)
+
+
+def test_continuation_prompt_lists_done_components_and_what_is_left():
+    data, _ = recover_site_json(_cut_in('{"id": "c3"'))
+    prompt = continuation_prompt(data, target_min=6)
+    assert json.dumps([{"id": "c1", "type": "NavBar"}, {"id": "c2", "type": "Hero"}]) in prompt
+    assert "at least 4 more" in prompt and '{"components": [' in prompt
+    assert "at least 1 more" in continuation_prompt(SITE, target_min=2)
+    compact = continuation_prompt({"c": [{"i": "c1", "t": "Hero"}]}, 3, components_key="c", id_key="i",
+                                  type_key="t")
+    assert '[{"i": "c1", "t": "Hero"}]' in compact and '{"c": [' in compact
+
+
+def test_merge_continuation_dedups_and_appends_tail():
+    data, _ = recover_site_json(_cut_in('{"id": "c3"'))
+    extra = {"components": [
+        {"id": "c2", "type": "Hero", "props": {"title": "again"}},   # repeated: skipped
+        {"id": "c3", "type": "Footer", "props": {}},
+        {"id": "c3", "type": "Footer", "props": {"dup": True}},      # repeated within the tail: skipped
+        {"type": "Cta", "props": {}},                                # no id: appended
+        "not a component",
+    ]}
+    assert merge_continuation(data, extra) == 2
+    assert [c.get("id") for c in data["components"]] == ["c1", "c2", "c3", None]
+    assert data["components"][1]["props"]["title"] == 'Say "hi"'
+    assert merge_continuation({}, None) == 0
+    fresh = {}
+    assert merge_continuation(fresh, {"components": [{"id": "x"}]}) == 1 and fresh == {"components": [{"id": "x"}]}
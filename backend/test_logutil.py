@@ -0,0 +1,116 @@
+# test_logutil.py
+# Structured logging (logutil.py): JSON lines carry the current request id and
+# the kv() fields, Lazy values render only when formatted, and debug dumps are
+# gated on the logger level, DEBUG_DUMPS or DEBUG_SAMPLE_RATE.
+import contextvars, json, logging
+
+import pytest
+
+import logutil
+from logutil import REQUEST_ID, JsonFormatter, Lazy, dump, kv, should_dump
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(logutil._RequestIdFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def logger():
+    """A webgenai logger at INFO whose records are kept, not printed."""
+    lg = logging.getLogger("webgenai.test_logutil")
+    handler = _Capture()
+    lg.addHandler(handler)
+    lg.setLevel(logging.INFO)
+    lg.propagate = False
+    lg.records = handler.records
+    yield lg
+    lg.removeHandler(handler)
+    lg.propagate = True
+
+
+@pytest.fixture
+def request_id():
+    token = REQUEST_ID.set("req-42")
+    yield "req-42"
+    REQUEST_ID.reset(token)
+
+
+def test_json_line_carries_request_id_and_fields(logger, request_id):
+    logger.info("generated %s", "site", extra=kv(components=3, payload=Lazy(lambda: {"a": 1})))
+    out = json.loads(JsonFormatter().format(logger.records[0]))
+    assert out["request_id"] == "req-42" and out["level"] == "INFO" and out["logger"] == "webgenai.test_logutil"
+    assert out["msg"] == "generated site" and out["components"] == 3 and out["payload"] == "{'a': 1}"
+    assert "exc" not in out
+
+
+def test_json_line_outside_a_request_and_with_exception(logger):
+    def fail():
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+
+    contextvars.Context().run(fail)                         # a context no request has run in
+    out = json.loads(JsonFormatter().format(logger.records[0]))
+    assert out["request_id"] == "-" and out["level"] == "ERROR"
+    assert "ValueError: boom" in out["exc"]
+    bare = logging.LogRecord("webgenai.x", logging.INFO, __file__, 1, "no filter", None, None)
+    assert json.loads(JsonFormatter().format(bare))["request_id"] == "-"
+
+
+def test_lazy_json_renders_only_when_formatted():
+    calls = []
+    lazy = logutil.lazy_json(Lazy(lambda: calls.append(1) or "v"))
+    assert not calls
+    assert str(lazy) == '"v"' and calls == [1]
+    assert str(logutil.lazy_json({"text": "x" * 50}, limit=10)) == '{"text": "...'
+
+
+def test_should_dump_is_gated(logger, request_id, monkeypatch):
+    monkeypatch.setattr(logutil, "DEBUG_DUMPS", False)
+    monkeypatch.setattr(logutil, "DEBUG_SAMPLE_RATE", 0.0)
+    assert not should_dump(logger)
+    logger.setLevel(logging.DEBUG)
+    assert should_dump(logger)
+    logger.setLevel(logging.INFO)
+    monkeypatch.setattr(logutil, "DEBUG_DUMPS", True)
+    assert should_dump(logger)
+    monkeypatch.setattr(logutil, "DEBUG_DUMPS", False)
+    monkeypatch.setattr(logutil, "DEBUG_SAMPLE_RATE", 1.0)
+    assert should_dump(logger)
+    token = REQUEST_ID.set("-")                             # outside a request nothing is sampled
+    try:
+        assert not should_dump(logger)
+    finally:
+        REQUEST_ID.reset(token)
+
+
+def test_sampling_is_per_request_id(monkeypatch):
+    monkeypatch.setattr(logutil, "DEBUG_SAMPLE_RATE", 0.1)
+    ids = [f"req-{i}" for i in range(5000)]
+    sampled = [r for r in ids if logutil._sampled(r)]
+    assert 0.07 < len(sampled) / len(ids) < 0.13
+    assert sampled == [r for r in ids if logutil._sampled(r)]
+
+
+def test_dump_skips_lazy_work_unless_enabled(logger, request_id, monkeypatch):
+    monkeypatch.setattr(logutil, "DEBUG_DUMPS", False)
+    monkeypatch.setattr(logutil, "DEBUG_SAMPLE_RATE", 0.0)
+    calls = []
+    payload = Lazy(lambda: calls.append(1) or "big")
+    dump(logger, "rag payload", payload=payload)
+    assert not logger.records and not calls
+
+    monkeypatch.setattr(logutil, "DEBUG_DUMPS", True)        # forced: logged at INFO
+    dump(logger, "rag payload", payload=payload)
+    logger.setLevel(logging.DEBUG)                           # debug logger: logged at DEBUG
+    dump(logger, "rag payload", payload=payload)
+    assert [r.levelno for r in logger.records] == [logging.INFO, logging.DEBUG]
+    out = json.loads(JsonFormatter().format(logger.records[0]))
+    assert out["dump"] is True and out["payload"] == "big" and calls == [1]
@@ -0,0 +1,90 @@
+# test_metrics.py
+# Stage histograms, counters and scrape-time series (metrics.py) rendered as
+# Prometheus text, and the per-request Server-Timing header. Stage and metric
+# names are unique to this file: the registries are process-wide.
+import contextvars
+
+import metrics
+from metrics import BUCKETS_S, Histogram, begin_request, inc, observe, render_prometheus, server_timing_header, span
+
+
+def _in_request(fn):
+    """Run `fn` in its own context, as one request would."""
+    def run():
+        begin_request()
+        return fn()
+    return contextvars.copy_context().run(run)
+
+
+def _lines(prefix: str):
+    return [ln for ln in render_prometheus().splitlines() if ln.startswith(prefix)]
+
+
+def test_histogram_bucket_bounds_are_inclusive():
+    h = Histogram()
+    for v in (0.0, BUCKETS_S[0], BUCKETS_S[0] * 1.01, 0.3, 60.0, 61.0):
+        h.observe(v)
+    assert h.counts[0] == 2                               # le=50µs holds 0 and exactly 50µs
+    assert h.counts[1] == 1
+    assert h.counts[BUCKETS_S.index(0.5)] == 1
+    assert h.counts[BUCKETS_S.index(60.0)] == 1 and h.counts[-1] == 1          # beyond 60s: +Inf only
+    assert h.count == 6 and abs(h.total - (2 * BUCKETS_S[0] * 1.005 + 121.3)) < 1e-9
+
+
+def test_render_prometheus_histogram_is_cumulative():
+    for v in (0.0002, 0.003, 0.003, 120.0):
+        observe("test_metrics_stage", v)
+    lines = _lines('webgenai_stage_seconds_bucket{stage="test_metrics_stage"')
+    assert len(lines) == len(BUCKETS_S) + 1
+    assert 'webgenai_stage_seconds_bucket{stage="test_metrics_stage",le="0.0001"} 0' in lines
+    assert 'webgenai_stage_seconds_bucket{stage="test_metrics_stage",le="0.00025"} 1' in lines
+    assert 'webgenai_stage_seconds_bucket{stage="test_metrics_stage",le="0.005"} 3' in lines
+    assert 'webgenai_stage_seconds_bucket{stage="test_metrics_stage",le="60.0"} 3' in lines
+    assert lines[-1] == 'webgenai_stage_seconds_bucket{stage="test_metrics_stage",le="+Inf"} 4'
+    assert _lines('webgenai_stage_seconds_count{stage="test_metrics_stage"}') == \
+        ['webgenai_stage_seconds_count{stage="test_metrics_stage"} 4']
+    total = float(_lines('webgenai_stage_seconds_sum{stage="test_metrics_stage"}')[0].split()[-1])
+    assert abs(total - 120.0062) < 1e-9
+
+
+def test_render_prometheus_counters_and_registered_series(monkeypatch):
+    monkeypatch.setattr(metrics, "_GAUGES", {})              # only this test's series
+    inc("test_metrics_total", outcome="ok")
+    inc("test_metrics_total", 2, outcome="ok")
+    inc("test_metrics_total", outcome="failed", code=500)
+    inc("test_metrics_bare_total")
+    metrics.register_gauge("test_metrics_items", lambda: {(): 7, (("kind", "a"),): 1.5}, "Items held")
+    metrics.register_counter("test_metrics_hits_total", lambda: {(("cache", "l1"),): 3})
+    metrics.register_gauge("test_metrics_broken", lambda: 1 / 0)
+    text = render_prometheus()
+    assert text.endswith("\n")
+    assert "# TYPE test_metrics_total counter" in text
+    assert _lines("test_metrics_total") == ['test_metrics_total{code="500",outcome="failed"} 1.0',
+                                            'test_metrics_total{outcome="ok"} 3.0']
+    assert _lines("test_metrics_bare_total") == ["test_metrics_bare_total 1.0"]
+    assert "# HELP test_metrics_items Items held\n# TYPE test_metrics_items gauge" in text
+    assert _lines("test_metrics_items") == ["test_metrics_items 7", 'test_metrics_items{kind="a"} 1.5']
+    assert "# TYPE test_metrics_hits_total counter" in text
+    assert _lines("test_metrics_hits_total") == ['test_metrics_hits_total{cache="l1"} 3']
+    assert "test_metrics_broken" not in text                # a failing series is skipped, not the scrape
+
+
+def test_server_timing_header_sums_repeated_stages():
+    def request():
+        observe("retrieval", 0.0125)
+        observe("gemini_call", 1.5)
+        observe("retrieval", 0.0025)
+        with span("sanitize"):
+            pass
+        return server_timing_header(), metrics.request_timings()
+
+    header, timings = _in_request(request)
+    parts = header.split(", ")
+    assert parts[:2] == ['retrieval;dur=15.0;desc="x2"', "gemini_call;dur=1500.0"]
+    assert parts[2].startswith("sanitize;dur=") and len(parts) == 3
+    assert timings["retrieval"] == 15.0 and timings["gemini_call"] == 1500.0
+
+
+def test_no_timings_outside_a_request():
+    assert contextvars.Context().run(server_timing_header) == ""      # not the test's context: other tests ran requests in it
+    assert _in_request(server_timing_header) == ""
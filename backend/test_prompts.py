@@ -0,0 +1,42 @@
+# test_prompts.py
+from prompts import SYSTEM_MSG, INDUSTRY_GUIDANCE, allowed_types_for, build_user_message, industry_prefix
+
+BUSINESS_A = {"Business Name": "Trattoria Uno", "Business Description": "Family pasta place"}
+BUSINESS_B = {"Business Name": "Sushi Zen", "Business Description": "Omakase counter, 12 seats"}
+
+
+def test_prefix_is_stable_across_requests():
+    for industry in list(INDUSTRY_GUIDANCE) + ["unknown-industry"]:
+        prefix = industry_prefix(industry)
+        a, _ = build_user_message(industry, {"templates": [{"type": "Menu"}], "image_keywords": ["pasta"]},
+                                  BUSINESS_A, allowed_types_for([{"type": "Menu"}]))
+        b, _ = build_user_message(industry, {"templates": [], "image_keywords": []},
+                                  BUSINESS_B, allowed_types_for([]), component_range="6-8")
+        assert a.startswith(prefix) and b.startswith(prefix), industry
+        # the prefix is the same object every time, not just an equal string
+        assert industry_prefix(industry) is prefix
+        # nothing request-specific leaks into it
+        assert "Trattoria" not in prefix and "Sushi" not in prefix and "RAG CONTEXT" not in prefix
+
+
+def test_industry_lookup_is_normalized():
+    assert industry_prefix(" Restaurant ") is industry_prefix("restaurant")
+    assert industry_prefix("restaurant") is not industry_prefix("technology")
+
+
+def test_variable_parts_come_after_prefix():
+    payload = {"templates": [{"type": "Menu"}], "image_keywords": ["pasta", "wine"]}
+    msg, chars = build_user_message("restaurant", payload, BUSINESS_A, allowed_types_for(payload["templates"]))
+    tail = msg[len(industry_prefix("restaurant")):]
+    assert tail.startswith("RAG CONTEXT")
+    for needle in ("Trattoria Uno", "pasta, wine", '"Menu"', "12-20"):
+        assert needle in tail
+    assert chars["system"] == len(SYSTEM_MSG)
+    assert sum(chars.values()) - chars["system"] == len(msg)
+
+
+if __name__ == "__main__":
+    test_prefix_is_stable_across_requests()
+    test_industry_lookup_is_normalized()
+    test_variable_parts_come_after_prefix()
+    print("ok")
@@ -1,7 +1,7 @@
 # test_retrieval.py
 from rag.vectorstore import retrieve_by_roles_payload, debug_retrieval
 
-def test_industry_retrieval(industry, business_description):
+def run_industry_retrieval(industry, business_description):
     print(f"\n🧪 TESTING: {industry.upper()}")
     print(f"Description: {business_description}")
     print("=" * 60)
@@ -40,5 +40,6 @@ test_cases = [
     ("beauty", "Luxury spa offering skincare treatments and relaxation services")
 ]
 
-for industry, description in test_cases:
-    test_industry_retrieval(industry, description)
\ No newline at end of file
+if __name__ == "__main__":
+    for industry, description in test_cases:
+        run_industry_retrieval(industry, description)
@@ -0,0 +1,29 @@
+# test_retrieval_eval.py
+# Scoring of bench/retrieval_eval.py against a golden set, without running
+# retrieval: the corpus is deterministic and the metrics behave at the edges.
+from bench.retrieval_eval import corpus, kendall_tau, score
+
+
+def test_corpus_is_deterministic_and_covers_industries():
+    a, b = corpus(60, seed=3), corpus(60, seed=3)
+    assert a == b and a != corpus(60, seed=4)
+    assert len({q["industry"] for q in a}) == 5 and len({q["style"] for q in a}) > 1
+    assert len({q["description"] for q in a}) > 30
+
+
+def test_kendall_tau():
+    assert kendall_tau(["a", "b", "c", "a"], ["a", "b", "c", "a"]) == 1.0   # repeats count once
+    assert kendall_tau(["a", "b", "c"], ["c", "b", "a"]) == -1.0
+    assert kendall_tau(["a", "b"], ["b", "x"]) is None
+
+
+def test_score_against_golden():
+    q = {"industry": "restaurant", "style": "modern", "description": "pizza"}
+    gold = {"templates": ["H", "Hero", "F"], "roles": {"header": ["H"], "hero": ["Hero"], "footer": ["F"]}}
+    golden = {"corpus": [q, q], "results": [gold, gold], "lat_ms": [10.0, 20.0]}
+    swapped = {"templates": ["H", "Hero2", "F"], "roles": {"header": ["H"], "hero": ["Hero2"], "footer": ["F"]}}
+    rep = score(golden, {"results": [gold, swapped], "lat_ms": [5.0, 10.0]})
+    assert rep["exact_match_rate"] == 0.5 and rep["kendall_tau"] == 1.0
+    assert rep["role_overlap_by_role"] == {"footer": 1.0, "header": 1.0, "hero": 0.5}
+    assert abs(rep["overlap"] - (1 + 2 / 3) / 2) < 1e-3
+    assert rep["latency"]["p50_ratio"] < 1 and rep["worst"][0]["overlap"] < 1
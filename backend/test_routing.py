@@ -0,0 +1,67 @@
+# test_routing.py
+# Model routing (routing.py): the smallest tier that fits the output estimate,
+# moved to a faster tier by a latency budget, and the output cap sized from
+# the estimate.
+import os
+
+import pytest
+
+import routing
+from routing import estimate_output_tokens, route
+
+POLICY = [
+    {"name": "small", "model": "m-small", "max_est_tokens": 3000, "max_output_tokens": 6000,
+     "base_ms": 500, "tokens_per_s": 100},
+    {"name": "standard", "model": "m-std", "max_est_tokens": 9000, "max_output_tokens": 12000,
+     "base_ms": 900, "tokens_per_s": 200},
+    {"name": "large", "model": "m-large", "max_est_tokens": 1_000_000, "max_output_tokens": 16000,
+     "base_ms": 1000, "tokens_per_s": 400},
+]
+
+
+def _slate(chars: int):
+    return [{"type": "T", "exampleProps": {"text": "x" * chars}}]
+
+
+def test_estimate_scales_with_components_and_slate():
+    assert estimate_output_tokens([], 10) == routing.PAGE_OVERHEAD_TOKENS + 10 * routing.FALLBACK_COMPONENT_TOKENS
+    assert estimate_output_tokens(_slate(400), 20) > estimate_output_tokens(_slate(400), 10)
+    assert estimate_output_tokens(_slate(800), 10) > estimate_output_tokens(_slate(400), 10)
+
+
+def test_smallest_tier_that_fits():
+    small = route(_slate(100), 4, policy=POLICY)
+    assert small["tier"] == "small" and small["model"] == "m-small" and small["within_budget"] is None
+    assert route(_slate(400), 16, policy=POLICY)["tier"] == "standard"
+    huge = route(_slate(4000), 40, policy=POLICY)
+    assert huge["tier"] == "large" and huge["max_output_tokens"] == 16000    # capped by the tier
+    # count is clamped and defaulted
+    assert route([], 500, policy=POLICY)["component_count"] == routing.MAX_COMPONENT_COUNT
+    assert route([], None, policy=POLICY)["component_count"] == routing.DEFAULT_COMPONENT_COUNT
+    assert small["max_output_tokens"] == routing.MIN_OUTPUT_TOKENS
+
+
+def test_latency_budget_picks_faster_tier():
+    est = estimate_output_tokens(_slate(100), 4)                 # fits "small", but small is slow
+    slow = route(_slate(100), 4, policy=POLICY)
+    assert slow["tier"] == "small" and slow["est_latency_ms"] > 3000
+    fast = route(_slate(100), 4, latency_budget_ms=3000, policy=POLICY)
+    assert fast["tier"] != "small" and fast["within_budget"] is True and fast["est_latency_ms"] <= 3000
+    assert fast["latency_budget_ms"] == 3000 and fast["est_output_tokens"] == est
+    # nothing meets the budget: the fastest tier that fits, flagged
+    none = route(_slate(100), 4, latency_budget_ms=10, policy=POLICY)
+    assert none["tier"] == "large" and none["within_budget"] is False
+    assert "no tier meets" in none["reason"]
+
+
+def test_invalid_policy_env_falls_back(monkeypatch):
+    monkeypatch.setenv("ROUTING_POLICY", '[{"name": "x"}]')
+    assert routing.load_policy() is routing.DEFAULT_POLICY
+    monkeypatch.setenv("ROUTING_POLICY", '[{"name": "x", "model": "m", "max_est_tokens": 1, "max_output_tokens": 1, '
+                                         '"base_ms": 1, "tokens_per_s": 1}]')
+    assert routing.load_policy()[0]["model"] == "m"
+
+
+@pytest.mark.skipif("ROUTING_ENABLED" in os.environ, reason="routing configured in the environment")
+def test_routing_is_off_by_default():
+    assert routing.ROUTING_ENABLED is False
@@ -0,0 +1,84 @@
+# test_shards.py
+# Per-industry shards (rag/shards.py) over a small compiled fixture catalog with
+# random embeddings: LRU loading, the manifest check that triggers a rebuild,
+# lexical scores equal to the full catalog's, and the candidates of an
+# industry-filtered query (the unsharded ones plus the general shard's).
+import numpy as np
+import pytest
+
+from rag import ann, catalog, quant, shards
+from test_filtered_search import INDUSTRIES, ROLES, fixture_catalog
+
+SOURCE = {"path": "components.jsonl", "size": 1, "mtime_ns": 1}
+
+
+@pytest.fixture
+def built(tmp_path):
+    rows = fixture_catalog()
+    entries = catalog.open_catalog(catalog.compile_catalog(rows, tmp_path / "index.catalog", SOURCE))
+    vecs = np.random.default_rng(0).standard_normal((len(rows), 16)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    root = tmp_path / "shards"
+    manifest = shards.write_shards(entries, vecs, root, SOURCE, ann.INDEX_TYPE, quant.EMB_STORAGE)
+    full = shards.Shard(shards.FULL, entries, None, None, {})
+    return full, root, manifest
+
+
+def test_manifest_lists_industry_and_general_shards(built):
+    full, root, manifest = built
+    assert sorted(manifest["shards"]) == sorted(INDUSTRIES + ["cafe", shards.GENERAL])
+    assert manifest["shards"][shards.GENERAL]["roles"] == {"footer": 2}   # no industry, or tagged general
+    assert shards.read_manifest(root) == manifest
+
+
+def test_manifest_is_current_only_for_same_source_and_config(built):
+    _, root, manifest = built
+    assert shards.manifest_is_current(manifest, SOURCE)
+    assert not shards.manifest_is_current(None, SOURCE)
+    assert not shards.manifest_is_current(manifest, {**SOURCE, "mtime_ns": 2})
+    for key, value in (("type", "other"), ("storage", "other"), ("catalog_format", -1), ("layout", None)):
+        assert not shards.manifest_is_current({**manifest, key: value}, SOURCE), key
+
+
+def test_cache_loads_lazily_and_evicts_lru(built):
+    _, root, manifest = built
+    loaded = []
+    cache = shards.ShardCache(root, manifest, on_load=lambda s: loaded.append(s.key), max_shards=2)
+    assert cache.get("restaurant") is cache.get("restaurant")
+    cache.get("saas")
+    cache.get("restaurant")                 # most recently used: saas is evicted next
+    cache.get("fitness")
+    assert cache.stats()["loaded"] == ["restaurant", "fitness"]
+    cache.get("saas")
+    stats = cache.stats()
+    assert loaded == ["restaurant", "saas", "fitness", "saas"]
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 4, 2)
+    assert stats["loaded"] == ["fitness", "saas"] and stats["resident_bytes"] > 0
+
+
+def test_shard_lexical_scores_match_full_catalog(built):
+    full, root, manifest = built
+    cache = shards.ShardCache(root, manifest)
+    tokens = catalog.tokenize("footer with contact details pizza menu and pricing")
+    for key in manifest["shards"]:
+        shard = cache.get(key)
+        local = np.arange(len(shard))
+        np.testing.assert_allclose(shard.entries.lexical_scores(tokens, local),
+                                   full.entries.lexical_scores(tokens, shard.ids))
+
+
+@pytest.mark.parametrize("industry", INDUSTRIES + ["cafe", "rest"])
+def test_sharded_candidates_are_unsharded_plus_general(built, industry):
+    full, root, manifest = built
+    cache = shards.ShardCache(root, manifest)
+    general = set(cache.get(shards.GENERAL).ids.tolist())
+    for role in ROLES + [None]:
+        got = set()
+        for key in cache.keys_for(industry):
+            view = cache.get(key)
+            flt = view.filter_ids(role, "" if key == shards.GENERAL else industry)
+            got |= set(view.ids.tolist()) if flt is None else {view.global_id(i) for i in flt[0].tolist()}
+        unsharded = set(full.filter_ids(role, industry)[0].tolist())
+        with_role = {i for i in general if not role or full.entries.role(i) == role}
+        assert got == unsharded | with_role, role
+        assert not unsharded & general           # widened on purpose: general entries only come in sharded
@@ -0,0 +1,57 @@
+# test_site_cache.py
+# Site cache in main.py with the model call stubbed out: off unless
+# CACHE_TTL_SITE_S is set, and when on it stores only complete sites, never
+# one salvaged from a truncated reply.
+import json, os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")            # main configures the client at import
+import main  # noqa: E402
+from cache import TieredCache  # noqa: E402
+
+SLATE = {"templates": [{"type": "Hero", "_role": "hero", "exampleProps": {"title": "t"}}], "schema_defaults": {}}
+SITE = {"websiteName": "Acme", "components": [{"id": "c1", "type": "Hero", "props": {"title": "Acme"}},
+                                              {"id": "c2", "type": "Footer", "props": {"brand": "Acme"}}]}
+
+
+def _payload():
+    return main.GenerateRequest(business_name="Acme", description="d", industry="saas", style="modern",
+                                wire_format="full")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stub model call answering `text` (the full SITE by default); counts calls."""
+    state = SimpleNamespace(text=json.dumps(SITE), calls=0)
+
+    def call(ctx):
+        state.calls += 1
+        return SimpleNamespace(model_name="stub"), SimpleNamespace(text=state.text, usage_metadata=None)
+
+    monkeypatch.setattr(main, "_call_model", call)
+    monkeypatch.setattr(main, "CONTINUE_ON_TRUNCATION", False)
+    monkeypatch.setattr(main, "SITE_CACHE", TieredCache("site", 60))
+    return state
+
+
+@pytest.mark.skipif("CACHE_TTL_SITE_S" in os.environ, reason="site cache configured in the environment")
+def test_site_cache_is_off_by_default():
+    assert main.CACHE_TTL_SITE_S == 0 and not main.SITE_CACHE.enabled
+    assert main._site_key(_payload()) is None
+
+
+def test_complete_site_is_served_from_cache(model):
+    first = main._generate_site(_payload(), dict(SLATE))
+    again = main._generate_site(_payload(), dict(SLATE))
+    assert model.calls == 1 and again["cached"] is True
+    assert again["components"] == first["components"] and again["request_id"] != first["request_id"]
+
+
+def test_recovered_site_is_not_cached(model):
+    model.text = json.dumps(SITE)[:-40]                       # cut inside the second component
+    first = main._generate_site(_payload(), dict(SLATE))
+    assert first["recovery"]["recovered"] and len(first["components"]) == 1
+    again = main._generate_site(_payload(), dict(SLATE))
+    assert model.calls == 2 and not again.get("cached")
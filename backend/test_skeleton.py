@@ -0,0 +1,34 @@
+# test_skeleton.py
+# Degraded-mode page (skeleton.py): one component per slate type in page-role
+# order, request fields filled in, and the cap never dropping header/footer.
+from skeleton import build_skeleton
+
+ORDER = ["header", "hero", "value", "media", "social-proof", "conversion", "core-content", "footer", "aux"]
+
+
+def _t(ctype, role, **props):
+    return {"type": ctype, "_role": role, "exampleProps": props, "tags": [role]}
+
+
+def test_role_order_and_request_fields():
+    slate = [_t("Footer", "footer", brand="x"), _t("Features", "value", items=[{"title": "a"}]),
+             _t("Hero", "hero", title="t", subtitle="s"), _t("NavBar", "header", logoText="x"),
+             _t("Hero", "hero", title="dup")]
+    page = build_skeleton(slate, {}, "Acme", "We sell things", "Fast; Cheap; Good", role_order=ORDER)
+    comps = page["components"]
+    assert [c["type"] for c in comps] == ["NavBar", "Hero", "Features", "Footer"]
+    assert [c["id"] for c in comps] == ["c1", "c2", "c3", "c4"]
+    assert comps[0]["props"]["logoText"] == "Acme" and comps[3]["props"]["brand"] == "Acme"
+    assert comps[1]["props"] == {"title": "Acme", "subtitle": "We sell things"}
+    assert [i["title"] for i in comps[2]["props"]["items"]] == ["Fast", "Cheap", "Good"]
+
+
+def test_cap_keeps_header_and_footer():
+    slate = [_t("NavBar", "header")] + [_t(f"Section{i}", "value") for i in range(20)] + [_t("Footer", "footer")]
+    comps = build_skeleton(slate, {}, "Acme", "d", role_order=ORDER, max_components=12)["components"]
+    types = [c["type"] for c in comps]
+    assert len(types) == 12 and types[0] == "NavBar" and types[-1] == "Footer"
+    assert types[1:-1] == [f"Section{i}" for i in range(10)]
+    assert [c["id"] for c in comps] == [f"c{i}" for i in range(1, 13)]
+    # under the cap nothing changes
+    assert len(build_skeleton(slate[:5], {}, "Acme", "d", role_order=ORDER)["components"]) == 5
@@ -0,0 +1,61 @@
+# test_slates.py
+# Default industry x style slates: the weak-description test, the request
+# shape they stand in for, the on-disk round trip, and that only a build
+# (build_index / preload) writes them: a request without slates retrieves live.
+import numpy as np
+
+from rag import slates
+from test_filtered_search import run_child
+
+
+def test_informative_words_ignore_generic_and_base_terms():
+    words = slates.informative_words(["restaurant", "modern", "A great local restaurant website for our business"],
+                                     "restaurant", "modern")
+    assert words == []
+    words = slates.informative_words(["restaurant", "modern", "Wood-fired Neapolitan pizza, 2 locations"],
+                                     "restaurant", "modern")
+    assert words == ["wood", "fired", "neapolitan", "pizza", "locations"]
+
+
+def test_shape_must_match_what_main_requests():
+    assert slates.has_slate_shape(list(slates.SLATE_ROLES), slates.SLATE_K, True)
+    assert not slates.has_slate_shape(list(slates.SLATE_ROLES), 6, True)
+    assert not slates.has_slate_shape(list(reversed(slates.SLATE_ROLES)), slates.SLATE_K, True)
+
+
+def test_write_read_roundtrip(tmp_path):
+    path = slates.slates_path(tmp_path / "index.faiss")
+    vec = np.ones(4, dtype="float32") / 2
+    payload = {"templates": [{"type": "Hero", "_score": np.float32(0.75)}], "debug": {}}
+    slates.write_slates(path, {"model": "m"}, {slates.slate_key("Restaurant", "Modern"): (vec, payload)})
+    sl = slates.read_slates(path)
+    i = sl.find("restaurant", "modern")
+    assert i is not None and sl.find("restaurant", "dark") is None
+    assert abs(sl.similarity(i, vec) - 1.0) < 1e-6
+    got = sl.payload(i)
+    got["templates"].clear()                             # callers get a fresh copy
+    assert sl.payload(i)["templates"] == [{"type": "Hero", "_score": 0.75}]
+    assert slates.read_slates(tmp_path / "missing.json.gz") is None
+
+
+_SCRIPT = r"""
+import json
+from rag import slates, vectorstore as vs
+path = slates.slates_path(vs.INDEX_PATH)
+shape = dict(need_images=slates.SLATE_NEED_IMAGES, role_hints=slates.SLATE_ROLES, k=slates.SLATE_K)
+out = {}
+vs._ensure()
+cold = vs.retrieve_by_roles_payload(q_terms=["restaurant", "modern"], industry="restaurant", style="modern", **shape)
+out["cold"] = {"file": path.exists(), "slate": cold["debug"].get("slate"), "templates": len(cold["templates"])}
+vs.preload()
+warm = vs.retrieve_by_roles_payload(q_terms=["restaurant", "dark"], industry="restaurant", style="dark", **shape)
+out["warm"] = {"file": path.exists(), "slate": warm["debug"].get("slate")}
+print("RESULT " + json.dumps(out))
+"""
+
+
+def test_requests_never_build_slates(tmp_path):
+    out = run_child(tmp_path, _SCRIPT, RAG_SLATES="1", RAG_SHARDS="0", RAG_INDEX_TYPE="flat",
+                    RAG_EMB_STORAGE="float32", CACHE_TTL_RETRIEVAL_S="0")
+    assert out["cold"]["file"] is False and out["cold"]["slate"] is None and out["cold"]["templates"]
+    assert out["warm"]["file"] is True and out["warm"]["slate"] == slates.slate_key("restaurant", "dark")
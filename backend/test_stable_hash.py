@@ -0,0 +1,46 @@
+# test_stable_hash.py
+# Retrieval must not depend on the interpreter's string-hash salt: two
+# processes with different PYTHONHASHSEED values (two workers, or one worker
+# before and after a restart) return bit-identical results.
+import json, os, subprocess, sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent
+
+_SCRIPT = r"""
+import json
+from rag import vectorstore as vs
+from bench.common import QUERIES as test_cases
+out = {"seeds": [vs._seed_from_payload(i, "modern", d) for i, d in test_cases],
+       "sig": vs._sig("restaurant", "modern", 8)}
+for industry, desc in test_cases:
+    q_terms = [industry, "modern", desc[:100]]
+    out[industry] = {
+        "payload": vs.retrieve_by_roles_payload(q_terms=q_terms, industry=industry, style="modern",
+                                                need_images=True, k=8),
+        "composite": [(e["type"], e["_score"]) for e in
+                      vs.search_entries_composite(q_terms, role="hero", industry=industry, k=5)],
+        "context": vs.retrieve_context(" ".join(q_terms), industry=industry, k=8),
+    }
+out["many"] = vs.retrieve_by_roles_payload_many(
+    [{"q_terms": [i, "modern", d[:100]], "industry": i, "style": "modern"} for i, d in test_cases])
+print("RESULT " + json.dumps(out, sort_keys=True, default=str))
+"""
+
+
+def _run(hash_seed: str) -> str:
+    env = {**os.environ, "PYTHONHASHSEED": hash_seed}
+    proc = subprocess.run([sys.executable, "-c", _SCRIPT], cwd=BACKEND, env=env, capture_output=True,
+                          text=True, timeout=600)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        pytest.skip(f"retrieval unavailable here: {proc.stderr.strip().splitlines()[-1:]}")
+    return lines[-1][len("RESULT "):]
+
+
+def test_retrieval_is_identical_across_hash_seeds():
+    a, b = _run("1"), _run("2")
+    assert json.loads(a)["seeds"] == json.loads(b)["seeds"]
+    assert a == b
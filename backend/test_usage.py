@@ -0,0 +1,71 @@
+# test_usage.py
+# Token accounting (usage.py): counts read off a Gemini response (zeros when it
+# has no usage_metadata), and UsageLedger summaries grouped, averaged and
+# windowed over the recorded requests.
+from types import SimpleNamespace
+
+import usage
+from usage import UsageLedger, add_usage, usage_from_response, usage_header
+
+
+def _meta(prompt, output, total=None):
+    return SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output,
+                                                          total_token_count=total))
+
+
+def test_usage_from_response():
+    assert usage_from_response(_meta(1200, 800, 2100)) == {"prompt_tokens": 1200, "output_tokens": 800,
+                                                           "total_tokens": 2100, "calls": 1}
+    assert usage_from_response(_meta(1200, 800))["total_tokens"] == 2000         # no total: prompt + output
+    assert usage_from_response(_meta(None, 5))["prompt_tokens"] == 0
+
+
+def test_usage_from_response_without_usage_metadata():
+    zeros = {"prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0, "calls": 1}
+    assert usage_from_response(SimpleNamespace(text="{}")) == zeros
+    assert usage_from_response(SimpleNamespace(text="{}", usage_metadata=None)) == zeros
+    assert usage_from_response(SimpleNamespace(usage_metadata=SimpleNamespace())) == zeros
+
+
+def test_add_usage_and_header():
+    total = add_usage({}, usage_from_response(_meta(100, 50)))
+    add_usage(total, {**usage_from_response(_meta(10, 5)), "model": "flash"})    # non-counts are ignored
+    add_usage(total, None)
+    assert total == {"prompt_tokens": 110, "output_tokens": 55, "total_tokens": 165, "calls": 2}
+    assert usage_header({**total, "model": "flash", "format": "compact"}) == \
+        "prompt_tokens=110;output_tokens=55;total_tokens=165;calls=2;model=flash;format=compact"
+
+
+def test_ledger_groups_and_averages():
+    ledger = UsageLedger()
+    ledger.record("SaaS", "Modern", "pro", usage_from_response(_meta(1000, 3000)), {"rag": 400, "system": 100},
+                  latency_ms=2000)
+    ledger.record("saas", "modern", "pro", {**usage_from_response(_meta(2000, 1000)), "calls": 2}, {"rag": 600},
+                  latency_ms=4000)
+    ledger.record("fitness", "modern", "", usage_from_response(_meta(500, 100)), wire_format="compact")
+    out = ledger.summary()
+    assert out["requests"] == 3 and out["group_by"] == ["industry", "style", "model"]
+    assert (out["prompt_tokens"], out["output_tokens"], out["total_tokens"]) == (3500, 4100, 7600)
+    saas, fitness = out["groups"]                                               # most tokens first
+    assert (saas["industry"], saas["style"], saas["model"]) == ("saas", "modern", "pro")
+    assert saas["requests"] == 2 and saas["calls"] == 3 and saas["total_tokens"] == 7000
+    assert saas["avg_output_tokens"] == 2000.0 and saas["avg_latency_ms"] == 3000.0
+    assert saas["prompt_chars"] == {"rag": 500, "system": 50}                   # per request, over all requests
+    assert fitness["model"] == "unknown" and fitness["prompt_chars"] == {}
+
+    by_format = ledger.summary(group_by=("format", "nope"))
+    assert by_format["group_by"] == ["format"]
+    assert [(g["format"], g["requests"]) for g in by_format["groups"]] == [("full", 2), ("compact", 1)]
+
+
+def test_ledger_window_and_cap(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(usage.time, "time", lambda: now[0])
+    ledger = UsageLedger(max_records=3)
+    for i in range(5):                                                          # one a minute; the first two fall off
+        ledger.record("saas", "modern", "pro", usage_from_response(_meta(i, 0)))
+        now[0] += 60
+    assert ledger.summary(window_s=3600)["prompt_tokens"] == 2 + 3 + 4
+    assert ledger.summary(window_s=150)["prompt_tokens"] == 3 + 4
+    assert ledger.summary(window_s=10) == {"window_s": 10, "group_by": ["industry", "style", "model"], "requests": 0,
+                                           "prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0, "groups": []}
@@ -0,0 +1,75 @@
+# test_wire.py
+# Compact wire format (wire.py): aliases built from the slate, a compact reply
+# expanded back to the full shape, and full-format replies left alone, even
+# when they are truncated.
+import json
+
+import pytest
+
+from wire import COMPACT_COMPONENTS_KEY, build_aliases, compact_schema, expand_site, recover_reply, resolve_format
+
+SLATE = [
+    {"type": "Hero", "propsSchema": {"headline": "string", "backgroundImage": "string", "cta": "object"},
+     "exampleProps": {"headline": "Hi", "cta": {"label": "Go", "href": "#"}}},
+    {"type": "Footer", "propsSchema": {"headline": "string", "links": "array"}},
+]
+
+
+def test_aliases_cover_long_keys_and_never_collide():
+    aliases = build_aliases(SLATE)
+    assert sorted(aliases.values()) == ["backgroundImage", "headline", "href", "label", "links"]
+    assert aliases["a"] == "headline"                           # most frequent first, shortest alias
+    assert "cta" not in aliases.values() and not set(aliases) & {"cta", "href", "headline", "links"}
+    assert '"a":"headline"' in compact_schema(["Hero", "Footer"], aliases)
+    assert resolve_format("COMPACT") == "compact" and resolve_format("xml") == "full"
+
+
+def test_compact_round_trip():
+    aliases = build_aliases(SLATE)
+    inv = {v: k for k, v in aliases.items()}
+    full = {"websiteName": "Acme", "tags": ["x"], "components": [
+        {"id": "c1", "type": "Hero", "props": {"headline": "Hi", "cta": {"label": "Go", "href": "#"}}},
+        {"type": "Footer", "props": {"links": [{"headline": "A"}]}},
+    ]}
+    compact = {"n": "Acme", "g": ["x"], "recovery": {"recovered": False}, COMPACT_COMPONENTS_KEY: [
+        {"i": "c1", "t": "Hero", "p": {inv["headline"]: "Hi", "cta": {inv["label"]: "Go", inv["href"]: "#"}}},
+        {"t": "Footer", "p": {inv["links"]: [{inv["headline"]: "A"}]}},
+        "not a component",
+    ]}
+    out = expand_site(compact, aliases)
+    assert out == {**full, "success": True, "recovery": {"recovered": False}}
+
+
+def test_unknown_aliases_are_kept_as_written():
+    aliases = build_aliases(SLATE)
+    out = expand_site({COMPACT_COMPONENTS_KEY: [{"t": "Hero", "p": {"zz": 1, "subtitle": "s"}}]}, aliases)
+    assert out["components"] == [{"type": "Hero", "props": {"zz": 1, "subtitle": "s"}}]
+
+
+def test_full_format_reply_passes_through():
+    aliases = build_aliases(SLATE)
+    full = {"websiteName": "Acme", "industry": "saas", "components": [
+        {"id": "c1", "type": "Hero", "props": {"a": "not an alias here"}, "tags": ["t"]}]}
+    assert expand_site(full, aliases) == {**full, "success": True}
+    assert expand_site({"websiteName": "Acme"}, aliases)["components"] == []
+
+
+def test_recover_reply_falls_back_to_the_full_format():
+    compact = json.dumps({"n": "Acme", COMPACT_COMPONENTS_KEY: [{"i": "c1", "t": "Hero"}, {"i": "c2", "t": "Footer"}]})
+    data, report, is_compact = recover_reply(compact[:-25], compact=True)
+    assert is_compact and data[COMPACT_COMPONENTS_KEY] == [{"i": "c1", "t": "Hero"}] and report["truncated"]
+
+    full = json.dumps({"websiteName": "Acme", "components": [
+        {"id": "c1", "type": "Hero", "props": {"title": "Hi"}}, {"id": "c2", "type": "Footer", "props": {"b": "x"}}]})
+    data, report, is_compact = recover_reply(full, compact=True)
+    assert not is_compact and not report["recovered"] and report["components_kept"] == 2
+    # truncated full-format reply: the compact walk finds nothing, the full one keeps the closed component
+    data, report, is_compact = recover_reply(full[:-20], compact=True)
+    assert not is_compact and report["truncated"] and report["dropped_partial"] == {"id": "c2", "type": "Footer"}
+    assert [c["id"] for c in data["components"]] == ["c1"]
+    assert expand_site(data, {})["components"] == data["components"]
+
+    data, _, is_compact = recover_reply(full[:-20], compact=False)
+    assert not is_compact and [c["id"] for c in data["components"]] == ["c1"]
+    with pytest.raises(ValueError):
+        recover_reply('{"n": "Acme", "c": [{"i', compact=True)
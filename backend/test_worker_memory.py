@@ -0,0 +1,96 @@
+# test_worker_memory.py
+# Workers forked after the catalog is loaded (gunicorn preload_app) must share
+# the embeddings and the FAISS index rather than each holding a copy: the
+# private memory (uss) of a worker that scans the whole catalog stays a small
+# fraction of the catalog size, and does not grow with the worker count.
+import gc, json, os, subprocess, sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from metrics import process_memory
+from rag import ann, quant
+from bench.ann_recall import synthetic
+from bench.worker_rss import fork_workers
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork") or not process_memory(),
+                                reason="needs fork and /proc/<pid>/smaps_rollup")
+
+N, DIM = 50_000, 384                       # ~77 MB float32, as much again in the flat index
+BACKEND = Path(__file__).resolve().parent
+
+
+def _write(tmp_path, storage, index_type):
+    data = synthetic(N, DIM, clusters=40)
+    quant.EmbeddingMatrix(data, storage, quant.exact_path(tmp_path / "index.faiss"))
+    index, meta = ann.make_index(data, index_type, storage)
+    ann.write_index(index, meta, tmp_path / "index.faiss")
+    return meta
+
+
+def _load(tmp_path, storage, meta):
+    # what a loading process holds: both read back from disk
+    emb = quant.EmbeddingMatrix.from_file(quant.exact_path(tmp_path / "index.faiss"), storage)
+    return emb, ann.read_index(tmp_path / "index.faiss", meta)
+
+
+def _scan(emb, index, queries):
+    for q in queries:
+        s = emb.scores(q)                                     # every row of the codes
+        head = np.argpartition(-s, quant.RERANK_TOP)[:quant.RERANK_TOP]
+        emb.exact_scores(q, head)                             # re-score from the float32 file
+    index.search(queries, 10)
+
+
+@pytest.mark.parametrize("storage,index_type", [("float32", "flat"), ("int8", "flat"), ("float32", "hnsw")])
+def test_preloaded_catalog_is_shared_across_workers(tmp_path, storage, index_type):
+    meta = _write(tmp_path, storage, index_type)
+    emb, index = _load(tmp_path, storage, meta)
+    queries = synthetic(8, DIM, clusters=4, seed=1)
+    catalog_bytes = emb.memory()["float32_equivalent"] + (tmp_path / "index.faiss").stat().st_size
+    assert emb.memory()["private"] == 0
+
+    _scan(emb, index, queries)                                # the master touches everything first
+    gc.collect()
+    gc.freeze()                                               # as gunicorn.conf.py does before forking
+    try:
+        one = fork_workers(1, lambda: _scan(emb, index, queries))
+        four = fork_workers(4, lambda: _scan(emb, index, queries))
+    finally:
+        gc.unfreeze()
+    for mem in one + four:
+        assert mem["uss"] < 0.25 * catalog_bytes, (mem, catalog_bytes)
+    # one more worker costs about the same at 4 workers as at 1
+    assert max(m["uss"] for m in four) < max(m["uss"] for m in one) + 0.05 * catalog_bytes
+    # and the shared pages are split between them
+    assert max(m["pss"] for m in four) < max(m["pss"] for m in one)
+
+
+_PER_WORKER = r"""
+import json, sys
+from pathlib import Path
+from bench.ann_recall import synthetic
+from bench.worker_rss import fork_workers
+from test_worker_memory import DIM, _load, _scan, _write
+tmp_path, storage = Path(sys.argv[1]), sys.argv[2]
+meta = _write(tmp_path, storage, "flat")
+queries = synthetic(8, DIM, clusters=4, seed=1)
+print("RESULT " + json.dumps(fork_workers(4, lambda: _scan(*_load(tmp_path, storage, meta), queries))))
+"""
+
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_catalog_loaded_per_worker_is_still_shared(tmp_path, storage):
+    # no preload (uvicorn --workers): each worker reads the files itself, and
+    # the memory-mapped arrays still resolve to the same page-cache pages.
+    # Forked from a fresh interpreter (as bench/worker_rss.py runs): forked from
+    # this one, a worker would also copy whatever heap earlier tests left here.
+    proc = subprocess.run([sys.executable, "-c", _PER_WORKER, str(tmp_path), storage], cwd=BACKEND,
+                          capture_output=True, text=True, timeout=600)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    assert proc.returncode == 0 and lines, proc.stderr[-2000:]
+    four = json.loads(lines[-1][len("RESULT "):])
+    catalog_bytes = N * DIM * 4 + (tmp_path / "index.faiss").stat().st_size
+    for mem in four:
+        assert mem["uss"] < 0.25 * catalog_bytes, (mem, catalog_bytes)
@@ -0,0 +1,98 @@
+# backend/usage.py
+import os, time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+from metrics import inc
+
+# Rolling token accounting: every generation is recorded with its prompt /
+# output / total token counts, the model that actually answered and the
+# char size of each prompt section, then aggregated on demand.
+USAGE_WINDOW_S = float(os.getenv("USAGE_WINDOW_S", "3600"))          # default summary window
+USAGE_MAX_RECORDS = int(os.getenv("USAGE_MAX_RECORDS", "50000"))     # hard cap on retained records
+
+GROUP_FIELDS = ("industry", "style", "model", "format")
+DEFAULT_GROUP_BY = ("industry", "style", "model")
+_TOKEN_FIELDS = ("prompt_tokens", "output_tokens", "total_tokens")
+
+
+def usage_from_response(resp: Any) -> Dict[str, int]:
+    """Token counts from a Gemini response (zeros when usage_metadata is missing)."""
+    meta = getattr(resp, "usage_metadata", None)
+    prompt = int(getattr(meta, "prompt_token_count", 0) or 0)
+    output = int(getattr(meta, "candidates_token_count", 0) or 0)
+    total = int(getattr(meta, "total_token_count", 0) or 0) or prompt + output
+    return {"prompt_tokens": prompt, "output_tokens": output, "total_tokens": total, "calls": 1}
+
+
+def add_usage(into: Dict[str, int], extra: Optional[Dict[str, int]]) -> Dict[str, int]:
+    for k, v in (extra or {}).items():
+        if isinstance(v, int):
+            into[k] = into.get(k, 0) + v
+    return into
+
+
+def usage_header(usage: Dict[str, Any]) -> str:
+    """Compact form for the X-Token-Usage debug header."""
+    return ";".join(f"{k}={usage.get(k)}" for k in ("prompt_tokens", "output_tokens", "total_tokens", "calls", "model", "format"))
+
+
+class UsageLedger:
+    """
+    In-memory ring of per-request usage records. Summaries aggregate the
+    records inside a time window, grouped by any of GROUP_FIELDS.
+    """
+
+    def __init__(self, max_records: int = USAGE_MAX_RECORDS):
+        self._records: Deque[Tuple[float, Dict[str, str], Dict[str, int], Dict[str, int], float]] = deque(
+            maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, industry: str, style: str, model: str, usage: Dict[str, int],
+               prompt_chars: Optional[Dict[str, int]] = None, wire_format: str = "full",
+               latency_ms: float = 0.0) -> None:
+        key = {"industry": (industry or "").lower(), "style": (style or "").lower(), "model": model or "unknown",
+               "format": wire_format}
+        with self._lock:
+            self._records.append((time.time(), key, dict(usage), dict(prompt_chars or {}), latency_ms))
+        for kind in ("prompt", "output"):
+            inc("webgenai_tokens_total", usage.get(f"{kind}_tokens", 0), kind=kind, model=key["model"],
+                format=wire_format)
+
+    def summary(self, window_s: float = USAGE_WINDOW_S, group_by: Iterable[str] = DEFAULT_GROUP_BY) -> Dict[str, Any]:
+        fields = tuple(f for f in group_by if f in GROUP_FIELDS)
+        since = time.time() - window_s
+        with self._lock:
+            records = [r for r in self._records if r[0] >= since]
+
+        totals = {k: 0 for k in _TOKEN_FIELDS}
+        groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        for _, key, usage, chars, latency_ms in records:
+            gk = tuple(key[f] for f in fields)
+            g = groups.get(gk)
+            if g is None:
+                g = groups[gk] = {**{f: key[f] for f in fields}, "requests": 0, "calls": 0,
+                                  **{k: 0 for k in _TOKEN_FIELDS}, "latency_ms": 0.0, "prompt_chars": {}}
+            g["requests"] += 1
+            g["calls"] += usage.get("calls", 1)
+            g["latency_ms"] += latency_ms
+            for k in _TOKEN_FIELDS:
+                g[k] += usage.get(k, 0)
+                totals[k] += usage.get(k, 0)
+            for section, n in chars.items():
+                g["prompt_chars"][section] = g["prompt_chars"].get(section, 0) + n
+
+        out = []
+        for g in groups.values():
+            n = g["requests"]
+            for k in _TOKEN_FIELDS:
+                g[f"avg_{k}"] = round(g[k] / n, 1)
+            g["avg_latency_ms"] = round(g.pop("latency_ms") / n, 1)
+            # average char size per prompt section: shows what dominates the prompt
+            g["prompt_chars"] = {s: round(v / n) for s, v in sorted(g["prompt_chars"].items())}
+            out.append(g)
+        out.sort(key=lambda g: g["total_tokens"], reverse=True)
+        return {"window_s": window_s, "group_by": list(fields), "requests": len(records), **totals, "groups": out}
+
+
+USAGE = UsageLedger()
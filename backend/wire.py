@@ -0,0 +1,143 @@
+# backend/wire.py
+import json, os
+from collections import Counter
+from itertools import count, product
+from string import ascii_lowercase
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from json_recovery import recover_site_json
+
+# Compact wire format for model output. Instead of repeating long prop names
+# and boilerplate per component, the model writes
+#   {"n": websiteName, "g": [tags], "c": [{"i": id, "t": type, "p": {<aliased props>}}]}
+# where prop keys come from a per-request alias table built from the slate's
+# propsSchema/exampleProps. expand_site() turns it back into the full shape.
+WIRE_FULL = "full"
+WIRE_COMPACT = "compact"
+WIRE_FORMAT = os.getenv("GEMINI_WIRE_FORMAT", WIRE_FULL).lower()
+
+COMPACT_COMPONENTS_KEY = "c"
+COMPACT_ID_KEY = "i"
+COMPACT_TYPE_KEY = "t"
+MIN_ALIAS_KEY_LEN = 4  # shorter keys are cheaper to keep than to alias
+
+COMPACT_SCHEMA_TAIL = """;
+    p: Record<string, any>;  // props, keys written with the aliases above
+  }>;
+};
+"""
+
+
+def resolve_format(requested: Optional[str]) -> str:
+    fmt = (requested or WIRE_FORMAT or WIRE_FULL).lower()
+    return fmt if fmt in (WIRE_FULL, WIRE_COMPACT) else WIRE_FULL
+
+
+def _codes() -> Iterator[str]:
+    for n in count(1):
+        for letters in product(ascii_lowercase, repeat=n):
+            yield "".join(letters)
+
+
+def _collect_keys(obj: Any, counter: Counter) -> None:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if isinstance(k, str):
+                counter[k] += 1
+            _collect_keys(v, counter)
+    elif isinstance(obj, list):
+        for v in obj:
+            _collect_keys(v, counter)
+
+
+def build_aliases(templates: List[dict]) -> Dict[str, str]:
+    """
+    {alias: full_key} for every prop key (at any depth) in the slate that is
+    long enough to be worth shortening. Most frequent keys get the shortest
+    aliases; aliases never collide with a real key of the slate.
+    """
+    counter: Counter = Counter()
+    for t in templates or []:
+        _collect_keys(t.get("propsSchema"), counter)
+        _collect_keys(t.get("exampleProps"), counter)
+    existing = set(counter)
+    long_keys = sorted((k for k in counter if len(k) >= MIN_ALIAS_KEY_LEN), key=lambda k: (-counter[k], k))
+    codes = (c for c in _codes() if c not in existing)
+    return {next(codes): k for k in long_keys}
+
+
+def compact_schema(allowed_types: List[str], aliases: Dict[str, str]) -> str:
+    union = " | ".join(f'"{t}"' for t in allowed_types) or '"Header" | "Hero" | "Footer"'
+    legend = json.dumps(aliases, ensure_ascii=False, separators=(",", ":"))
+    return (
+        "\nCOMPACT OUTPUT FORMAT (required): write every props key using its alias from this table "
+        "(alias -> propsSchema key); keys not in the table are written as-is. "
+        "Do not add industry, style or per-component tags.\n"
+        f"KEY ALIASES: {legend}\n"
+        "type GeneratedSite = {\n"
+        "  n: string;  // websiteName\n"
+        "  g: string[];  // site tags\n"
+        "  c: Array<{\n"
+        "    i: string;  // id\n"
+        f"    t: {union}"
+        + COMPACT_SCHEMA_TAIL
+    )
+
+
+def _expand_keys(obj: Any, aliases: Dict[str, str]) -> Any:
+    if isinstance(obj, dict):
+        return {aliases.get(k, k): _expand_keys(v, aliases) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_expand_keys(v, aliases) for v in obj]
+    return obj
+
+
+def recover_reply(raw_text: str, compact: bool) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+    """
+    recover_site_json() on a model reply. In compact mode a reply written in
+    the full format (the model ignored the compact schema) is recovered under
+    "components" instead, so a truncated one keeps its closed components too.
+    Returns (data, report, reply_is_compact); raises ValueError like
+    recover_site_json().
+    """
+    if compact:
+        try:
+            data, report = recover_site_json(raw_text, components_key=COMPACT_COMPONENTS_KEY)
+            if report["components_kept"] or '"components"' not in raw_text:
+                return data, report, True
+        except ValueError:
+            if '"components"' not in raw_text:
+                raise
+    data, report = recover_site_json(raw_text, components_key="components")
+    return data, report, False
+
+
+def expand_site(data: Dict[str, Any], aliases: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Compact model output -> the GenerateResponse shape (other top-level keys
+    are kept). Output already in the full format passes through unchanged.
+    """
+    out = {k: v for k, v in data.items() if k not in ("n", "g", COMPACT_COMPONENTS_KEY)}
+    out["success"] = True
+    if "n" in data:
+        out["websiteName"] = data["n"]
+    if "g" in data:
+        out["tags"] = data["g"]
+    if COMPACT_COMPONENTS_KEY not in data:
+        # the model ignored the compact schema and answered in the full format: keep its components
+        out.setdefault("components", [])
+        return out
+    components = []
+    for c in data.get(COMPACT_COMPONENTS_KEY) or []:
+        if not isinstance(c, dict):
+            continue
+        comp = {
+            "id": c.get(COMPACT_ID_KEY) or c.get("id"),
+            "type": c.get(COMPACT_TYPE_KEY) or c.get("type"),
+            "props": _expand_keys(c.get("p") or c.get("props") or {}, aliases),
+        }
+        if comp["id"] is None:
+            del comp["id"]
+        components.append(comp)
+    out["components"] = components
+    return out